@@ -10,17 +10,31 @@
         'base', 'project', 'purchase', 'stock', 'stock_account',
         'account', 'mail', 'analytic'
     ],
+    'external_dependencies': {
+        'python': ['numpy'],
+    },
     'data': [
         'security/security.xml',
         'security/ir.model.access.csv',
         'security/construction_security.xml',
+        'data/ir_cron_data.xml',
         'views/project_task_views.xml',
         'views/boq_views.xml',
         'views/purchase_views.xml',
         'views/stock_views.xml',
         'views/account_move_views.xml',
+        'views/account_analytic_line_views.xml',
         'views/boq_report_views.xml',
+        'views/boq_version_report_views.xml',
+        'views/boq_evm_views.xml',
+        'views/boq_analytic_report_views.xml',
+        'views/boq_reconciliation_views.xml',
         'views/boq_line_views.xml',
+        'views/boq_alert_views.xml',
+        'views/boq_perf_views.xml',
+        'views/boq_queue_views.xml',
+        'views/boq_consistency_views.xml',
+        'views/boq_product_health_views.xml',
     ],
     'installable': True,
     'application': True,
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import argparse
+import logging
+import multiprocessing
+import sys
+from pathlib import Path
+
+import odoo
+from odoo import api, SUPERUSER_ID
+from odoo.cli import Command
+from odoo.modules.registry import Registry
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+
+def _recompute_worker(dbname, run_name, phase):
+    """Claim and recompute chunks of the phase until none is left, one transaction per chunk."""
+    registry = Registry(dbname)
+    while True:
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            chunk = env['construction.boq.recompute.chunk']._claim(run_name, phase)
+            if not chunk:
+                return
+            chunk._run()
+            _logger.info("BOQ recompute %s: %s ids %s-%s %s", run_name, phase, chunk.id_from, chunk.id_to, chunk.state)
+
+
+class BoqRecompute(Command):
+    """Recompute the stored BOQ line and BOQ totals in resumable chunks"""
+    name = 'boq_recompute'
+
+    def run(self, cmdargs):
+        parser = argparse.ArgumentParser(
+            prog=f'{Path(sys.argv[0]).name} {self.name}',
+            description=self.__doc__,
+            epilog="Running the same --run again resumes it: finished chunks are skipped.",
+        )
+        parser.add_argument('-c', '--config', dest='config', help="Odoo configuration file")
+        parser.add_argument('-d', '--database', dest='db_name', required=True, help="Database to recompute")
+        parser.add_argument('--run', dest='run_name', default='default', help="Name of the run, used to resume it")
+        parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=5000, help="Number of ids per chunk")
+        parser.add_argument('--workers', dest='workers', type=int, default=1, help="Number of worker processes")
+        args, odoo_args = parser.parse_known_args(cmdargs)
+
+        if args.config:
+            odoo_args += ['-c', args.config]
+        config.parse_config(odoo_args + ['-d', args.db_name])
+        dbname = args.db_name
+
+        with Registry(dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['construction.boq.recompute.chunk']._prepare_run(args.run_name, args.chunk_size)
+
+        # Lines first: BOQ totals are summed from the recomputed line budgets
+        for phase in ('line', 'boq'):
+            self._run_phase(dbname, args.run_name, phase, max(args.workers, 1))
+
+        with Registry(dbname).cursor() as cr:
+            cr.execute("""
+                SELECT phase, state, COUNT(*), SUM(changed_count)
+                FROM construction_boq_recompute_chunk
+                WHERE run_name = %s
+                GROUP BY phase, state
+                ORDER BY phase, state
+            """, (args.run_name,))
+            failed = False
+            for phase, state, count, changed in cr.fetchall():
+                _logger.info("BOQ recompute %s: %s %s chunk(s) %s, %s record(s) updated", args.run_name, phase, count, state, changed or 0)
+                failed = failed or state == 'failed'
+        if failed:
+            sys.exit(1)
+
+    def _run_phase(self, dbname, run_name, phase, workers):
+        if workers == 1:
+            _recompute_worker(dbname, run_name, phase)
+            return
+
+        # Connections must not be shared with the forked workers
+        odoo.sql_db.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=_recompute_worker, args=(dbname, run_name, phase))
+            for _index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
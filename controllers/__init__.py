@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+from . import budget
+from . import export
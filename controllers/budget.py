@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+from werkzeug.exceptions import BadRequest
+
+from odoo import http
+from odoo.http import request
+from odoo.tools import SQL
+
+
+class ConstructionBudgetController(http.Controller):
+
+    @http.route('/construction_boq/budget', type='http', auth='user', methods=['GET'])
+    def budget_availability(self, line_ids=None, project_ids=None, **kwargs):
+        """
+        Budget availability of a batch of BOQ lines, for polling clients.
+
+        Query parameters: ``line_ids`` and/or ``project_ids``, comma separated.
+        Projects expand to the product lines of their active BOQ versions.
+        Figures are read from one aggregate query over the ledger and the open
+        purchase orders, only on the lines the user may read. The ETag follows
+        the ledger high-water mark, so an unchanged batch answers 304.
+        """
+        line_ids = self._parse_ids(line_ids)
+        project_ids = self._parse_ids(project_ids)
+        if not line_ids and not project_ids:
+            raise BadRequest("line_ids or project_ids is required")
+
+        Line = request.env['construction.boq.line']
+        domain = [('display_type', '=', False)]
+        if line_ids and project_ids:
+            domain += ['|', ('id', 'in', line_ids), '&', ('project_id', 'in', project_ids), ('boq_active', '=', True)]
+        elif line_ids:
+            domain += [('id', 'in', line_ids)]
+        else:
+            domain += [('project_id', 'in', project_ids), ('boq_active', '=', True)]
+        # Access rules are applied once, on the query, not per record
+        lines_query = Line._search(domain)
+
+        etag = self._compute_etag(lines_query)
+        if request.httprequest.if_none_match.contains(etag):
+            return request.make_response('', status=304, headers=[('ETag', '"%s"' % etag)])
+
+        request.env.cr.execute(SQL("""
+            SELECT
+                l.id, l.boq_id, l.project_id, l.product_id, l.currency_id,
+                l.quantity, l.budget_amount,
+                COALESCE(cons.quantity, 0.0), COALESCE(cons.amount, 0.0),
+                COALESCE(po.quantity, 0.0), COALESCE(po.amount, 0.0)
+            FROM construction_boq_line l
+            LEFT JOIN (
+                SELECT c.boq_line_id, SUM(c.quantity) AS quantity, SUM(c.amount) AS amount
+                FROM construction_boq_consumption c
+                WHERE c.boq_line_id IN %(lines)s
+                GROUP BY c.boq_line_id
+            ) cons ON cons.boq_line_id = l.id
+            -- Committed: confirmed purchase quantities not billed yet by a posted bill (bills feed the ledger)
+            LEFT JOIN (
+                SELECT
+                    pol.boq_line_id,
+                    -- Quantities in the unit of the BOQ line
+                    SUM(GREATEST(pol.product_qty - COALESCE(inv.quantity, 0.0), 0.0)
+                        * COALESCE(tu.factor / NULLIF(fu.factor, 0.0), 1.0)) AS quantity,
+                    SUM(GREATEST(pol.product_qty - COALESCE(inv.quantity, 0.0), 0.0) * pol.price_unit
+                        / COALESCE(NULLIF(o.currency_rate, 0.0), 1.0)) AS amount
+                FROM purchase_order_line pol
+                JOIN purchase_order o ON o.id = pol.order_id
+                JOIN construction_boq_line bl ON bl.id = pol.boq_line_id
+                LEFT JOIN uom_uom fu ON fu.id = pol.product_uom
+                LEFT JOIN uom_uom tu ON tu.id = bl.uom_id
+                -- Posted bill quantities in the unit of the purchase line (draft bills are not spent yet)
+                LEFT JOIN (
+                    SELECT
+                        aml.purchase_line_id,
+                        SUM(CASE WHEN am.move_type = 'in_refund' THEN -aml.quantity ELSE aml.quantity END
+                            * COALESCE(pu.factor / NULLIF(au.factor, 0.0), 1.0)) AS quantity
+                    FROM account_move_line aml
+                    JOIN account_move am ON am.id = aml.move_id
+                    JOIN purchase_order_line ipol ON ipol.id = aml.purchase_line_id
+                    LEFT JOIN uom_uom au ON au.id = aml.product_uom_id
+                    LEFT JOIN uom_uom pu ON pu.id = ipol.product_uom
+                    WHERE ipol.boq_line_id IN %(lines)s
+                    AND am.state = 'posted'
+                    AND am.move_type IN ('in_invoice', 'in_refund')
+                    GROUP BY aml.purchase_line_id
+                ) inv ON inv.purchase_line_id = pol.id
+                WHERE pol.boq_line_id IN %(lines)s
+                AND o.state IN ('purchase', 'done')
+                GROUP BY pol.boq_line_id
+            ) po ON po.boq_line_id = l.id
+            WHERE l.id IN %(lines)s
+            ORDER BY l.id
+        """, lines=lines_query.subselect()))
+
+        result = []
+        for (line_id, boq_id, project_id, product_id, currency_id, quantity, budget_amount,
+             consumed_quantity, consumed_amount, committed_quantity, committed_amount) in request.env.cr.fetchall():
+            quantity = quantity or 0.0
+            budget_amount = budget_amount or 0.0
+            result.append({
+                'id': line_id,
+                'boq_id': boq_id,
+                'project_id': project_id,
+                'product_id': product_id,
+                'currency_id': currency_id,
+                'budget_quantity': quantity,
+                'budget_amount': budget_amount,
+                'consumed_quantity': consumed_quantity,
+                'consumed_amount': consumed_amount,
+                'committed_quantity': committed_quantity,
+                'committed_amount': committed_amount,
+                'remaining_quantity': quantity - consumed_quantity - committed_quantity,
+                'remaining_amount': budget_amount - consumed_amount - committed_amount,
+            })
+
+        return request.make_json_response(
+            {'lines': result},
+            headers=[('ETag', '"%s"' % etag), ('Cache-Control', 'private, no-cache')],
+        )
+
+    def _parse_ids(self, value):
+        if not value:
+            return []
+        try:
+            return [int(part) for part in value.split(',') if part.strip()]
+        except ValueError:
+            raise BadRequest("ids must be a comma separated list of integers")
+
+    def _compute_etag(self, lines_query):
+        """
+        Hash of the ledger high-water mark (last consumption id), the last
+        change of the lines, of their purchase lines and orders (state,
+        currency rate) and of the bills of those purchase lines, scoped to the
+        user and to the requested batch.
+        """
+        request.env.cr.execute(SQL("""
+            SELECT
+                (SELECT MAX(c.id) FROM construction_boq_consumption c WHERE c.boq_line_id IN %(lines)s),
+                (SELECT MAX(l.write_date) FROM construction_boq_line l WHERE l.id IN %(lines)s),
+                (SELECT MAX(pol.write_date) FROM purchase_order_line pol WHERE pol.boq_line_id IN %(lines)s),
+                (SELECT ARRAY[MAX(o.write_date)::text, ARRAY_AGG(DISTINCT o.currency_rate)::text]
+                 FROM purchase_order o
+                 JOIN purchase_order_line pol ON pol.order_id = o.id
+                 WHERE pol.boq_line_id IN %(lines)s),
+                (SELECT MAX(am.write_date)
+                 FROM account_move am
+                 JOIN account_move_line aml ON aml.move_id = am.id
+                 JOIN purchase_order_line pol ON pol.id = aml.purchase_line_id
+                 WHERE pol.boq_line_id IN %(lines)s),
+                (SELECT ARRAY_AGG(l.id ORDER BY l.id) FROM construction_boq_line l WHERE l.id IN %(lines)s)
+        """, lines=lines_query.subselect()))
+        marks = request.env.cr.fetchone()
+        key = repr((request.env.uid, request.env.companies.ids, marks))
+        return hashlib.sha1(key.encode()).hexdigest()
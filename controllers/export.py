@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import tempfile
+
+import xlsxwriter
+from werkzeug.exceptions import BadRequest
+
+from odoo import http, fields
+from odoo.http import request, content_disposition
+from odoo.tools import SQL
+
+EXPORT_HEADER = [
+    'Project', 'BOQ', 'Section', 'Activity Code', 'Description', 'Product', 'Cost Type', 'UoM',
+    'Budget Qty', 'Budget Rate', 'Budget Amount', 'Actual Qty', 'Actual Amount',
+    'Variance Qty', 'Variance Amount', 'Consumption %',
+]
+# Columns summed on the section subtotal rows (index in EXPORT_HEADER)
+SUBTOTAL_COLUMNS = (10, 12, 14)
+
+
+class ConstructionExportController(http.Controller):
+
+    @http.route('/construction_boq/export', type='http', auth='user', methods=['GET'])
+    def export_lines(self, boq_ids=None, project_ids=None, format='xlsx', batch_size=2000, **kwargs):
+        """
+        Budget vs actual export of BOQ lines, with section subtotals.
+
+        Query parameters: ``boq_ids`` and/or ``project_ids`` (comma separated,
+        defaults to every active BOQ), ``format`` (``xlsx`` or ``csv``).
+        Access rules are applied once, on the query. Rows are then read in
+        batches from a server-side cursor while the response is streamed, so
+        memory stays bounded by the batch size: CSV is written
+        batch by batch, XLSX through xlsxwriter's constant memory mode into a
+        temporary file sent in chunks.
+        """
+        if format not in ('xlsx', 'csv'):
+            raise BadRequest("format must be xlsx or csv")
+        boq_ids = self._parse_ids(boq_ids)
+        project_ids = self._parse_ids(project_ids)
+
+        Line = request.env['construction.boq.line']
+        Line.check_access('read')
+        domain = [
+            ('display_type', 'in', (False, 'line_section')),
+            ('company_id', 'in', request.env.companies.ids),
+        ]
+        if boq_ids:
+            domain += [('boq_id', 'in', boq_ids)]
+        if project_ids:
+            domain += [('project_id', 'in', project_ids)]
+        if not boq_ids and not project_ids:
+            domain += [('boq_active', '=', True)]
+        lines_query = Line._search(domain).subselect()
+
+        # The request cursor is closed once the response is returned
+        cost_types = dict(Line._fields['cost_type']._description_selection(request.env))
+        rows = self._iter_rows(request.env.registry, lines_query, request.env.lang or 'en_US', cost_types, int(batch_size))
+        filename = 'boq_budget_vs_actual_%s.%s' % (fields.Date.to_string(fields.Date.context_today(Line)), format)
+        if format == 'csv':
+            body, content_type = self._stream_csv(rows), 'text/csv; charset=utf-8'
+        else:
+            body, content_type = self._stream_xlsx(rows), 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return request.make_response(body, headers=[
+            ('Content-Type', content_type),
+            ('Content-Disposition', content_disposition(filename)),
+            ('Cache-Control', 'no-store'),
+        ])
+
+    def _parse_ids(self, value):
+        if not value:
+            return []
+        try:
+            return [int(part) for part in value.split(',') if part.strip()]
+        except ValueError:
+            raise BadRequest("ids must be a comma separated list of integers")
+
+    def _iter_rows(self, registry, lines_query, lang, cost_types, batch_size):
+        """
+        Yield the export rows in BOQ line order, followed by a subtotal row at
+        the end of each section. The rows come from a single query, so the
+        access subselect is evaluated once, read through a server-side (named)
+        cursor in batches of batch_size.
+        """
+        with registry.cursor() as cr:
+            query = SQL("""
+                SELECT
+                    l.display_type, l.section_line_id,
+                    COALESCE(pp.name->>%(lang)s, pp.name->>'en_US'), b.name, l.name,
+                    COALESCE(l.activity_code, t.activity_code),
+                    COALESCE(pt.name->>%(lang)s, pt.name->>'en_US'), l.cost_type,
+                    COALESCE(u.name->>%(lang)s, u.name->>'en_US'),
+                    COALESCE(l.quantity, 0.0), COALESCE(l.estimated_rate, 0.0), COALESCE(l.budget_amount, 0.0),
+                    COALESCE(l.consumed_quantity, 0.0), COALESCE(l.consumed_amount, 0.0)
+                FROM construction_boq_line l
+                JOIN construction_boq b ON b.id = l.boq_id
+                LEFT JOIN project_project pp ON pp.id = b.project_id
+                LEFT JOIN project_task t ON t.id = l.task_id
+                LEFT JOIN product_product p ON p.id = l.product_id
+                LEFT JOIN product_template pt ON pt.id = p.product_tmpl_id
+                LEFT JOIN uom_uom u ON u.id = l.uom_id
+                WHERE l.id IN %(lines)s
+                ORDER BY l.boq_id, COALESCE(l.sequence, 0), l.id
+            """, lines=lines_query, lang=lang)
+            section = None
+            totals = dict.fromkeys(SUBTOTAL_COLUMNS, 0.0)
+            with cr._cnx.cursor(name='construction_boq_export') as rows_cr:
+                rows_cr.itersize = batch_size
+                rows_cr.execute(query.code, query.params)
+                while True:
+                    batch = rows_cr.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    for (display_type, section_line_id, project, boq, name, code, product,
+                         cost_type, uom, quantity, rate, budget, consumed_qty, consumed_amt) in batch:
+                        if display_type == 'line_section':
+                            if section:
+                                yield self._subtotal_row(section, totals)
+                            section = (project, boq, name)
+                            totals = dict.fromkeys(SUBTOTAL_COLUMNS, 0.0)
+                            yield [project, boq, name] + [None] * (len(EXPORT_HEADER) - 3)
+                            continue
+                        if section and not section_line_id:
+                            # First line of another BOQ, before any of its sections
+                            yield self._subtotal_row(section, totals)
+                            section = None
+                        row = [
+                            project, boq, section and section[2], code, name, product, cost_types.get(cost_type), uom,
+                            quantity, rate, budget, consumed_qty, consumed_amt,
+                            quantity - consumed_qty, budget - consumed_amt,
+                            round(consumed_amt / budget * 100.0, 2) if budget else 0.0,
+                        ]
+                        for column in SUBTOTAL_COLUMNS:
+                            totals[column] += row[column]
+                        yield row
+            if section:
+                yield self._subtotal_row(section, totals)
+
+    def _subtotal_row(self, section, totals):
+        project, boq, name = section
+        row = [project, boq, 'Subtotal %s' % name] + [None] * (len(EXPORT_HEADER) - 3)
+        for column, total in totals.items():
+            row[column] = total
+        return row
+
+    def _stream_csv(self, rows, flush_every=1000):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_HEADER)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if count % flush_every == 0:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode('utf-8')
+
+    def _stream_xlsx(self, rows, chunk_size=65536):
+        with tempfile.TemporaryFile() as output:
+            workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'in_memory': False})
+            worksheet = workbook.add_worksheet('Budget vs Actual')
+            bold = workbook.add_format({'bold': True})
+            number = workbook.add_format({'num_format': '#,##0.00'})
+            worksheet.write_row(0, 0, EXPORT_HEADER, bold)
+            for row_index, row in enumerate(rows, 1):
+                # Section headings and subtotals in bold (they have no description)
+                cell_format = bold if row[4] is None else number
+                for column, value in enumerate(row):
+                    if isinstance(value, float):
+                        worksheet.write_number(row_index, column, value, cell_format)
+                    elif value is not None:
+                        worksheet.write_string(row_index, column, value, bold if row[4] is None else None)
+            workbook.close()
+            output.seek(0)
+            while True:
+                chunk = output.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
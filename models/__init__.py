@@ -1,9 +1,24 @@
 # -*- coding: utf-8 -*-
 from . import boq_section
 from . import boq
+from . import boq_forecast
 from . import boq_revision
 from . import purchase
 from . import stock
 from . import account_move
+from . import account_analytic_line
 from . import boq_report
-from . import project_task
\ No newline at end of file
+from . import boq_version_report
+from . import boq_evm
+from . import boq_alert
+from . import boq_perf
+from . import boq_lock
+from . import boq_queue
+from . import boq_recompute
+from . import boq_consistency
+from . import boq_analytic
+from . import boq_reconciliation
+from . import boq_product_health
+from . import boq_tracking
+from . import project_task
+from . import product
\ No newline at end of file
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import defaultdict
+
+from odoo import models, fields, api
+from odoo.exceptions import ValidationError
+
+_logger = logging.getLogger(__name__)
+
+
+class AccountAnalyticLine(models.Model):
+    _inherit = 'account.analytic.line'
+
+    boq_line_id = fields.Many2one(
+        'construction.boq.line',
+        string='BOQ Item',
+        index=True,
+        domain="[('boq_state', 'in', ('approved', 'locked')), ('boq_active', '=', True), ('display_type', '=', False)]",
+        help="BOQ line charged with this entry. Timesheets on a task with a single labour BOQ line are charged to it automatically."
+    )
+    boq_ingest_state = fields.Selection([
+        ('done', 'Recorded'),
+        ('failed', 'Failed'),
+    ], string='BOQ Ledger', readonly=True, copy=False,
+       help="Empty until the entry has been recorded in the BOQ consumption ledger.")
+    boq_ingest_error = fields.Text(string='BOQ Ledger Error', readonly=True, copy=False)
+
+    def init(self):
+        super().init()
+        cr = self.env.cr
+        # Pending entries are looked up by BOQ line or task, among the few not recorded yet
+        cr.execute("""
+            CREATE INDEX IF NOT EXISTS account_analytic_line_boq_pending_line_idx
+            ON account_analytic_line (boq_line_id)
+            WHERE boq_ingest_state IS NULL AND move_line_id IS NULL
+        """)
+        if 'task_id' in self._fields:
+            cr.execute("""
+                CREATE INDEX IF NOT EXISTS account_analytic_line_boq_pending_task_idx
+                ON account_analytic_line (task_id)
+                WHERE boq_ingest_state IS NULL AND move_line_id IS NULL
+            """)
+
+    # -------------------------------------------------------------------------
+    # TIMESHEET INGESTION
+    # -------------------------------------------------------------------------
+    @api.model
+    def _cron_ingest_boq_consumption(self, batch_size=10000):
+        """
+        Turn the timesheet entries not recorded yet into consumption ledger rows.
+
+        Entries are picked by their ingestion state, not by id, so an entry
+        committed late with a lower id is still recorded. They are aggregated
+        per BOQ line and day: one ledger row per aggregate, with the hours
+        converted to the unit of the line and the timesheet cost as amount.
+        Hours already worked are actuals, so they are recorded even over budget.
+        Entries that cannot be recorded (incompatible units) are marked failed
+        with their error and can be retried. Entries coming from journal items
+        are skipped, their cost is already recorded by the bill. Later edits of
+        recorded entries are not replayed.
+        """
+        while True:
+            entries = self._fetch_boq_timesheet_entries(batch_size)
+            if not entries:
+                break
+            self._ingest_boq_timesheet_entries(entries)
+            if len(entries) < batch_size:
+                break
+
+    @api.model
+    def _fetch_boq_timesheet_entries(self, batch_size):
+        """[(id, date, hours, cost, uom_id, boq_line_id)] of the next pending batch, BOQ line resolved in SQL."""
+        has_task = 'task_id' in self._fields
+        # Without hr_timesheet only the entries linked explicitly are ingested
+        task_join = """
+            LEFT JOIN (
+                SELECT task_id, MIN(id) AS boq_line_id
+                FROM construction_boq_line
+                WHERE task_id IS NOT NULL
+                AND cost_type = 'labor'
+                AND display_type IS NULL
+                AND boq_active
+                AND boq_state IN ('approved', 'locked')
+                GROUP BY task_id
+                HAVING COUNT(*) = 1
+            ) tl ON tl.task_id = aal.task_id
+        """ if has_task else ""
+        line_expr = "COALESCE(aal.boq_line_id, tl.boq_line_id)" if has_task else "aal.boq_line_id"
+        # Entries being edited are left for the next run
+        self.env.cr.execute("""
+            SELECT aal.id, aal.date, aal.unit_amount, -aal.amount, aal.product_uom_id, %s
+            FROM account_analytic_line aal
+            %s
+            WHERE aal.boq_ingest_state IS NULL
+            AND aal.move_line_id IS NULL
+            AND %s IS NOT NULL
+            ORDER BY aal.id
+            LIMIT %%s
+            FOR UPDATE OF aal SKIP LOCKED
+        """ % (line_expr, task_join, line_expr), (batch_size,))
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _ingest_boq_timesheet_entries(self, entries):
+        BOQLine = self.env['construction.boq.line'].sudo()
+        lines = BOQLine.browse({entry[5] for entry in entries})
+        line_uom = {line.id: line.uom_id.id for line in lines}
+
+        # Conversion factors per unit pair; a pair of incompatible units only fails its entries
+        factors = {}
+        unit_errors = {}
+        for pair in {(entry[4], line_uom[entry[5]]) for entry in entries}:
+            try:
+                factors.update(BOQLine._get_uom_factors([pair]))
+            except ValidationError as e:
+                unit_errors[pair] = str(e)
+
+        aggregates = defaultdict(lambda: [0.0, 0.0, 0, []])
+        failed = defaultdict(list)
+        for entry_id, date, hours, cost, uom_id, line_id in entries:
+            to_uom_id = line_uom[line_id]
+            if (uom_id, to_uom_id) in unit_errors:
+                failed[unit_errors[uom_id, to_uom_id]].append(entry_id)
+                continue
+            aggregate = aggregates[(line_id, date)]
+            aggregate[0] += BOQLine._convert_quantity(factors, hours or 0.0, uom_id, to_uom_id)
+            aggregate[1] += cost or 0.0
+            aggregate[2] = max(aggregate[2], entry_id)
+            aggregate[3].append(entry_id)
+
+        # source_id is the last timesheet entry of the aggregate
+        vals_list = [{
+            'boq_line_id': line_id,
+            'source_model': 'account.analytic.line',
+            'source_id': last_entry_id,
+            'quantity': quantity,
+            'amount': amount,
+            'date': date,
+            'user_id': self.env.user.id,
+        } for (line_id, date), (quantity, amount, last_entry_id, entry_ids) in aggregates.items()]
+
+        # Actuals are recorded over budget too: exceeding it is a reporting state
+        Consumption = self.env['construction.boq.consumption'].sudo().with_context(boq_record_actuals=True)
+        done = [entry_id for aggregate in aggregates.values() for entry_id in aggregate[3]]
+        if vals_list:
+            BOQLine.browse({vals['boq_line_id'] for vals in vals_list})._lock_for_consumption()
+            try:
+                with self.env.cr.savepoint():
+                    Consumption.create(vals_list)
+            except Exception:
+                # A failing aggregate must not block the others
+                done = []
+                for vals, aggregate in zip(vals_list, aggregates.values()):
+                    try:
+                        with self.env.cr.savepoint():
+                            Consumption.create(vals)
+                        done += aggregate[3]
+                    except Exception as e:
+                        failed[str(e)] += aggregate[3]
+
+        self._set_boq_ingest_state(done, 'done')
+        for error, entry_ids in failed.items():
+            _logger.warning("%s timesheet entries not recorded in the BOQ ledger: %s", len(entry_ids), error)
+            self._set_boq_ingest_state(entry_ids, 'failed', error)
+
+    @api.model
+    def _set_boq_ingest_state(self, entry_ids, state, error=None):
+        # In SQL: validated or locked timesheets must not be rewritten through the ORM
+        if not entry_ids:
+            return
+        self.env.cr.execute("""
+            UPDATE account_analytic_line
+            SET boq_ingest_state = %s, boq_ingest_error = %s
+            WHERE id = ANY(%s)
+        """, (state, error, list(entry_ids)))
+        self.browse(entry_ids).invalidate_recordset(['boq_ingest_state', 'boq_ingest_error'])
+
+    def action_retry_boq_ingestion(self):
+        """Put failed entries back in the queue of the next ingestion run."""
+        self._set_boq_ingest_state(self.filtered(lambda l: l.boq_ingest_state == 'failed').ids, None)
@@ -18,6 +18,11 @@ class AccountMove(models.Model):
         if not moves_to_process:
             return super(AccountMove, self).action_post()
         
+        with self.env['construction.boq.perf.log']._track('account.move.action_post', len(moves_to_process)) as perf:
+            return self._action_post_boq(moves_to_process, perf)
+
+    def _action_post_boq(self, moves_to_process, perf):
+        """Record the BOQ consumption of moves_to_process, then post (see action_post)."""
         Consumption = self.env['construction.boq.consumption']
         
         # Collect all BOQ lines that need to be locked
@@ -30,21 +35,25 @@ class AccountMove(models.Model):
                     boq_lines_to_lock.add(line.boq_line_id.id)
                     lines_with_boq.append((move, line))
         
-        # Step 3.2: Implement Concurrency Locking - Lock all BOQ lines at once
+        # Step 3.2: Implement Concurrency Locking - Lock all BOQ lines at once, in id order
         if boq_lines_to_lock:
-            self.env.cr.execute(
-                """
-                SELECT id FROM construction_boq_line
-                WHERE id IN %s FOR UPDATE
-                """,
-                (tuple(boq_lines_to_lock),)
-            )
-            
-            # Bulk invalidate cache for all BOQ lines
-            boq_line_ids = list(boq_lines_to_lock)
-            boq_lines = self.env['construction.boq.line'].browse(boq_line_ids)
-            boq_lines.invalidate_recordset(['id'])
+            boq_lines = self.env['construction.boq.line'].browse(list(boq_lines_to_lock))
+            lock_wait = boq_lines._lock_for_consumption()
+            if perf is not None:
+                perf['lock_wait'] += lock_wait
         
+        # Reservations waiting in the deferred queue count as consumed.
+        # In deferred mode the lines of this batch reserve budget as they go.
+        Queue = self.env['construction.boq.consumption.queue'].sudo()
+        deferred = Queue._is_deferred()
+        pending = Queue._get_pending(list(boq_lines_to_lock))
+
+        # Quantities are recorded in the unit of the BOQ line
+        BOQLine = self.env['construction.boq.line']
+        uom_factors = BOQLine._get_uom_factors(
+            (line.product_uom_id.id, line.boq_line_id.uom_id.id) for move, line in lines_with_boq
+        )
+
         # Group lines by company and currency for batch processing
         consumption_vals_list = []
         
@@ -52,8 +61,10 @@ class AccountMove(models.Model):
             # Determine direction: Refund reduces consumption, Invoice increases it
             sign = -1 if move.move_type in ('in_refund', 'out_refund') else 1
             
-            # Convert quantity based on move type
-            qty_to_consume = line.quantity * sign
+            # Convert quantity based on move type, in the BOQ line unit
+            qty_to_consume = BOQLine._convert_quantity(
+                uom_factors, line.quantity, line.product_uom_id.id, line.boq_line_id.uom_id.id
+            ) * sign
             
             # Handle Currency Conversion for Amount
             # BOQ is in Company Currency, Bill might be in Foreign Currency
@@ -74,8 +85,11 @@ class AccountMove(models.Model):
             # Validate Limits - batch validation would be better but depends on implementation
             # We check positive consumption against remaining budget.
             # Refunds (negative) are generally allowed as they free up budget.
+            pending_qty, pending_amount = pending.get(line.boq_line_id.id, (0.0, 0.0))
             if sign > 0:
-                line.boq_line_id.check_consumption(qty_to_consume, amount_to_consume)
+                line.boq_line_id.check_consumption(qty_to_consume + pending_qty, amount_to_consume + pending_amount)
+            if deferred:
+                pending[line.boq_line_id.id] = (pending_qty + qty_to_consume, pending_amount + amount_to_consume)
             
             # Prepare consumption entry
             consumption_vals_list.append({
@@ -88,9 +102,12 @@ class AccountMove(models.Model):
                 'user_id': self.env.user.id
             })
         
-        # Create all consumption records in batch
+        # Create all consumption records in batch (or queue them, see _cron_process_queue)
         if consumption_vals_list:
-            Consumption.create(consumption_vals_list)
+            if deferred:
+                Queue.create(consumption_vals_list)
+            else:
+                Consumption.create(consumption_vals_list)
         
         # 2. Call super to perform standard posting
         return super(AccountMove, self).action_post()
@@ -103,10 +120,15 @@ class AccountMoveLine(models.Model):
         string='BOQ Item',
         index=True,
         # [FIX] Added display_type = False to domain
-        domain="[('boq_id.state', 'in', ('approved', 'locked')), ('display_type', '=', False)]",
+        domain="[('boq_state', 'in', ('approved', 'locked')), ('boq_active', '=', True), ('display_type', '=', False)]",
         help="Link this invoice line to a BOQ line for cost tracking."
     )
 
+    boq_activity_code = fields.Char(
+        string='Activity Code',
+        help="Schedule activity code used to link this line to a BOQ line automatically (e.g. on supplier invoice imports)."
+    )
+
     @api.model_create_multi
     def create(self, vals_list):
         """
@@ -125,15 +147,13 @@ class AccountMoveLine(models.Model):
         # Bulk fetch purchase order lines with their BOQ lines
         if purchase_line_ids:
             po_lines = self.env['purchase.order.line'].browse(purchase_line_ids)
-            # Use read() to fetch specific fields efficiently
-            po_line_data = po_lines.read(['id', 'boq_line_id', 'boq_line_id.analytic_distribution'])
             
-            # Create mapping for quick lookup
+            # Create mapping for quick lookup (analytics come from the BOQ line lookup cache)
             po_line_info = {}
-            for data in po_line_data:
-                po_line_info[data['id']] = {
-                    'boq_line_id': data['boq_line_id'][0] if data['boq_line_id'] else False,
-                    'analytic_distribution': data.get('boq_line_id.analytic_distribution', False)
+            for po_line in po_lines:
+                po_line_info[po_line.id] = {
+                    'boq_line_id': po_line.boq_line_id.id,
+                    'analytic_distribution': po_line.boq_line_id and po_line.boq_line_id._get_lookup_values()['analytic_distribution'],
                 }
             
             # Apply the BOQ line information
@@ -145,7 +165,63 @@ class AccountMoveLine(models.Model):
                     if info['analytic_distribution'] and not vals_list[i].get('analytic_distribution'):
                         vals_list[i]['analytic_distribution'] = info['analytic_distribution']
         
-        return super(AccountMoveLine, self).create(vals_list)
+        lines = super(AccountMoveLine, self).create(vals_list)
+        lines._auto_link_boq_lines()
+        return lines
+
+    def _auto_link_boq_lines(self):
+        """
+        Fill in the BOQ line of vendor bill lines from their project and activity
+        code or product, resolving the whole batch against one prebuilt map.
+        The project comes from the purchase order or the analytic distribution.
+        """
+        candidates = self.filtered(
+            lambda l: not l.boq_line_id
+            and l.display_type == 'product'
+            and (l.boq_activity_code or l.product_id)
+            and l.move_id.is_purchase_document(include_receipts=True)
+        )
+        if not candidates:
+            return
+
+        analytic_account_ids = {
+            int(account_id)
+            for line in candidates
+            for key in (line.analytic_distribution or {})
+            for account_id in key.split(',')
+        }
+        project_by_account = {}
+        if analytic_account_ids:
+            projects = self.env['project.project'].sudo().search([('account_id', 'in', list(analytic_account_ids))])
+            project_by_account = {project.account_id.id: project.id for project in projects}
+
+        keys = []
+        for line in candidates:
+            project_id = line.purchase_line_id.order_id.project_id.id
+            if not project_id:
+                project_id = next((
+                    project_by_account[int(account_id)]
+                    for key in (line.analytic_distribution or {})
+                    for account_id in key.split(',')
+                    if int(account_id) in project_by_account
+                ), False)
+            keys.append((project_id, line.boq_activity_code, line.product_id.id))
+
+        resolved = self.env['construction.boq.line'].sudo()._resolve_boq_lines(keys)
+
+        # One write per BOQ line (and analytic need), not per bill line
+        groups = defaultdict(list)
+        for line, boq_line_id in zip(candidates, resolved):
+            if boq_line_id:
+                groups[(boq_line_id, bool(line.analytic_distribution))].append(line.id)
+        for (boq_line_id, has_analytics), line_ids in groups.items():
+            vals = {'boq_line_id': boq_line_id}
+            if not has_analytics:
+                boq_line = self.env['construction.boq.line'].browse(boq_line_id)
+                analytic_distribution = boq_line._get_lookup_values()['analytic_distribution']
+                if analytic_distribution:
+                    vals['analytic_distribution'] = analytic_distribution
+            self.browse(line_ids).write(vals)
 
     @api.onchange('purchase_line_id')
     def _onchange_purchase_line_id_boq(self):
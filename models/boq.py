@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 import re
-from odoo import models, fields, api, _
+from collections import Counter
+from odoo import models, fields, api, _, Command
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools import SQL, float_round, ormcache
 
 class ConstructionBOQ(models.Model):
     _name = 'construction.boq'
@@ -20,6 +22,11 @@ class ConstructionBOQ(models.Model):
     # -- Versioning Fields --
     version = fields.Integer(string='Version', default=1, required=True, readonly=True, copy=False, help="Version number of the BOQ, incremented on revision.")
     previous_boq_id = fields.Many2one('construction.boq', string='Previous Version', readonly=True, copy=False)
+    # Lineage key shared by every version of the same BOQ (the first archived snapshot, or the BOQ itself
+    # until it is revised). Lets the version history resolve with a single indexed lookup.
+    root_boq_id = fields.Many2one(
+        'construction.boq', string='Original Version', compute='_compute_root_boq_id',
+        store=True, recursive=True, index=True, readonly=True, copy=False)
     
     state = fields.Selection([
         ('draft', 'Draft'),
@@ -33,6 +40,8 @@ class ConstructionBOQ(models.Model):
     approved_by = fields.Many2one('res.users', string='Approved By', readonly=True, copy=False, tracking=True)
     currency_id = fields.Many2one('res.currency', related='company_id.currency_id', string='Currency', readonly=True)
     
+    # Lines are only copied into revision snapshots (see copy_data), so every archived
+    # version keeps its own budget while Duplicate still starts from an empty BOQ.
     boq_line_ids = fields.One2many('construction.boq.line', 'boq_id', string='BOQ Lines')
     total_budget = fields.Monetary(string='Total Budget', compute='_compute_total_budget', currency_field='currency_id', store=True, tracking=True)
     
@@ -40,33 +49,36 @@ class ConstructionBOQ(models.Model):
     
     display_revision_ids = fields.Many2many('construction.boq.revision', compute='_compute_display_revision_ids', string='Revision History')
 
-    @api.depends('project_id', 'revision_ids')
+    @api.depends('previous_boq_id.root_boq_id')
+    def _compute_root_boq_id(self):
+        for boq in self:
+            boq.root_boq_id = boq.previous_boq_id.root_boq_id or boq.previous_boq_id or boq
+
+    @api.depends('root_boq_id', 'revision_ids')
     def _compute_display_revision_ids(self):
-        if not self:
-            self.display_revision_ids = False
-            return
-            
-        project_ids = self.mapped('project_id').ids
-        if not project_ids:
+        # Every version of a BOQ shares the same root, so the whole history of the
+        # recordset is fetched with one query on the indexed lineage key.
+        root_ids = [boq.root_boq_id.id for boq in self if boq.id and boq.root_boq_id.id]
+        if not root_ids:
             self.display_revision_ids = False
             return
-            
+
         revisions = self.env['construction.boq.revision'].search([
-            '|', ('original_boq_id.project_id', 'in', project_ids),
-                 ('new_boq_id.project_id', 'in', project_ids)
+            ('root_boq_id', 'in', root_ids)
         ])
-        
+
         revision_map = {}
         for revision in revisions:
-            original_project_id = revision.original_boq_id.project_id.id
-            revision_map.setdefault(original_project_id, []).append(revision.id)
-            new_project_id = revision.new_boq_id.project_id.id
-            revision_map.setdefault(new_project_id, []).append(revision.id)
-        
+            revision_map.setdefault(revision.root_boq_id.id, []).append(revision.id)
+
         for boq in self:
-            revision_ids = revision_map.get(boq.project_id.id, [])
+            revision_ids = revision_map.get(boq.root_boq_id.id, [])
             boq.display_revision_ids = [(6, 0, revision_ids)]
 
+    def _get_lineage_domain(self):
+        """Domain matching every version (active or archived) of the BOQs in self."""
+        return [('root_boq_id', 'in', self.mapped('root_boq_id').ids)]
+
     @api.depends('boq_line_ids.budget_amount', 'currency_id')
     def _compute_total_budget(self):
         for rec in self:
@@ -80,29 +92,66 @@ class ConstructionBOQ(models.Model):
             self.analytic_account_id = self.project_id.account_id
 
     # -- Workflow Actions --
+    # Every action works on whole recordsets (e.g. locking the portfolio at year end
+    # from the list view): validations are grouped queries and the chatter is batched.
     def action_submit(self):
         # [FIX] Ensure we have actual product lines, not just sections
-        boqs_with_valid_lines = self.filtered(lambda r: r.boq_line_ids.filtered(lambda l: not l.display_type))
+        boqs_with_valid_lines = self._get_boqs_with_lines([('display_type', '=', False)])
         if len(boqs_with_valid_lines) != len(self):
             raise ValidationError(_('You cannot submit a BOQ with no product lines.'))
         
-        self.write({'state': 'submitted'})
+        self._write_workflow_state({'state': 'submitted'})
 
     def action_approve(self):
         self._check_boq_before_approval()
         self._check_one_active_boq()
         
-        self.write({
+        self._write_workflow_state({
             'state': 'approved',
             'approval_date': fields.Date.today(),
             'approved_by': self.env.user.id
         })
 
     def action_lock(self):
-        self.write({'state': 'locked'})
+        self._write_workflow_state({'state': 'locked'})
 
     def action_close(self):
-        self.write({'state': 'closed'})
+        self._write_workflow_state({'state': 'closed'})
+
+    def _get_boqs_with_lines(self, line_domain=None):
+        """BOQs of self having at least one line matching line_domain, in one grouped query."""
+        if not self:
+            return self
+        groups = self.env['construction.boq.line']._read_group(
+            [('boq_id', 'in', self.ids)] + (line_domain or []),
+            ['boq_id'],
+        )
+        return self.browse([boq.id for boq, in groups])
+
+    def _write_workflow_state(self, vals):
+        """
+        Write a workflow transition on the whole recordset.
+
+        A single BOQ keeps the regular field tracking. For several BOQs the
+        per-record tracking is disabled and one note per BOQ is logged in a
+        single batch instead.
+        """
+        if len(self) <= 1:
+            return self.write(vals)
+
+        state_label = dict(self._fields['state']._description_selection(self.env))[vals['state']]
+        result = self.with_context(tracking_disable=True).write(vals)
+        body = _('Status changed to %s.') % state_label
+        self._message_log_batch(bodies={boq.id: body for boq in self})
+        return result
+
+    def action_export_budget(self):
+        """Download the budget vs actual of the BOQs, streamed by /construction_boq/export."""
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/construction_boq/export?format=xlsx&boq_ids=%s' % ','.join(map(str, self.ids)),
+            'target': 'self',
+        }
 
     def action_view_history(self):
         self.ensure_one()
@@ -111,7 +160,7 @@ class ConstructionBOQ(models.Model):
             'type': 'ir.actions.act_window',
             'res_model': 'construction.boq',
             'view_mode': 'list,form',
-            'domain': [('project_id', '=', self.project_id.id), ('id', '!=', self.id)],
+            'domain': self._get_lineage_domain() + [('id', '!=', self.id)],
             'context': {'active_test': False},
         }
 
@@ -130,9 +179,14 @@ class ConstructionBOQ(models.Model):
         if not boqs_to_revise:
             return
             
+        with self.env['construction.boq.perf.log']._track('construction.boq.create_revision_snapshot', len(boqs_to_revise)):
+            boqs_to_revise._create_revision_snapshot()
+
+    def _create_revision_snapshot(self):
+        boqs_to_revise = self
         revision_vals_list = []
         boq_update_vals = {}
-        messages_to_post = []
+        messages_to_post = {}
         
         for boq in boqs_to_revise:
             base_name = re.sub(r' \(v\d+\)$', '', boq.name)
@@ -164,7 +218,7 @@ class ConstructionBOQ(models.Model):
                 'approved_by': False,
             }
             
-            messages_to_post.append((boq, f"Content modified. Archived v{new_version-1} and upgraded to v{new_version}."))
+            messages_to_post[boq.id] = f"Content modified. Archived v{new_version-1} and upgraded to v{new_version}."
         
         if revision_vals_list:
             self.env['construction.boq.revision'].create(revision_vals_list)
@@ -172,8 +226,15 @@ class ConstructionBOQ(models.Model):
         for boq_id, vals in boq_update_vals.items():
             super(ConstructionBOQ, self.browse(boq_id)).write(vals)
         
-        for boq, body in messages_to_post:
-            boq.message_post(body=body)
+        # One note per BOQ, or buffered into the session summary (see construction.boq.tracking.buffer)
+        boqs_to_revise._message_post_or_buffer(messages_to_post)
+
+    def copy_data(self, default=None):
+        vals_list = super(ConstructionBOQ, self).copy_data(default=default)
+        if self.env.context.get('revision_copy'):
+            for boq, vals in zip(self, vals_list):
+                vals['boq_line_ids'] = [Command.create(line_vals) for line_vals in boq.boq_line_ids.copy_data()]
+        return vals_list
 
     def write(self, vals):
         if self.env.context.get('revision_copy'):
@@ -181,7 +242,7 @@ class ConstructionBOQ(models.Model):
         
         ignore_fields = [
             'message_follower_ids', 'state', 'approval_date', 'approved_by',
-            'active', 'total_budget', 'previous_boq_id', 'revision_ids',
+            'active', 'total_budget', 'previous_boq_id', 'root_boq_id', 'revision_ids',
             'display_revision_ids', 'write_date', 'write_uid', 'name'
         ]
         
@@ -203,7 +264,7 @@ class ConstructionBOQ(models.Model):
         if not boqs_to_check:
             return
             
-        boqs_without_lines = boqs_to_check.filtered(lambda b: not b.boq_line_ids)
+        boqs_without_lines = boqs_to_check - boqs_to_check._get_boqs_with_lines()
         if boqs_without_lines:
             raise ValidationError(_('BOQ cannot be approved without BOQ lines.'))
 
@@ -213,20 +274,14 @@ class ConstructionBOQ(models.Model):
         if not active_boqs:
             return
             
-        project_version_pairs = [
-            (boq.project_id.id, boq.version)
-            for boq in active_boqs
-        ]
-        
-        for project_id, version in project_version_pairs:
-            duplicate_count = self.search_count([
-                ('project_id', '=', project_id),
-                ('version', '=', version),
-                ('active', '=', True),
-                ('id', 'in', active_boqs.ids)
-            ])
-            if duplicate_count > 1:
-                raise ValidationError(_('An active BOQ with this version already exists for this project.'))
+        # Counted in memory over the batch: no query per (project, version) pair
+        pair_counts = Counter((boq.project_id.id, boq.version) for boq in active_boqs)
+        duplicates = active_boqs.filtered(lambda b: pair_counts[(b.project_id.id, b.version)] > 1)
+        if duplicates:
+            raise ValidationError(
+                _('An active BOQ with this version already exists for this project.')
+                + '\n' + '\n'.join(duplicates.mapped('display_name'))
+            )
 
     def _check_one_active_boq(self):
         if not self:
@@ -243,8 +298,12 @@ class ConstructionBOQ(models.Model):
             ('active', '=', True)
         ])
         
+        # BOQs approved together must also target distinct projects
+        project_counts = Counter(boq.project_id.id for boq in self)
+        existing_boqs |= self.filtered(lambda b: b.project_id and project_counts[b.project_id.id] > 1)
+
         if existing_boqs:
-            project_names = existing_boqs.mapped('project_id.name')
+            project_names = sorted(set(existing_boqs.mapped('project_id.name')))
             raise ValidationError(
                 _('There is already an active (Approved or Locked) BOQ for project(s): %s. Please revise the existing one.') %
                 ', '.join(project_names)
@@ -254,6 +313,7 @@ class ConstructionBOQLine(models.Model):
     _name = 'construction.boq.line'
     _description = 'BOQ Line Item'
     _order = 'sequence, id'
+    _rec_names_search = ['search_key']
     
     _inherit = ['analytic.mixin'] 
 
@@ -270,8 +330,15 @@ class ConstructionBOQLine(models.Model):
     
     section_id = fields.Many2one('construction.boq.section', string='Section')
 
+    # Section heading (display_type = 'line_section') the line sits under, following the line order.
+    section_line_id = fields.Many2one('construction.boq.line', string='Section Heading', compute='_compute_section_line_id', store=True, index=True, ondelete='set null')
+
+    # Versioning: snapshot copies point back to the live line they were copied from,
+    # so the same budget item can be followed across BOQ versions.
+    root_line_id = fields.Many2one('construction.boq.line', string='Original Line', readonly=True, copy=False, index=True, ondelete='set null')
+
     # Product Information
-    product_id = fields.Many2one('product.product', string='Product',
+    product_id = fields.Many2one('product.product', string='Product', index=True,
         domain="[('company_id', 'in', (company_id, False))]")
     
     name = fields.Char(string='Description', required=True)
@@ -296,8 +363,16 @@ class ConstructionBOQLine(models.Model):
     # [FIX] Updated domain to use local project_id instead of parent.project_id
     task_id = fields.Many2one('project.task', string='Task', domain="[('project_id', '=', project_id)]")
     activity_code = fields.Char(string='Activity Code', help="Code used to link this BOQ line to a specific project task or schedule activity.")
+
+    # Combined text (description, product code, section, activity code) behind a pg_trgm index
+    search_key = fields.Char(string='Search Key', compute='_compute_search_key', store=True, index='trigram')
     
     company_id = fields.Many2one('res.company', related='boq_id.company_id', string='Company', store=True, readonly=True)
+
+    # Denormalised header status so BOQ item dropdowns filter without joining construction_boq
+    # (see the partial indexes in init()).
+    boq_state = fields.Selection(related='boq_id.state', string='BOQ Status', store=True, readonly=True)
+    boq_active = fields.Boolean(related='boq_id.active', string='BOQ Active', store=True, readonly=True)
     
     currency_id = fields.Many2one('res.currency', related='company_id.currency_id', string='Currency', readonly=True, store=True)
     
@@ -334,22 +409,34 @@ class ConstructionBOQLine(models.Model):
                 if rec.quantity <= 0:
                       raise ValidationError(_('Quantity must be positive for BOQ line: %s') % rec.name)
 
+    @api.depends('boq_id.boq_line_ids.sequence', 'boq_id.boq_line_ids.display_type')
+    def _compute_section_line_id(self):
+        self.section_line_id = False
+        for boq in self.mapped('boq_id'):
+            section = self.browse()
+            for line in boq.boq_line_ids.sorted('sequence'):
+                if line.display_type == 'line_section':
+                    section = line
+                elif line in self:
+                    line.section_line_id = section
+
+    @api.depends('name', 'activity_code', 'task_id.activity_code', 'product_id.default_code', 'section_line_id.name')
+    def _compute_search_key(self):
+        for rec in self:
+            parts = [
+                rec.activity_code or rec.task_id.activity_code,
+                rec.product_id.default_code,
+                rec.section_line_id.name,
+                rec.name,
+            ]
+            rec.search_key = ' '.join(part for part in parts if part) or False
+
     @api.depends('product_id')
     def _compute_product_config_valid(self):
+        # Read from the per product and company health index (see construction.boq.product.health)
+        health = self._get_product_health()
         for rec in self:
-            if not rec.product_id:
-                rec.product_config_valid = False
-                continue
-                
-            valid = True
-            if not rec.product_id.uom_id:
-                valid = False
-            if not rec.product_id.standard_price:
-                valid = False
-            if not rec.product_id.property_account_expense_id and not rec.product_id.categ_id.property_account_expense_categ_id:
-                valid = False
-                
-            rec.product_config_valid = valid
+            rec.product_config_valid = rec.id in health and not any(health[rec.id])
 
     @api.depends('quantity', 'estimated_rate')
     def _compute_budget_amount(self):
@@ -433,17 +520,17 @@ class ConstructionBOQLine(models.Model):
             self.uom_id = self.product_id.uom_id
             self.estimated_rate = self.product_id.standard_price
             
-            account = self.product_id.property_account_expense_id or self.product_id.categ_id.property_account_expense_categ_id
-            if account:
-                self.expense_account_id = account
+            missing_uom, missing_price, missing_account = self._get_product_health().get(self.id, (False, False, False))
+            if not missing_account:
+                self.expense_account_id = self.product_id.property_account_expense_id or self.product_id.categ_id.property_account_expense_categ_id
             
             # [FIX] Check for missing configurations but allow user to fix them
             warnings = []
-            if not self.product_id.uom_id:
+            if missing_uom:
                 warnings.append(_('Unit of Measure is missing.'))
-            if not self.product_id.standard_price:
+            if missing_price:
                 warnings.append(_('Standard Price is missing.'))
-            if not self.product_id.property_account_expense_id and not self.product_id.categ_id.property_account_expense_categ_id:
+            if missing_account:
                 warnings.append(_('Expense Account is missing.'))
 
             if warnings:
@@ -476,18 +563,114 @@ class ConstructionBOQLine(models.Model):
         """
         FIX: Updated to allow fallback to product account if line account is missing.
         """
-        for rec in self.filtered(lambda r: r.product_id and r.display_type is False):
-            if not rec.product_id.uom_id:
+        lines = self.filtered(lambda r: r.product_id and r.display_type is False)
+        health = lines._get_product_health()
+        for rec in lines:
+            missing_uom, missing_price, missing_account = health.get(rec.id, (False, False, False))
+            if missing_uom:
                 raise ValidationError(_('Product "%s" is not properly configured. Unit of Measure is missing.') % rec.product_id.name)
             
             # [FIX] Check if account exists on line OR product before raising error
-            account = rec.expense_account_id or \
-                      rec.product_id.property_account_expense_id or \
-                      rec.product_id.categ_id.property_account_expense_categ_id
-                      
-            if not account:
+            if missing_account and not rec.expense_account_id:
                 raise ValidationError(_('Product "%s" is not properly configured. Expense Account is missing.') % rec.product_id.name)
 
+    def init(self):
+        # Partial indexes covering only the lines that can be picked on bills, pickings and POs
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS construction_boq_line_selectable_boq_product_idx
+            ON construction_boq_line (boq_id, product_id)
+            WHERE display_type IS NULL AND boq_active AND boq_state IN ('approved', 'locked')
+        """)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS construction_boq_line_selectable_product_idx
+            ON construction_boq_line (product_id)
+            WHERE display_type IS NULL AND boq_active AND boq_state IN ('approved', 'locked')
+        """)
+
+    @api.model
+    def _name_search(self, name, domain=None, operator='ilike', limit=None, order=None):
+        # Domains still filtering through the header (e.g. from other modules) are rewritten
+        # onto the denormalised columns so they hit the partial indexes.
+        rewritten = []
+        for leaf in domain or []:
+            if isinstance(leaf, (list, tuple)) and len(leaf) == 3 and leaf[0] == 'boq_id.state':
+                rewritten += ['&', ('boq_state', leaf[1], leaf[2]), ('boq_active', '=', True)]
+            else:
+                rewritten.append(leaf)
+        query = super(ConstructionBOQLine, self)._name_search(name, rewritten, operator, limit, order)
+
+        # Rank partial matches by trigram similarity instead of the line sequence
+        if name and operator in ('ilike', 'like', '=ilike') and not order and self.env.registry.has_trigram:
+            query.order = SQL(
+                "word_similarity(%s, %s) DESC, %s",
+                name,
+                SQL.identifier(query.table, 'search_key'),
+                SQL.identifier(query.table, 'id'),
+            )
+        return query
+
+    # -------------------------------------------------------------------------
+    # ACTIVITY CODE / PRODUCT RESOLUTION
+    # -------------------------------------------------------------------------
+    @api.model
+    def _get_selectable_domain(self):
+        """Lines that can be linked to bills, stock moves and purchase lines."""
+        return [('boq_state', 'in', ('approved', 'locked')), ('boq_active', '=', True), ('display_type', '=', False)]
+
+    @api.model
+    def _build_resolution_map(self, project_ids):
+        """
+        Prebuilt map for a whole batch: {(project_id, activity_code, product_id): line_id}.
+        Partial keys (code only, product only) are included too; keys matching
+        several lines are ambiguous and map to False.
+        """
+        resolution_map = {}
+        if not project_ids:
+            return resolution_map
+        lines = self.search_fetch(
+            self._get_selectable_domain() + [('project_id', 'in', list(project_ids))],
+            ['project_id', 'activity_code', 'product_id'],
+        )
+        for line in lines:
+            code = (line.activity_code or '').strip().upper() or False
+            project_id = line.project_id.id
+            product_id = line.product_id.id
+            keys = {(project_id, code, product_id), (project_id, False, product_id)}
+            if code:
+                keys.add((project_id, code, False))
+            for key in keys:
+                resolution_map[key] = line.id if key not in resolution_map else False
+        return resolution_map
+
+    @api.model
+    def _resolve_boq_lines(self, keys, require_product=False):
+        """
+        Resolve a batch of (project_id, activity_code, product_id) keys to BOQ line ids
+        with a single search. A given activity code must match (together with the
+        product when there is one, else alone unless ``require_product``); without a
+        code the product must identify a single line. Unmatched or ambiguous keys
+        resolve to False.
+        """
+        resolution_map = self._build_resolution_map({key[0] for key in keys if key[0]})
+        result = []
+        for project_id, activity_code, product_id in keys:
+            code = (activity_code or '').strip().upper() or False
+            if code:
+                candidates = [(project_id, code, product_id or False)]
+                if product_id and not require_product:
+                    candidates.append((project_id, code, False))
+            else:
+                candidates = [(project_id, False, product_id)] if product_id else []
+            line_id = False
+            for candidate in candidates:
+                if require_product and not candidate[2]:
+                    continue
+                line_id = resolution_map.get(candidate, False)
+                if line_id:
+                    break
+            result.append(line_id)
+        return result
+
     def check_consumption(self, qty, amount):
         self.ensure_one()
         # [FIX] Bypass consumption check for sections/notes
@@ -500,6 +683,98 @@ class ConstructionBOQLine(models.Model):
             if amount > self.remaining_amount + 0.01:
                  raise ValidationError(_('BOQ Budget Exceeded for %s.') % self.name)
 
+    # -------------------------------------------------------------------------
+    # UOM CONVERSION
+    # -------------------------------------------------------------------------
+    @api.model
+    def _get_uom_factors(self, pairs):
+        """
+        Conversion table {(from_uom_id, to_uom_id): (factor, rounding)} for the
+        distinct pairs of a batch, computed once per pair from one read of the
+        units. The factor is the one of uom.uom._compute_quantity, but converted
+        quantities are rounded HALF-UP to the target unit (_compute_quantity
+        rounds UP by default).
+        Raises when a pair mixes units of different categories.
+        """
+        pairs = {(from_id, to_id) for from_id, to_id in pairs if from_id and to_id and from_id != to_id}
+        if not pairs:
+            return {}
+        uoms = self.env['uom.uom'].browse({uom_id for pair in pairs for uom_id in pair})
+        uom_by_id = {uom.id: uom for uom in uoms}
+
+        factors = {}
+        mismatches = []
+        for from_id, to_id in pairs:
+            from_uom, to_uom = uom_by_id[from_id], uom_by_id[to_id]
+            if from_uom.category_id != to_uom.category_id:
+                mismatches.append(_('%s cannot be converted to %s') % (from_uom.name, to_uom.name))
+                continue
+            factors[(from_id, to_id)] = (to_uom.factor / from_uom.factor, to_uom.rounding)
+        if mismatches:
+            raise ValidationError(
+                _('The unit of measure of the document does not match the BOQ line unit category:\n%s') % '\n'.join(mismatches)
+            )
+        return factors
+
+    @api.model
+    def _convert_quantity(self, factors, quantity, from_uom_id, to_uom_id):
+        """Convert with a table from _get_uom_factors: no query per quantity."""
+        if not from_uom_id or not to_uom_id or from_uom_id == to_uom_id:
+            return quantity
+        factor, rounding = factors[(from_uom_id, to_uom_id)]
+        return float_round(quantity * factor, precision_rounding=rounding)
+
+    # -------------------------------------------------------------------------
+    # LOOKUP CACHE
+    # -------------------------------------------------------------------------
+    @api.model
+    @ormcache('line_id', 'line_write_date', 'template_write_date', 'categ_write_date')
+    def _get_cached_lookup_values(self, line_id, line_write_date, template_write_date, categ_write_date):
+        """
+        Resolved accounting attributes of a line, kept in the registry cache:
+        (expense account id, analytic distribution items, product id, uom id).
+
+        The key carries the write dates of the line, product template and
+        category the values are resolved from: any change to them yields a new
+        key, so entries never need to be cleared and stale ones age out of the
+        LRU. Values are immutable so the cached entry cannot be altered by
+        callers; use _get_lookup_values() to read them.
+        """
+        return self._resolve_lookup_values(line_id)
+
+    @api.model
+    def _resolve_lookup_values(self, line_id):
+        # Expense account: line > product > category fallback, in the company of the line
+        line = self.sudo().browse(line_id)
+        if not line.exists():
+            return (False, (), False, False)
+        line = line.with_company(line.company_id)
+        account = line.expense_account_id or \
+                  line.product_id.property_account_expense_id or \
+                  line.product_id.categ_id.property_account_expense_categ_id
+        return (
+            account.id,
+            tuple(sorted((line.analytic_distribution or {}).items())),
+            line.product_id.id,
+            line.uom_id.id,
+        )
+
+    def _get_lookup_values(self):
+        self.ensure_one()
+        line = self.sudo()
+        write_dates = (line.write_date, line.product_id.product_tmpl_id.write_date, line.product_id.categ_id.write_date)
+        if self.env.cr.now() in write_dates:
+            # Changed in this transaction: several writes share the same write date
+            account_id, distribution, product_id, uom_id = self._resolve_lookup_values(self.id)
+        else:
+            account_id, distribution, product_id, uom_id = self._get_cached_lookup_values(self.id, *write_dates)
+        return {
+            'expense_account_id': account_id,
+            'analytic_distribution': dict(distribution) or False,
+            'product_id': product_id,
+            'uom_id': uom_id,
+        }
+
     # -------------------------------------------------------------------------
     # PROPAGATE VERSIONING FROM LINE CHANGES
     # -------------------------------------------------------------------------
@@ -530,6 +805,13 @@ class ConstructionBOQLine(models.Model):
             boqs.filtered(lambda b: b.state in ['submitted', 'approved', 'locked']).create_revision_snapshot()
         return super(ConstructionBOQLine, self).unlink()
 
+    def copy_data(self, default=None):
+        vals_list = super(ConstructionBOQLine, self).copy_data(default=default)
+        if self.env.context.get('revision_copy'):
+            for line, vals in zip(self, vals_list):
+                vals['root_line_id'] = line.root_line_id.id or line.id
+        return vals_list
+
     def action_open_advanced_view(self):
         self.ensure_one()
         return {
@@ -577,7 +859,8 @@ class ConstructionBOQConsumption(models.Model):
 
                 qty = vals.get('quantity', 0.0)
                 amt = vals.get('amount', 0.0)
-                if qty > 0 or amt > 0:
+                # Actuals already incurred (timesheets) are recorded over budget too
+                if (qty > 0 or amt > 0) and not self.env.context.get('boq_record_actuals'):
                     line.check_consumption(qty, amt)
         return super(ConstructionBOQConsumption, self).create(vals_list)
     
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import defaultdict
+
+from markupsafe import Markup
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+from odoo.tools import format_amount
+
+_logger = logging.getLogger(__name__)
+
+
+class ConstructionBOQAlertThreshold(models.Model):
+    _name = 'construction.boq.alert.threshold'
+    _description = 'BOQ Budget Alert Threshold'
+    _order = 'boq_id, cost_type, threshold_percent'
+
+    company_id = fields.Many2one('res.company', string='Company', required=True, default=lambda self: self.env.company)
+    boq_id = fields.Many2one('construction.boq', string='BOQ Reference', index=True, ondelete='cascade',
+                             help="Leave empty to apply to every BOQ of the company.")
+    cost_type = fields.Selection([
+        ('material', 'Material'),
+        ('labor', 'Labor'),
+        ('subcontract', 'Subcontract'),
+        ('service', 'Service'),
+        ('overhead', 'Overhead')
+    ], string='Cost Type', help="Leave empty to apply to every cost type.")
+    threshold_percent = fields.Float(string='Threshold (%)', required=True, default=90.0,
+                                     help="An alert is raised when the consumed amount of a line crosses this percentage of its budget.")
+    user_id = fields.Many2one('res.users', string='Notify', help="User receiving the alert activity. Defaults to the BOQ approver, then its creator.")
+    active = fields.Boolean(string='Active', default=True)
+
+    _sql_constraints = [
+        ('threshold_percent_positive', 'CHECK(threshold_percent > 0)', 'The alert threshold must be positive.'),
+    ]
+
+    def init(self):
+        # One active threshold per company, BOQ and cost type (empty BOQ / cost type included)
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS construction_boq_alert_threshold_scope_uniq
+                    ON construction_boq_alert_threshold (company_id, COALESCE(boq_id, 0), COALESCE(cost_type, ''))
+                    WHERE active
+                """)
+        except Exception:
+            _logger.warning("Duplicate BOQ alert thresholds found, unique index not created", exc_info=True)
+
+    @api.constrains('company_id', 'boq_id', 'cost_type', 'active')
+    def _check_unique_scope(self):
+        thresholds = self.filtered('active')
+        if not thresholds:
+            return
+        groups = self._read_group(
+            [('company_id', 'in', thresholds.company_id.ids)],
+            ['company_id', 'boq_id', 'cost_type'], ['__count'],
+            having=[('__count', '>', 1)],
+        )
+        if groups:
+            raise ValidationError(_(
+                'Only one alert threshold can be defined per company, BOQ and cost type:\n%s'
+            ) % '\n'.join(
+                '%s / %s / %s' % (company.name, boq.name or _('All BOQs'), cost_type or _('All cost types'))
+                for company, boq, cost_type, count in groups
+            ))
+
+    # -------------------------------------------------------------------------
+    # EVALUATION
+    # -------------------------------------------------------------------------
+    @api.model
+    def _cron_evaluate_thresholds(self):
+        """
+        Evaluate the thresholds against the consumption recorded since the last run.
+
+        Each line keeps the consumed amount it was last evaluated at; only lines
+        whose stored consumed amount moved since are read (through a partial
+        index), so each run costs work proportional to the new consumption.
+        Unlike a ledger id cursor, consumption committed late by a concurrent
+        transaction is never skipped: it moves the stored amount of its line.
+        """
+        self.env.cr.execute("""
+            SELECT id, consumed_amount, alert_evaluated_amount
+            FROM construction_boq_line
+            WHERE consumed_amount IS DISTINCT FROM alert_evaluated_amount
+        """)
+        evaluated = {line_id: (consumed or 0.0, (consumed or 0.0) - (previous or 0.0)) for line_id, consumed, previous in self.env.cr.fetchall()}
+        if not evaluated:
+            return
+
+        crossings = self._get_threshold_crossings({line_id: delta for line_id, (consumed, delta) in evaluated.items()})
+        self._notify_crossings(crossings)
+
+        # The amounts read above, not the current ones: a later change is evaluated next run
+        line_ids = list(evaluated)
+        self.env.cr.execute("""
+            UPDATE construction_boq_line l
+            SET alert_evaluated_amount = v.amount
+            FROM unnest(%s::int[], %s::numeric[]) AS v(id, amount)
+            WHERE l.id = v.id
+        """, (line_ids, [evaluated[line_id][0] for line_id in line_ids]))
+        self.env['construction.boq.line'].invalidate_model(['alert_evaluated_amount'])
+
+    @api.model
+    def _get_threshold_crossings(self, new_amounts):
+        """
+        Return {boq: [(line, threshold, percent)]} for lines whose consumed percentage
+        went from below to at-or-above their threshold with the new amounts.
+        """
+        thresholds = self._get_threshold_map()
+        if not thresholds:
+            return {}
+
+        crossings = defaultdict(list)
+        lines = self.env['construction.boq.line'].sudo().browse(list(new_amounts))
+        for line in lines.filtered(lambda l: not l.display_type and l.budget_amount > 0):
+            threshold = self._match_threshold(thresholds, line)
+            if not threshold:
+                continue
+            percent_after = line.consumed_amount / line.budget_amount * 100.0
+            percent_before = (line.consumed_amount - new_amounts[line.id]) / line.budget_amount * 100.0
+            if percent_before < threshold.threshold_percent <= percent_after:
+                crossings[line.boq_id].append((line, threshold, percent_after))
+        return crossings
+
+    @api.model
+    def _get_threshold_map(self):
+        return {
+            (threshold.company_id.id, threshold.boq_id.id, threshold.cost_type): threshold
+            for threshold in self.sudo().search([])
+        }
+
+    @api.model
+    def _match_threshold(self, thresholds, line):
+        """Most specific threshold first: BOQ and cost type, BOQ, cost type, company default."""
+        company_id = line.company_id.id
+        for key in (
+            (company_id, line.boq_id.id, line.cost_type),
+            (company_id, line.boq_id.id, False),
+            (company_id, False, line.cost_type),
+            (company_id, False, False),
+        ):
+            if key in thresholds:
+                return thresholds[key]
+        return False
+
+    @api.model
+    def _notify_crossings(self, crossings):
+        """One warning activity per BOQ listing every line that crossed, created in a single batch."""
+        if not crossings:
+            return
+        activity_type = self.env.ref('mail.mail_activity_data_warning', raise_if_not_found=False)
+        model_id = self.env['ir.model']._get_id('construction.boq')
+        today = fields.Date.context_today(self)
+
+        activity_vals_list = []
+        for boq, entries in crossings.items():
+            items = Markup().join(
+                Markup("<li>%s: %.1f%% of %s consumed (threshold %.0f%%)</li>") % (
+                    line.name,
+                    percent,
+                    format_amount(self.env, line.budget_amount, line.currency_id),
+                    threshold.threshold_percent,
+                )
+                for line, threshold, percent in entries
+            )
+            user = entries[0][1].user_id or boq.approved_by or boq.create_uid
+            activity_vals_list.append({
+                'res_model_id': model_id,
+                'res_id': boq.id,
+                'activity_type_id': activity_type.id if activity_type else False,
+                'summary': _('Budget threshold reached on %s line(s)') % len(entries),
+                'note': Markup("<ul>%s</ul>") % items,
+                'user_id': user.id,
+                'date_deadline': today,
+            })
+        self.env['mail.activity'].sudo().create(activity_vals_list)
+
+
+class ConstructionBOQLine(models.Model):
+    _inherit = 'construction.boq.line'
+
+    alert_evaluated_amount = fields.Monetary(
+        string='Consumed Amount at Last Alert Check', currency_field='currency_id',
+        default=0.0, readonly=True, copy=False,
+    )
+
+    def init(self):
+        super().init()
+        cr = self.env.cr
+        cr.execute("""
+            CREATE INDEX IF NOT EXISTS construction_boq_line_alert_pending_idx
+            ON construction_boq_line (id)
+            WHERE consumed_amount IS DISTINCT FROM alert_evaluated_amount
+        """)
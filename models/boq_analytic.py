@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, tools
+
+
+class ConstructionBOQLineAnalytic(models.Model):
+    _name = 'construction.boq.line.analytic'
+    _description = 'BOQ Line Analytic Distribution Index'
+    _order = 'boq_line_id, analytic_account_id'
+    _rec_name = 'analytic_account_id'
+
+    # One row per (line, analytic account) of the line's analytic_distribution,
+    # maintained in SQL on line create/write (see ConstructionBOQLine._sync_analytic_index)
+    boq_line_id = fields.Many2one('construction.boq.line', string='BOQ Line', required=True, readonly=True, index=True, ondelete='cascade')
+    analytic_account_id = fields.Many2one('account.analytic.account', string='Analytic Account', required=True, readonly=True, ondelete='cascade')
+    percentage = fields.Float(string='Percentage', readonly=True)
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS construction_boq_line_analytic_account_line_idx
+            ON construction_boq_line_analytic (analytic_account_id, boq_line_id)
+        """)
+        # Backfill on install / upgrade
+        self.env.cr.execute("SELECT 1 FROM construction_boq_line_analytic LIMIT 1")
+        if not self.env.cr.fetchone():
+            self.env['construction.boq.line']._sync_analytic_index()
+
+
+class ConstructionBOQLine(models.Model):
+    _inherit = 'construction.boq.line'
+
+    analytic_index_ids = fields.One2many('construction.boq.line.analytic', 'boq_line_id', string='Analytic Index')
+
+    @api.model
+    def _sync_analytic_index(self, line_ids=None):
+        """
+        Rebuild the analytic index of the lines (all lines when line_ids is None)
+        from their analytic_distribution, in two statements. Keys combining
+        several accounts ("1,2") give the percentage to each account.
+        """
+        cr = self.env.cr
+        line_filter = "TRUE" if line_ids is None else "l.id IN %(line_ids)s"
+        params = {'line_ids': tuple(line_ids or ()) or (0,), 'uid': self.env.uid}
+        cr.execute("""
+            DELETE FROM construction_boq_line_analytic
+            WHERE %s
+        """ % ("TRUE" if line_ids is None else "boq_line_id IN %(line_ids)s"), params)
+        cr.execute("""
+            INSERT INTO construction_boq_line_analytic
+                (boq_line_id, analytic_account_id, percentage, create_uid, create_date, write_uid, write_date)
+            SELECT d.line_id, a.id, SUM(d.percentage), %%(uid)s, NOW() AT TIME ZONE 'UTC', %%(uid)s, NOW() AT TIME ZONE 'UTC'
+            FROM (
+                SELECT l.id AS line_id, account_key::int AS account_id, dist.value::float AS percentage
+                FROM construction_boq_line l
+                CROSS JOIN LATERAL jsonb_each_text(l.analytic_distribution) AS dist
+                CROSS JOIN LATERAL unnest(string_to_array(dist.key, ',')) AS account_key
+                WHERE %s
+                AND l.analytic_distribution IS NOT NULL
+                AND jsonb_typeof(l.analytic_distribution) = 'object'
+            ) d
+            JOIN account_analytic_account a ON a.id = d.account_id
+            GROUP BY d.line_id, a.id
+        """ % line_filter, params)
+        self.env['construction.boq.line.analytic'].invalidate_model()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        lines.filtered('analytic_distribution')._flush_analytic_index()
+        return lines
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'analytic_distribution' in vals:
+            self._flush_analytic_index()
+        return res
+
+    def _flush_analytic_index(self):
+        if self:
+            self.flush_recordset(['analytic_distribution'])
+            self._sync_analytic_index(self.ids)
+
+
+class ConstructionBOQAnalyticReport(models.Model):
+    _name = 'construction.boq.analytic.report'
+    _description = 'BOQ Budget by Analytic Account'
+    _auto = False
+    _rec_name = 'analytic_account_id'
+    _order = 'analytic_account_id, project_id'
+
+    # Dimensions
+    analytic_account_id = fields.Many2one('account.analytic.account', string='Analytic Account', readonly=True)
+    analytic_plan_id = fields.Many2one('account.analytic.plan', string='Analytic Plan', readonly=True)
+    boq_line_id = fields.Many2one('construction.boq.line', string='BOQ Line', readonly=True)
+    boq_id = fields.Many2one('construction.boq', string='BOQ Reference', readonly=True)
+    project_id = fields.Many2one('project.project', string='Project', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('submitted', 'Submitted'),
+        ('approved', 'Approved'),
+        ('locked', 'Locked'),
+        ('closed', 'Closed')
+    ], string='Status', readonly=True)
+    cost_type = fields.Selection([
+        ('material', 'Material'),
+        ('labor', 'Labor'),
+        ('subcontract', 'Subcontract'),
+        ('service', 'Service'),
+        ('overhead', 'Overhead')
+    ], string='Cost Type', readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Currency', readonly=True)
+    percentage = fields.Float(string='Distribution %', readonly=True, group_operator='avg')
+
+    # Measures: share of the line charged to the analytic account
+    budget_amount = fields.Monetary(string='Budget Amount', readonly=True)
+    consumed_amount = fields.Monetary(string='Actual Amount', readonly=True)
+    remaining_amount = fields.Monetary(string='Remaining Amount', readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+
+        # Indexed join on the normalised distribution: no JSON decoding per row.
+        # Only the current version of each BOQ is counted.
+        query = """
+            CREATE OR REPLACE VIEW %s AS (
+                SELECT
+                    x.id,
+                    x.analytic_account_id,
+                    a.plan_id AS analytic_plan_id,
+                    l.id AS boq_line_id,
+                    l.boq_id,
+                    l.project_id,
+                    l.company_id,
+                    l.boq_state AS state,
+                    l.cost_type,
+                    l.currency_id,
+                    x.percentage,
+                    l.budget_amount * x.percentage / 100.0 AS budget_amount,
+                    l.consumed_amount * x.percentage / 100.0 AS consumed_amount,
+                    l.remaining_amount * x.percentage / 100.0 AS remaining_amount
+                FROM construction_boq_line_analytic x
+                INNER JOIN construction_boq_line l ON l.id = x.boq_line_id
+                INNER JOIN account_analytic_account a ON a.id = x.analytic_account_id
+                WHERE l.display_type IS NULL
+                AND l.boq_active
+            )
+        """ % self._table
+
+        self.env.cr.execute(query)
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# Ledger quantities are converted to the unit of the BOQ line and rounded to it
+# (see ConstructionBOQLine._convert_quantity): every quantity check uses that rounding.
+QUANTITY_TOLERANCE = "COALESCE(%s.rounding, 0.0001)"
+
+# Vendor bills and receipts post their BOQ consumption (see AccountMove.action_post)
+INVOICE_TYPES = ('out_invoice', 'out_refund', 'in_invoice', 'in_refund', 'out_receipt', 'in_receipt')
+
+# Rate of a currency at the bill date, company rate first (see res.currency._get_rates)
+CURRENCY_RATE = """LEFT JOIN LATERAL (
+                    SELECT r.rate FROM res_currency_rate r
+                    WHERE r.currency_id = %(currency)s
+                    AND r.name <= COALESCE(am.date, CURRENT_DATE)
+                    AND (r.company_id IS NULL OR r.company_id = am.company_id)
+                    ORDER BY r.company_id, r.name DESC
+                    LIMIT 1
+                ) %(alias)s ON aml.currency_id != bl.currency_id"""
+
+
+class ConstructionBOQConsistencyIssue(models.Model):
+    _name = 'construction.boq.consistency.issue'
+    _description = 'BOQ Ledger Consistency Issue'
+    _order = 'check_date desc, issue_type, boq_line_id'
+    _rec_name = 'boq_line_id'
+
+    check_date = fields.Datetime(string='Checked On', required=True, readonly=True, index=True)
+    issue_type = fields.Selection([
+        ('stored_total', 'Stored Totals Differ From Ledger'),
+        ('ledger_missing', 'Missing Ledger Entry'),
+        ('ledger_orphan', 'Orphan Ledger Entry'),
+        ('quantity_mismatch', 'Ledger Quantity Mismatch'),
+        ('amount_mismatch', 'Ledger Amount Mismatch'),
+    ], string='Issue', required=True, readonly=True, index=True)
+    boq_line_id = fields.Many2one('construction.boq.line', string='BOQ Line', readonly=True, index=True, ondelete='cascade')
+    boq_id = fields.Many2one(related='boq_line_id.boq_id', string='BOQ Reference')
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    currency_id = fields.Many2one(related='boq_line_id.currency_id', string='Currency')
+
+    source_model = fields.Char(string='Source Model', readonly=True)
+    source_id = fields.Integer(string='Source ID', readonly=True)
+
+    # Stored totals vs ledger, or ledger vs source document
+    stored_quantity = fields.Float(string='Recorded Qty', readonly=True)
+    expected_quantity = fields.Float(string='Expected Qty', readonly=True)
+    stored_amount = fields.Monetary(string='Recorded Amount', readonly=True)
+    expected_amount = fields.Monetary(string='Expected Amount', readonly=True)
+
+    state = fields.Selection([
+        ('open', 'Open'),
+        ('repaired', 'Repaired'),
+    ], string='Status', default='open', required=True, readonly=True, index=True)
+
+    # -------------------------------------------------------------------------
+    # CHECK
+    # -------------------------------------------------------------------------
+    @api.model
+    def _cron_check(self):
+        self._run_check()
+        # Stored totals are safe to repair unattended; ledger issues are left for review
+        self.search([('issue_type', '=', 'stored_total'), ('state', '=', 'open')])._repair_stored_totals(
+            auto_commit=not getattr(threading.current_thread(), 'testing', False))
+
+    @api.model
+    def _run_check(self):
+        """
+        Replace the open issues with the result of a new check of the whole database.
+
+        Each check is a single INSERT ... SELECT: stored line totals against the
+        ledger aggregates, then the ledger against the posted bill lines and the
+        done stock moves that reference it. Returns the number of issues found.
+        """
+        self.env.flush_all()
+        cr = self.env.cr
+        cr.execute("DELETE FROM construction_boq_consistency_issue WHERE state = 'open'")
+        params = {
+            'now': fields.Datetime.now(),
+            'uid': self.env.uid,
+            'invoice_types': INVOICE_TYPES,
+        }
+        count = 0
+        for query in (self._get_stored_total_query(), self._get_bill_ledger_query(), self._get_stock_ledger_query()):
+            cr.execute("""
+                INSERT INTO construction_boq_consistency_issue (
+                    check_date, issue_type, boq_line_id, company_id, source_model, source_id,
+                    stored_quantity, expected_quantity, stored_amount, expected_amount,
+                    state, create_uid, create_date, write_uid, write_date
+                )
+                SELECT
+                    %(now)s, i.issue_type, i.boq_line_id, l.company_id, i.source_model, i.source_id,
+                    i.stored_quantity, i.expected_quantity, i.stored_amount, i.expected_amount,
+                    'open', %(uid)s, %(now)s, %(uid)s, %(now)s
+                FROM (""" + query + """) i
+                LEFT JOIN construction_boq_line l ON l.id = i.boq_line_id
+            """, params)
+            count += cr.rowcount
+        self.invalidate_model()
+        _logger.info("BOQ consistency check: %s issue(s) found", count)
+        return count
+
+    @api.model
+    def _get_stored_total_query(self):
+        # Quantities within the rounding of the line unit, amounts within the currency rounding
+        return """
+            SELECT
+                'stored_total' AS issue_type, l.id AS boq_line_id,
+                NULL AS source_model, NULL::int AS source_id,
+                l.consumed_quantity AS stored_quantity, COALESCE(g.quantity, 0.0) AS expected_quantity,
+                l.consumed_amount AS stored_amount, COALESCE(g.amount, 0.0) AS expected_amount
+            FROM construction_boq_line l
+            LEFT JOIN (
+                SELECT c.boq_line_id, SUM(c.quantity) AS quantity, SUM(c.amount) AS amount
+                FROM construction_boq_consumption c
+                GROUP BY c.boq_line_id
+            ) g ON g.boq_line_id = l.id
+            LEFT JOIN res_currency cur ON cur.id = l.currency_id
+            LEFT JOIN uom_uom tu ON tu.id = l.uom_id
+            WHERE l.display_type IS NULL
+            AND (
+                ABS(COALESCE(l.consumed_quantity, 0.0) - COALESCE(g.quantity, 0.0)) >= """ + QUANTITY_TOLERANCE % 'tu' + """
+                OR ABS(COALESCE(l.remaining_quantity, 0.0) - (COALESCE(l.quantity, 0.0) - COALESCE(g.quantity, 0.0))) >= """ + QUANTITY_TOLERANCE % 'tu' + """
+                OR ABS(COALESCE(l.consumed_amount, 0.0) - COALESCE(g.amount, 0.0)) >= COALESCE(cur.rounding, 0.01)
+                OR ABS(COALESCE(l.budget_amount, 0.0) - COALESCE(l.quantity, 0.0) * COALESCE(l.estimated_rate, 0.0)) >= COALESCE(cur.rounding, 0.01)
+                OR ABS(COALESCE(l.remaining_amount, 0.0) - (COALESCE(l.budget_amount, 0.0) - COALESCE(g.amount, 0.0))) >= COALESCE(cur.rounding, 0.01)
+            )
+        """
+
+    @api.model
+    def _get_bill_ledger_query(self):
+        # Amounts are converted to the BOQ currency at the bill date, as posted (see AccountMove._action_post_boq).
+        # Reservations still waiting in the deferred queue are not missing.
+        return """
+            WITH sources AS (
+                SELECT
+                    aml.id, aml.boq_line_id, tu.rounding, cur.rounding AS currency_rounding,
+                    aml.quantity * COALESCE(tu.factor / NULLIF(fu.factor, 0.0), 1.0)
+                        * CASE WHEN am.move_type IN ('in_refund', 'out_refund') THEN -1 ELSE 1 END AS quantity,
+                    aml.price_subtotal
+                        * CASE WHEN aml.currency_id = bl.currency_id THEN 1.0
+                               ELSE COALESCE(tr.rate, 1.0) / NULLIF(COALESCE(fr.rate, 1.0), 0.0) END
+                        * CASE WHEN am.move_type IN ('in_refund', 'out_refund') THEN -1 ELSE 1 END AS amount
+                FROM account_move_line aml
+                JOIN account_move am ON am.id = aml.move_id
+                JOIN construction_boq_line bl ON bl.id = aml.boq_line_id
+                LEFT JOIN uom_uom fu ON fu.id = aml.product_uom_id
+                LEFT JOIN uom_uom tu ON tu.id = bl.uom_id
+                LEFT JOIN res_currency cur ON cur.id = bl.currency_id
+                """ + CURRENCY_RATE % {'currency': 'aml.currency_id', 'alias': 'fr'} + """
+                """ + CURRENCY_RATE % {'currency': 'bl.currency_id', 'alias': 'tr'} + """
+                WHERE aml.boq_line_id IS NOT NULL
+                AND aml.display_type = 'product'
+                AND am.state = 'posted'
+                AND am.move_type IN %(invoice_types)s
+            ),
+            ledger AS (
+                SELECT c.source_id, c.boq_line_id, SUM(c.quantity) AS quantity, SUM(c.amount) AS amount
+                FROM construction_boq_consumption c
+                WHERE c.source_model = 'account.move.line'
+                GROUP BY c.source_id, c.boq_line_id
+            )
+            SELECT
+                CASE WHEN g.source_id IS NULL THEN 'ledger_missing'
+                     WHEN s.id IS NULL THEN 'ledger_orphan'
+                     WHEN ABS(s.quantity - g.quantity) >= """ + QUANTITY_TOLERANCE % 's' + """ THEN 'quantity_mismatch'
+                     ELSE 'amount_mismatch' END AS issue_type,
+                COALESCE(s.boq_line_id, g.boq_line_id) AS boq_line_id,
+                'account.move.line' AS source_model, COALESCE(s.id, g.source_id) AS source_id,
+                g.quantity AS stored_quantity, s.quantity AS expected_quantity,
+                g.amount AS stored_amount, s.amount AS expected_amount
+            FROM sources s
+            FULL OUTER JOIN ledger g ON g.source_id = s.id AND g.boq_line_id = s.boq_line_id
+            WHERE (
+                g.source_id IS NULL AND NOT EXISTS (
+                    SELECT 1 FROM construction_boq_consumption_queue q
+                    WHERE q.source_model = 'account.move.line' AND q.source_id = s.id
+                )
+            )
+            OR s.id IS NULL
+            OR ABS(s.quantity - g.quantity) >= """ + QUANTITY_TOLERANCE % 's' + """
+            OR ABS(s.amount - g.amount) >= COALESCE(s.currency_rounding, 0.01)
+        """
+
+    @api.model
+    def _get_stock_ledger_query(self):
+        return """
+            WITH sources AS (
+                SELECT sm.id, sm.boq_line_id, tu.rounding, sm.quantity * COALESCE(tu.factor / NULLIF(fu.factor, 0.0), 1.0) AS quantity
+                FROM stock_move sm
+                JOIN stock_location dest ON dest.id = sm.location_dest_id
+                JOIN stock_location src ON src.id = sm.location_id
+                JOIN construction_boq_line bl ON bl.id = sm.boq_line_id
+                LEFT JOIN uom_uom fu ON fu.id = sm.product_uom
+                LEFT JOIN uom_uom tu ON tu.id = bl.uom_id
+                WHERE sm.boq_line_id IS NOT NULL
+                AND sm.state = 'done'
+                AND dest.usage IN ('customer', 'production')
+                -- Dropship / direct to site: consumed by the vendor bill (see StockMove._records_boq_consumption)
+                AND src.usage != 'supplier'
+            ),
+            ledger AS (
+                SELECT c.source_id, c.boq_line_id, SUM(c.quantity) AS quantity, SUM(c.amount) AS amount
+                FROM construction_boq_consumption c
+                WHERE c.source_model = 'stock.move'
+                GROUP BY c.source_id, c.boq_line_id
+            )
+            SELECT
+                CASE WHEN g.source_id IS NULL THEN 'ledger_missing'
+                     WHEN s.id IS NULL THEN 'ledger_orphan'
+                     ELSE 'quantity_mismatch' END AS issue_type,
+                COALESCE(s.boq_line_id, g.boq_line_id) AS boq_line_id,
+                'stock.move' AS source_model, COALESCE(s.id, g.source_id) AS source_id,
+                g.quantity AS stored_quantity, s.quantity AS expected_quantity,
+                g.amount AS stored_amount, NULL::numeric AS expected_amount
+            FROM sources s
+            FULL OUTER JOIN ledger g ON g.source_id = s.id AND g.boq_line_id = s.boq_line_id
+            WHERE g.source_id IS NULL
+            OR s.id IS NULL
+            OR ABS(s.quantity - g.quantity) >= """ + QUANTITY_TOLERANCE % 's' + """
+        """
+
+    # -------------------------------------------------------------------------
+    # REPAIR
+    # -------------------------------------------------------------------------
+    def action_repair(self):
+        """Recompute the stored totals of the lines of the selected issues (ledger issues need a manual fix)."""
+        issues = self.filtered(lambda i: i.issue_type == 'stored_total' and i.state == 'open')
+        if not issues:
+            raise UserError(_('Only open "Stored Totals Differ From Ledger" issues can be repaired automatically.'))
+        issues._repair_stored_totals()
+
+    @api.model
+    def action_run_check(self):
+        self._run_check()
+        return self.env['ir.actions.act_window']._for_xml_id('entrpryz_construction_boq.action_construction_boq_consistency_issue')
+
+    def _repair_stored_totals(self, batch_size=1000, auto_commit=False):
+        """Recompute only the affected lines, batch by batch, with the set-based recompute."""
+        Line = self.env['construction.boq.line']
+        line_ids = sorted(set(self.boq_line_id.ids))
+        for batch_start in range(0, len(line_ids), batch_size):
+            batch = line_ids[batch_start:batch_start + batch_size]
+            Line._recompute_stored_totals(ids=batch)
+            batch_ids = set(batch)
+            self.filtered(lambda i: i.boq_line_id.id in batch_ids).write({'state': 'repaired'})
+            self.env.flush_all()
+            if auto_commit:
+                self.env.cr.commit()
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from odoo import models, fields, api, _
+from odoo.tools import date_utils
+
+EVM_LEVELS = [
+    ('project', 'Project'),
+    ('boq', 'BOQ'),
+    ('section', 'Section'),
+    ('cost_type', 'Cost Type'),
+]
+
+COST_TYPES = ['material', 'labor', 'subcontract', 'service', 'overhead']
+
+
+class ConstructionBOQEVM(models.Model):
+    _name = 'construction.boq.evm'
+    _description = 'BOQ Earned Value Metrics'
+    _order = 'period_date desc, project_id, boq_id, level'
+    _rec_name = 'project_id'
+
+    # Dimensions
+    period_date = fields.Date(string='Period', required=True, index=True, readonly=True, help="Last day of the period the metrics are measured at.")
+    level = fields.Selection(EVM_LEVELS, string='Level', required=True, index=True, readonly=True)
+    project_id = fields.Many2one('project.project', string='Project', required=True, index=True, readonly=True, ondelete='cascade')
+    boq_id = fields.Many2one('construction.boq', string='BOQ Reference', index=True, readonly=True, ondelete='cascade')
+    section_line_id = fields.Many2one('construction.boq.line', string='Section', readonly=True, ondelete='cascade')
+    cost_type = fields.Selection([
+        ('material', 'Material'),
+        ('labor', 'Labor'),
+        ('subcontract', 'Subcontract'),
+        ('service', 'Service'),
+        ('overhead', 'Overhead')
+    ], string='Cost Type', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', required=True, readonly=True)
+    currency_id = fields.Many2one('res.currency', related='company_id.currency_id', string='Currency', readonly=True)
+
+    # Measures
+    budget_at_completion = fields.Monetary(string='BAC', readonly=True, help="Budget At Completion: total budget of the lines.")
+    planned_value = fields.Monetary(string='PV', readonly=True, help="Planned Value: budget scheduled to be done by the end of the period.")
+    earned_value = fields.Monetary(string='EV', readonly=True, help="Earned Value: budget of the quantities actually done.")
+    actual_cost = fields.Monetary(string='AC', readonly=True, help="Actual Cost recorded in the consumption ledger up to the end of the period.")
+    cost_variance = fields.Monetary(string='CV', readonly=True, help="EV - AC")
+    schedule_variance = fields.Monetary(string='SV', readonly=True, help="EV - PV")
+    cpi = fields.Float(string='CPI', readonly=True, digits=(16, 3), group_operator="avg", help="Cost Performance Index: EV / AC")
+    spi = fields.Float(string='SPI', readonly=True, digits=(16, 3), group_operator="avg", help="Schedule Performance Index: EV / PV")
+    estimate_at_completion = fields.Monetary(string='EAC', readonly=True, help="Estimate At Completion: BAC / CPI")
+    estimate_to_complete = fields.Monetary(string='ETC', readonly=True, help="Estimate To Complete: EAC - AC")
+
+    # -------------------------------------------------------------------------
+    # REFRESH
+    # -------------------------------------------------------------------------
+    @api.model
+    def _cron_refresh_metrics(self):
+        """Refresh the metrics of the current period for BOQs whose inputs changed since the last run."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        started_at = fields.Datetime.now()
+        last_refresh = ICP.get_param('construction_boq.evm_last_refresh')
+        period_date = date_utils.end_of(fields.Date.context_today(self), 'month')
+
+        boq_ids = self._get_boqs_to_refresh(period_date, last_refresh)
+        self.refresh_metrics(period_date, boq_ids)
+        ICP.set_param('construction_boq.evm_last_refresh', fields.Datetime.to_string(started_at))
+
+    @api.model
+    def _get_boqs_to_refresh(self, period_date, last_refresh):
+        """
+        Active BOQs without metrics for the period, plus those whose lines, ledger,
+        header or schedule tasks changed since the last refresh.
+        """
+        query = """
+            SELECT b.id
+            FROM construction_boq b
+            WHERE b.active = True
+            AND b.state IN ('approved', 'locked', 'closed')
+            AND (
+                NOT EXISTS (
+                    SELECT 1 FROM construction_boq_evm e
+                    WHERE e.boq_id = b.id AND e.period_date = %(period)s
+                )
+        """
+        params = {'period': period_date}
+        if last_refresh:
+            query += """
+                OR b.write_date >= %(last)s
+                OR EXISTS (
+                    SELECT 1 FROM construction_boq_line l
+                    WHERE l.boq_id = b.id AND l.write_date >= %(last)s
+                )
+                OR EXISTS (
+                    SELECT 1 FROM construction_boq_line l
+                    JOIN construction_boq_consumption c ON c.boq_line_id = l.id
+                    WHERE l.boq_id = b.id AND c.create_date >= %(last)s
+                )
+                OR EXISTS (
+                    SELECT 1 FROM construction_boq_line l
+                    JOIN project_task t ON t.id = l.task_id
+                    WHERE l.boq_id = b.id AND t.write_date >= %(last)s
+                )
+            """
+            params['last'] = last_refresh
+        query += ")"
+        self.env.cr.execute(query, params)
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def refresh_metrics(self, period_date, boq_ids, batch_size=500):
+        """
+        Recompute and store the metrics of ``period_date`` for the given BOQs.
+        Batches are made of whole projects so project level rows always cover
+        every active BOQ of the project.
+        """
+        if not boq_ids:
+            return
+
+        self.env.cr.execute("""
+            SELECT b.project_id, ARRAY_AGG(b.id ORDER BY b.id)
+            FROM construction_boq b
+            WHERE b.active = True
+            AND b.state IN ('approved', 'locked', 'closed')
+            AND b.project_id IN (SELECT project_id FROM construction_boq WHERE id IN %s)
+            GROUP BY b.project_id
+            ORDER BY b.project_id
+        """, (tuple(boq_ids),))
+
+        batches = [[]]
+        project_batches = [[]]
+        for project_id, project_boq_ids in self.env.cr.fetchall():
+            if batches[-1] and len(batches[-1]) + len(project_boq_ids) > batch_size:
+                batches.append([])
+                project_batches.append([])
+            batches[-1].extend(project_boq_ids)
+            project_batches[-1].append(project_id)
+
+        for batch_ids, project_ids in zip(batches, project_batches):
+            if not batch_ids:
+                continue
+            self.search([
+                ('period_date', '=', period_date),
+                ('project_id', 'in', project_ids),
+            ]).unlink()
+            self.create(self._compute_metrics(period_date, batch_ids))
+
+    # -------------------------------------------------------------------------
+    # ENGINE
+    # -------------------------------------------------------------------------
+    @api.model
+    def _fetch_line_data(self, period_date, boq_ids):
+        """Line level inputs (budget, actuals up to the period and schedule) in two queries."""
+        Task = self.env['project.task']
+        start_column = 'planned_date_begin' if 'planned_date_begin' in Task._fields and Task._fields['planned_date_begin'].store else None
+        start_sql = 't.%s::date' % start_column if start_column else 'NULL::date'
+
+        self.env.cr.execute("""
+            SELECT
+                l.id, l.boq_id, b.project_id, b.company_id,
+                COALESCE(l.section_line_id, 0), l.cost_type,
+                l.quantity, l.budget_amount,
+                COALESCE(%s, b.approval_date) AS start_date,
+                t.date_deadline::date AS end_date
+            FROM construction_boq_line l
+            JOIN construction_boq b ON b.id = l.boq_id
+            LEFT JOIN project_task t ON t.id = l.task_id
+            WHERE l.boq_id IN %%s
+            AND l.display_type IS NULL
+            ORDER BY l.id
+        """ % start_sql, (tuple(boq_ids),))
+        lines = self.env.cr.fetchall()
+        if not lines:
+            return lines, {}
+
+        self.env.cr.execute("""
+            SELECT c.boq_line_id, SUM(c.quantity), SUM(c.amount)
+            FROM construction_boq_consumption c
+            JOIN construction_boq_line l ON l.id = c.boq_line_id
+            WHERE l.boq_id IN %s
+            AND c.date <= %s
+            GROUP BY c.boq_line_id
+        """, (tuple(boq_ids), period_date))
+        actuals = {line_id: (qty, amount) for line_id, qty, amount in self.env.cr.fetchall()}
+        return lines, actuals
+
+    @api.model
+    def _compute_metrics(self, period_date, boq_ids):
+        """
+        Vectorised EVM over every line of the BOQs, aggregated to each level with bincount.
+
+        Earned value uses quantity progress (consumed qty / budget qty, capped at 100%).
+        Planned value spreads the budget linearly between the task start (or the BOQ
+        approval date) and the task deadline; lines without a deadline are treated as
+        on schedule (PV = EV).
+        """
+        lines, actuals = self._fetch_line_data(period_date, boq_ids)
+        if not lines:
+            return []
+
+        count = len(lines)
+        line_ids = np.fromiter((row[0] for row in lines), dtype=np.int64, count=count)
+        boq = np.fromiter((row[1] for row in lines), dtype=np.int64, count=count)
+        project = np.fromiter((row[2] for row in lines), dtype=np.int64, count=count)
+        company = np.fromiter((row[3] for row in lines), dtype=np.int64, count=count)
+        section = np.fromiter((row[4] for row in lines), dtype=np.int64, count=count)
+        cost_type = np.fromiter((COST_TYPES.index(row[5]) if row[5] in COST_TYPES else -1 for row in lines), dtype=np.int64, count=count)
+        quantity = np.fromiter((row[6] or 0.0 for row in lines), dtype=float, count=count)
+        bac = np.fromiter((row[7] or 0.0 for row in lines), dtype=float, count=count)
+        start = np.fromiter((row[8].toordinal() if row[8] else np.nan for row in lines), dtype=float, count=count)
+        end = np.fromiter((row[9].toordinal() if row[9] else np.nan for row in lines), dtype=float, count=count)
+        consumed_qty = np.fromiter((actuals.get(line_id, (0.0, 0.0))[0] or 0.0 for line_id in line_ids), dtype=float, count=count)
+        actual_cost = np.fromiter((actuals.get(line_id, (0.0, 0.0))[1] or 0.0 for line_id in line_ids), dtype=float, count=count)
+
+        # Earned Value: physical progress from quantities
+        progress = np.clip(np.divide(consumed_qty, quantity, out=np.zeros(count), where=quantity > 0), 0.0, 1.0)
+        earned_value = bac * progress
+
+        # Planned Value: linear spread over the scheduled window
+        period = float(period_date.toordinal())
+        scheduled = ~np.isnan(end)
+        window = np.where(np.isnan(start), end, start)
+        duration = end - window
+        planned_progress = np.where(
+            duration > 0,
+            np.divide(period - window, duration, out=np.zeros(count), where=duration > 0),
+            (period >= end).astype(float),
+        )
+        planned_value = np.where(scheduled, bac * np.clip(planned_progress, 0.0, 1.0), earned_value)
+
+        measures = {
+            'bac': bac,
+            'pv': planned_value,
+            'ev': earned_value,
+            'ac': actual_cost,
+        }
+        level_keys = {
+            'project': np.column_stack((project, company)),
+            'boq': np.column_stack((project, company, boq)),
+            'section': np.column_stack((project, company, boq, section)),
+            'cost_type': np.column_stack((project, company, boq, cost_type)),
+        }
+
+        vals_list = []
+        for level, keys in level_keys.items():
+            groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            totals = {
+                name: np.bincount(inverse, weights=values, minlength=len(groups))
+                for name, values in measures.items()
+            }
+            cpi = np.divide(totals['ev'], totals['ac'], out=np.zeros(len(groups)), where=totals['ac'] != 0)
+            spi = np.divide(totals['ev'], totals['pv'], out=np.zeros(len(groups)), where=totals['pv'] != 0)
+            # Without cost performance yet, the budget remains the best estimate
+            eac = np.divide(totals['bac'], cpi, out=totals['bac'].copy(), where=cpi > 0)
+
+            for index, key in enumerate(groups):
+                vals = {
+                    'period_date': period_date,
+                    'level': level,
+                    'project_id': int(key[0]),
+                    'company_id': int(key[1]),
+                    'boq_id': int(key[2]) if level != 'project' else False,
+                    'budget_at_completion': totals['bac'][index],
+                    'planned_value': totals['pv'][index],
+                    'earned_value': totals['ev'][index],
+                    'actual_cost': totals['ac'][index],
+                    'cost_variance': totals['ev'][index] - totals['ac'][index],
+                    'schedule_variance': totals['ev'][index] - totals['pv'][index],
+                    'cpi': cpi[index],
+                    'spi': spi[index],
+                    'estimate_at_completion': eac[index],
+                    'estimate_to_complete': eac[index] - totals['ac'][index],
+                }
+                if level == 'section':
+                    vals['section_line_id'] = int(key[3]) or False
+                elif level == 'cost_type':
+                    vals['cost_type'] = COST_TYPES[key[3]] if key[3] >= 0 else False
+                vals_list.append({name: float(value) if isinstance(value, np.floating) else value for name, value in vals.items()})
+        return vals_list
+
+    @api.model
+    def action_refresh_current_period(self):
+        """Manual refresh of the current period for every active BOQ."""
+        period_date = date_utils.end_of(fields.Date.context_today(self), 'month')
+        boq_ids = self.env['construction.boq'].search([('state', 'in', ['approved', 'locked', 'closed'])]).ids
+        self.refresh_metrics(period_date, boq_ids)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Earned Value'),
+                'message': _('Metrics refreshed for %s BOQ(s).') % len(boq_ids),
+                'type': 'success',
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            },
+        }
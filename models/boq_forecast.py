@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+import numpy as np
+
+from odoo import models, fields, api
+
+
+class ConstructionBOQLine(models.Model):
+    _inherit = 'construction.boq.line'
+
+    # Forecast-at-completion, computed in batch by a nightly cron (see _cron_compute_forecasts)
+    forecast_quantity = fields.Float(string='Forecast Qty', readonly=True, copy=False, help="Projected final quantity from the consumption burn rate.")
+    forecast_amount = fields.Monetary(string='Forecast Amount', currency_field='currency_id', readonly=True, copy=False, help="Projected final cost from the consumption burn rate.")
+    forecast_overrun_date = fields.Date(string='Forecast Overrun Date', readonly=True, copy=False, help="Date at which the budget is expected to be (or was) exceeded.")
+    forecast_overrun = fields.Boolean(string='Forecast to Overrun', readonly=True, copy=False, index=True)
+    forecast_date = fields.Date(string='Forecast Computed On', readonly=True, copy=False)
+
+    @api.model
+    def _cron_compute_forecasts(self, batch_size=200):
+        """
+        Recompute the forecasts of every line of the active, approved or locked
+        BOQs, and clear the stale forecasts of the other BOQs (revised back to
+        draft, closed or archived).
+        """
+        boq_ids = self.env['construction.boq'].search([('state', 'in', ['approved', 'locked'])], order='id').ids
+        self._reset_forecasts(boq_ids)
+        for batch_start in range(0, len(boq_ids), batch_size):
+            self._compute_forecasts(boq_ids[batch_start:batch_start + batch_size])
+
+    @api.model
+    def _reset_forecasts(self, evaluated_boq_ids):
+        """Clear the forecasts of the lines whose BOQ is not in evaluated_boq_ids."""
+        self.env.cr.execute("""
+            UPDATE construction_boq_line
+            SET forecast_quantity = NULL,
+                forecast_amount = NULL,
+                forecast_overrun_date = NULL,
+                forecast_overrun = FALSE,
+                forecast_date = NULL
+            WHERE boq_id != ALL(%s)
+            AND (forecast_date IS NOT NULL OR forecast_overrun)
+        """, (list(evaluated_boq_ids),))
+        if self.env.cr.rowcount:
+            self.invalidate_model([
+                'forecast_quantity', 'forecast_amount', 'forecast_overrun_date',
+                'forecast_overrun', 'forecast_date',
+            ])
+
+    @api.model
+    def _compute_forecasts(self, boq_ids):
+        """
+        Burn-rate regression over the dated ledger of every line of the BOQs.
+
+        The daily cumulative consumption of each line is fitted with a least-squares
+        line (vectorised with bincount). Lines scheduled on a task with a deadline
+        are extrapolated to that deadline; other lines are projected at their actual
+        unit cost up to the budget quantity. Section headings carry the sum of the
+        lines below them.
+        """
+        if not boq_ids:
+            return
+        today = fields.Date.context_today(self)
+
+        self.env.cr.execute("""
+            SELECT
+                l.id, l.quantity, l.budget_amount, l.estimated_rate,
+                l.consumed_quantity, l.consumed_amount,
+                t.date_deadline::date
+            FROM construction_boq_line l
+            LEFT JOIN project_task t ON t.id = l.task_id
+            WHERE l.boq_id IN %s
+            AND l.display_type IS NULL
+            ORDER BY l.id
+        """, (tuple(boq_ids),))
+        lines = self.env.cr.fetchall()
+        if not lines:
+            return
+
+        # Daily cumulative series per line, cumulated in SQL
+        self.env.cr.execute("""
+            SELECT
+                c.boq_line_id, c.date,
+                SUM(SUM(c.quantity)) OVER w,
+                SUM(SUM(c.amount)) OVER w
+            FROM construction_boq_consumption c
+            JOIN construction_boq_line l ON l.id = c.boq_line_id
+            WHERE l.boq_id IN %s
+            AND l.display_type IS NULL
+            GROUP BY c.boq_line_id, c.date
+            WINDOW w AS (PARTITION BY c.boq_line_id ORDER BY c.date)
+            ORDER BY c.boq_line_id, c.date
+        """, (tuple(boq_ids),))
+        series = self.env.cr.fetchall()
+
+        count = len(lines)
+        line_ids = np.fromiter((row[0] for row in lines), dtype=np.int64, count=count)
+        quantity = np.fromiter((row[1] or 0.0 for row in lines), dtype=float, count=count)
+        budget = np.fromiter((row[2] or 0.0 for row in lines), dtype=float, count=count)
+        rate = np.fromiter((row[3] or 0.0 for row in lines), dtype=float, count=count)
+        consumed_qty = np.fromiter((row[4] or 0.0 for row in lines), dtype=float, count=count)
+        consumed_amt = np.fromiter((row[5] or 0.0 for row in lines), dtype=float, count=count)
+        deadline = np.fromiter((row[6].toordinal() if row[6] else np.nan for row in lines), dtype=float, count=count)
+        today_ord = float(today.toordinal())
+
+        # Regression of cumulative quantity/amount against days (relative to today)
+        slope_qty = np.zeros(count)
+        slope_amt = np.zeros(count)
+        crossed_on = np.full(count, np.nan)
+        if series:
+            points = len(series)
+            group = np.searchsorted(line_ids, np.fromiter((row[0] for row in series), dtype=np.int64, count=points))
+            x = np.fromiter((row[1].toordinal() for row in series), dtype=float, count=points) - today_ord
+            y_qty = np.fromiter((row[2] or 0.0 for row in series), dtype=float, count=points)
+            y_amt = np.fromiter((row[3] or 0.0 for row in series), dtype=float, count=points)
+
+            n = np.bincount(group, minlength=count).astype(float)
+            sx = np.bincount(group, weights=x, minlength=count)
+            sxx = np.bincount(group, weights=x * x, minlength=count)
+            denominator = n * sxx - sx * sx
+            fitted = denominator > 1e-9
+            for slope, y in ((slope_qty, y_qty), (slope_amt, y_amt)):
+                sy = np.bincount(group, weights=y, minlength=count)
+                sxy = np.bincount(group, weights=x * y, minlength=count)
+                np.divide(n * sxy - sx * sy, denominator, out=slope, where=fitted)
+
+            # A single day of consumption: average burn since that day
+            first_x = np.full(count, np.inf)
+            np.minimum.at(first_x, group, x)
+            single = (n > 0) & ~fitted
+            elapsed = np.maximum(-first_x, 1.0)
+            slope_qty[single] = consumed_qty[single] / elapsed[single]
+            slope_amt[single] = consumed_amt[single] / elapsed[single]
+
+            # First day the cumulative amount went over budget
+            over = y_amt > budget[group] + 0.01
+            np.fmin.at(crossed_on, group[over], x[over] + today_ord)
+
+        slope_qty = np.maximum(slope_qty, 0.0)
+        slope_amt = np.maximum(slope_amt, 0.0)
+
+        # Projection to completion
+        unit_cost = np.divide(consumed_amt, consumed_qty, out=rate.copy(), where=consumed_qty > 0)
+        scheduled = ~np.isnan(deadline)
+        days_left = np.maximum(np.nan_to_num(deadline - today_ord), 0.0)
+        forecast_qty = np.where(scheduled, consumed_qty + slope_qty * days_left, np.maximum(quantity, consumed_qty))
+        forecast_amt = np.where(scheduled, consumed_amt + slope_amt * days_left, unit_cost * forecast_qty)
+        forecast_amt = np.maximum(forecast_amt, consumed_amt)
+
+        overrun = (forecast_amt > budget + 0.01) | (forecast_qty > quantity + 0.0001)
+        remaining = budget - consumed_amt
+        days_to_overrun = np.divide(remaining, slope_amt, out=np.full(count, np.nan), where=slope_amt > 0)
+        overrun_on = np.where(np.isnan(crossed_on), today_ord + np.ceil(days_to_overrun), crossed_on)
+        overrun_on = np.where(overrun, overrun_on, np.nan)
+
+        values = {
+            int(line_id): (float(forecast_qty[i]), float(forecast_amt[i]), self._ordinal_to_date(overrun_on[i]), bool(overrun[i]))
+            for i, line_id in enumerate(line_ids)
+        }
+        values.update(self._rollup_section_forecasts(values))
+        self._store_forecasts(values, today)
+
+    @api.model
+    def _rollup_section_forecasts(self, values):
+        """Section headings: sum of the forecasts of their lines, earliest overrun date."""
+        sections = {}
+        for line in self.browse(list(values)).filtered('section_line_id'):
+            forecast_qty, forecast_amt, overrun_date, overrun = values[line.id]
+            total = sections.setdefault(line.section_line_id.id, [0.0, 0.0, None, False])
+            total[0] += forecast_qty
+            total[1] += forecast_amt
+            if overrun:
+                total[3] = True
+                if overrun_date and (not total[2] or overrun_date < total[2]):
+                    total[2] = overrun_date
+        return {section_id: tuple(total) for section_id, total in sections.items()}
+
+    @api.model
+    def _ordinal_to_date(self, ordinal):
+        if np.isnan(ordinal):
+            return None
+        return date.fromordinal(int(ordinal))
+
+    @api.model
+    def _store_forecasts(self, values, today):
+        """Set-based update of the stored forecast columns."""
+        if not values:
+            return
+        ids = list(values)
+        self.env.cr.execute("""
+            UPDATE construction_boq_line l
+            SET forecast_quantity = v.forecast_quantity,
+                forecast_amount = v.forecast_amount,
+                forecast_overrun_date = v.forecast_overrun_date,
+                forecast_overrun = v.forecast_overrun,
+                forecast_date = %s
+            FROM unnest(%s::int[], %s::float8[], %s::numeric[], %s::date[], %s::bool[])
+                AS v(id, forecast_quantity, forecast_amount, forecast_overrun_date, forecast_overrun)
+            WHERE l.id = v.id
+        """, (
+            today,
+            ids,
+            [values[i][0] for i in ids],
+            [values[i][1] for i in ids],
+            [values[i][2] for i in ids],
+            [values[i][3] for i in ids],
+        ))
+        self.invalidate_model([
+            'forecast_quantity', 'forecast_amount', 'forecast_overrun_date',
+            'forecast_overrun', 'forecast_date',
+        ])
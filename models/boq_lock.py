@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import logging
+import random
+import time
+
+from psycopg2.errors import LockNotAvailable
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class ConstructionBOQLine(models.Model):
+    _inherit = 'construction.boq.line'
+
+    def _lock_for_consumption(self):
+        """
+        Lock the lines before recording consumption on them and return the time
+        spent waiting (seconds).
+
+        Every posting path locks in id order, so two transactions touching the
+        same lines queue up instead of deadlocking. The rows are locked FOR NO
+        KEY UPDATE: ledger rows referencing the lines can still be inserted.
+
+        The whole batch is first tried with NOWAIT. On contention the lines are
+        locked one by one, still in id order, to measure the wait per line.
+        System parameters:
+        - ``construction_boq.lock_timeout_ms``: maximum wait per line (0 waits forever),
+        - ``construction_boq.lock_retries``: attempts after a timeout (default 2),
+        - ``construction_boq.lock_contention_ms``: minimum wait for a line to be
+          counted as contended (default 1).
+        Contended lines are counted in construction.boq.lock.stat.
+        """
+        line_ids = sorted(set(self.ids))
+        if not line_ids:
+            return 0.0
+        cr = self.env.cr
+
+        try:
+            with cr.savepoint(flush=False):
+                cr.execute("""
+                    SELECT id FROM construction_boq_line
+                    WHERE id IN %s ORDER BY id FOR NO KEY UPDATE NOWAIT
+                """, (tuple(line_ids),))
+            self._invalidate_consumption_cache()
+            return 0.0
+        except LockNotAvailable:
+            pass
+
+        ICP = self.env['ir.config_parameter'].sudo()
+        timeout_ms = int(ICP.get_param('construction_boq.lock_timeout_ms', 0))
+        retries = int(ICP.get_param('construction_boq.lock_retries', 2))
+        # Every line lock takes some time: only waits above the threshold are contention
+        min_wait = float(ICP.get_param('construction_boq.lock_contention_ms', 1)) / 1000.0
+
+        waits = dict.fromkeys(line_ids, 0.0)
+        timeouts = dict.fromkeys(line_ids, 0)
+        for attempt in range(retries + 1):
+            cr.execute("SELECT current_setting('lock_timeout')")
+            previous_timeout = cr.fetchone()[0]
+            line_id = None
+            try:
+                with cr.savepoint(flush=False):
+                    cr.execute("SELECT set_config('lock_timeout', %s, true)", ('%dms' % timeout_ms,))
+                    for line_id in line_ids:
+                        start = time.perf_counter()
+                        cr.execute("SELECT id FROM construction_boq_line WHERE id = %s FOR NO KEY UPDATE", (line_id,))
+                        waits[line_id] += time.perf_counter() - start
+                break
+            except LockNotAvailable:
+                timeouts[line_id] += 1
+                if attempt == retries:
+                    self.env['construction.boq.lock.stat']._record_contention(waits, timeouts, min_wait=min_wait)
+                    raise UserError(_(
+                        'The BOQ line "%s" is being updated by another transaction. Please try again.'
+                    ) % self.browse(line_id).name)
+                # Exponential backoff with jitter before the next attempt
+                time.sleep(0.05 * (2 ** attempt) * (1 + random.random()))
+            finally:
+                cr.execute("SELECT set_config('lock_timeout', %s, true)", (previous_timeout,))
+
+        self.env['construction.boq.lock.stat']._record_contention(waits, timeouts, min_wait=min_wait)
+        self._invalidate_consumption_cache()
+        return sum(waits.values())
+
+    def _invalidate_consumption_cache(self):
+        # Lines are read again once locked, with the consumption of the previous holder
+        self.invalidate_recordset(['consumed_quantity', 'consumed_amount', 'remaining_quantity', 'remaining_amount'])
+
+
+class ConstructionBOQLockStat(models.Model):
+    _name = 'construction.boq.lock.stat'
+    _description = 'BOQ Line Lock Contention'
+    _order = 'total_wait_ms desc'
+    _rec_name = 'boq_line_id'
+
+    boq_line_id = fields.Many2one('construction.boq.line', string='BOQ Line', required=True, readonly=True, ondelete='cascade')
+    boq_id = fields.Many2one(related='boq_line_id.boq_id', string='BOQ Reference')
+    company_id = fields.Many2one(related='boq_line_id.company_id', string='Company')
+    contention_count = fields.Integer(string='Contended Locks', readonly=True)
+    timeout_count = fields.Integer(string='Timeouts', readonly=True)
+    total_wait_ms = fields.Float(string='Total Wait (ms)', readonly=True)
+    max_wait_ms = fields.Float(string='Max Wait (ms)', readonly=True, group_operator='max')
+    last_contention = fields.Datetime(string='Last Contention', readonly=True)
+
+    _sql_constraints = [
+        ('boq_line_uniq', 'UNIQUE(boq_line_id)', 'Lock statistics are kept once per BOQ line.'),
+    ]
+
+    @api.model
+    def _record_contention(self, waits, timeouts, min_wait=0.001):
+        """
+        Add the waits (seconds) and timeouts per line to the counters. Lines
+        that waited less than ``min_wait`` seconds without timing out are not
+        counted. Written through a separate cursor, so counters of a failed
+        posting are kept.
+        """
+        line_ids = [line_id for line_id in waits if waits[line_id] >= min_wait or timeouts[line_id]]
+        if not line_ids:
+            return
+        try:
+            with self.env.registry.cursor() as cr:
+                cr.execute("""
+                    INSERT INTO construction_boq_lock_stat AS s
+                        (boq_line_id, contention_count, timeout_count, total_wait_ms, max_wait_ms,
+                         last_contention, create_uid, create_date, write_uid, write_date)
+                    SELECT v.line_id, 1, v.timeouts, v.wait_ms, v.wait_ms,
+                           NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC'
+                    FROM unnest(%s::int[], %s::int[], %s::float8[]) AS v(line_id, timeouts, wait_ms)
+                    ON CONFLICT (boq_line_id) DO UPDATE SET
+                        contention_count = s.contention_count + 1,
+                        timeout_count = s.timeout_count + EXCLUDED.timeout_count,
+                        total_wait_ms = s.total_wait_ms + EXCLUDED.total_wait_ms,
+                        max_wait_ms = GREATEST(s.max_wait_ms, EXCLUDED.max_wait_ms),
+                        last_contention = EXCLUDED.last_contention,
+                        write_uid = EXCLUDED.write_uid,
+                        write_date = EXCLUDED.write_date
+                """, (
+                    self.env.uid, self.env.uid,
+                    line_ids,
+                    [timeouts[line_id] for line_id in line_ids],
+                    [waits[line_id] * 1000.0 for line_id in line_ids],
+                ))
+        except Exception:
+            _logger.warning("Could not record BOQ lock contention", exc_info=True)
+
+    def action_reset(self):
+        self.unlink()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from odoo import models, fields, api, tools
+
+_logger = logging.getLogger(__name__)
+
+
+class ConstructionBOQPerfLog(models.Model):
+    _name = 'construction.boq.perf.log'
+    _description = 'BOQ Performance Log'
+    _order = 'id desc'
+    _rec_name = 'operation'
+
+    operation = fields.Char(string='Operation', required=True, index=True, readonly=True)
+    date = fields.Datetime(string='Date', required=True, default=fields.Datetime.now, index=True, readonly=True)
+    duration_ms = fields.Float(string='Duration (ms)', readonly=True, group_operator='avg')
+    query_count = fields.Integer(string='Queries', readonly=True, group_operator='avg')
+    batch_size = fields.Integer(string='Batch Size', readonly=True, group_operator='avg')
+    lock_wait_ms = fields.Float(string='Lock Wait (ms)', readonly=True, group_operator='avg')
+    failed = fields.Boolean(string='Failed', readonly=True)
+    user_id = fields.Many2one('res.users', string='User', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+
+    # -------------------------------------------------------------------------
+    # INSTRUMENTATION
+    # -------------------------------------------------------------------------
+    @api.model
+    def _is_enabled(self):
+        # get_param is cached in the registry: the check costs no query per call
+        return tools.str2bool(self.env['ir.config_parameter'].sudo().get_param('construction_boq.perf_log', 'False'))
+
+    @api.model
+    @contextmanager
+    def _track(self, operation, batch_size=0):
+        """
+        Measure the wrapped block when the ``construction_boq.perf_log`` system
+        parameter is set. Yields a dict where the block adds its lock wait time
+        (seconds) under ``lock_wait``; yields None when tracking is off.
+
+        The entry is written through a separate cursor so that it survives a
+        rollback of the measured transaction and does not count as one of its queries.
+        """
+        if not self._is_enabled():
+            yield None
+            return
+
+        cr = self.env.cr
+        stats = {'lock_wait': 0.0}
+        query_count = cr.sql_log_count
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield stats
+            failed = False
+        finally:
+            self._record(operation, {
+                'duration_ms': (time.perf_counter() - start) * 1000.0,
+                'query_count': cr.sql_log_count - query_count,
+                'batch_size': batch_size,
+                'lock_wait_ms': stats['lock_wait'] * 1000.0,
+                'failed': failed,
+            })
+
+    @api.model
+    def _record(self, operation, values):
+        try:
+            with self.env.registry.cursor() as cr:
+                cr.execute("""
+                    INSERT INTO construction_boq_perf_log
+                        (operation, date, duration_ms, query_count, batch_size, lock_wait_ms,
+                         failed, user_id, company_id, create_uid, create_date, write_uid, write_date)
+                    VALUES (%s, NOW() AT TIME ZONE 'UTC', %s, %s, %s, %s, %s, %s, %s, %s,
+                            NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC')
+                """, (
+                    operation, values['duration_ms'], values['query_count'], values['batch_size'],
+                    values['lock_wait_ms'], values['failed'], self.env.uid, self.env.company.id,
+                    self.env.uid, self.env.uid,
+                ))
+        except Exception:
+            # Instrumentation must never break the measured operation
+            _logger.warning("Could not record BOQ performance entry for %s", operation, exc_info=True)
+
+    # -------------------------------------------------------------------------
+    # ROTATION
+    # -------------------------------------------------------------------------
+    @api.model
+    def _cron_rotate(self):
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param('construction_boq.perf_log_retention_days', 7))
+        limit = fields.Datetime.now() - timedelta(days=retention_days)
+        self.env.cr.execute("DELETE FROM construction_boq_perf_log WHERE date < %s", (limit,))
+
+
+class ConstructionBOQPerfSummary(models.Model):
+    _name = 'construction.boq.perf.summary'
+    _description = 'BOQ Performance Summary'
+    _auto = False
+    _rec_name = 'operation'
+    _order = 'operation'
+
+    operation = fields.Char(string='Operation', readonly=True)
+    call_count = fields.Integer(string='Calls', readonly=True)
+    failed_count = fields.Integer(string='Failures', readonly=True)
+    duration_avg = fields.Float(string='Avg Duration (ms)', readonly=True, group_operator='avg')
+    duration_p50 = fields.Float(string='p50 Duration (ms)', readonly=True, group_operator='max')
+    duration_p95 = fields.Float(string='p95 Duration (ms)', readonly=True, group_operator='max')
+    duration_max = fields.Float(string='Max Duration (ms)', readonly=True, group_operator='max')
+    query_count_p50 = fields.Float(string='p50 Queries', readonly=True, group_operator='max')
+    query_count_p95 = fields.Float(string='p95 Queries', readonly=True, group_operator='max')
+    batch_size_avg = fields.Float(string='Avg Batch Size', readonly=True, group_operator='avg')
+    lock_wait_p95 = fields.Float(string='p95 Lock Wait (ms)', readonly=True, group_operator='max')
+    last_date = fields.Datetime(string='Last Call', readonly=True, group_operator='max')
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+
+        query = """
+            CREATE OR REPLACE VIEW %s AS (
+                SELECT
+                    ROW_NUMBER() OVER (ORDER BY p.operation) AS id,
+                    p.operation,
+                    COUNT(*) AS call_count,
+                    COUNT(*) FILTER (WHERE p.failed) AS failed_count,
+                    AVG(p.duration_ms) AS duration_avg,
+                    percentile_cont(0.5) WITHIN GROUP (ORDER BY p.duration_ms) AS duration_p50,
+                    percentile_cont(0.95) WITHIN GROUP (ORDER BY p.duration_ms) AS duration_p95,
+                    MAX(p.duration_ms) AS duration_max,
+                    percentile_cont(0.5) WITHIN GROUP (ORDER BY p.query_count) AS query_count_p50,
+                    percentile_cont(0.95) WITHIN GROUP (ORDER BY p.query_count) AS query_count_p95,
+                    AVG(p.batch_size) AS batch_size_avg,
+                    percentile_cont(0.95) WITHIN GROUP (ORDER BY p.lock_wait_ms) AS lock_wait_p95,
+                    MAX(p.date) AS last_date
+                FROM construction_boq_perf_log p
+                GROUP BY p.operation
+            )
+        """ % self._table
+
+        self.env.cr.execute(query)
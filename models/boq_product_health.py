@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from odoo import models, fields, api, _
+
+
+class ConstructionBOQProductHealth(models.Model):
+    _name = 'construction.boq.product.health'
+    _description = 'BOQ Product Configuration Health'
+    _order = 'is_valid, product_id'
+    _rec_name = 'product_id'
+
+    product_id = fields.Many2one('product.product', string='Product', required=True, readonly=True, index=True, ondelete='cascade')
+    company_id = fields.Many2one('res.company', string='Company', required=True, readonly=True, ondelete='cascade')
+    categ_id = fields.Many2one(related='product_id.categ_id', string='Product Category')
+    missing_uom = fields.Boolean(string='Missing Unit of Measure', readonly=True)
+    missing_price = fields.Boolean(string='Missing Standard Price', readonly=True)
+    missing_expense_account = fields.Boolean(string='Missing Expense Account', readonly=True)
+    is_valid = fields.Boolean(string='Configured', readonly=True, index=True)
+    line_count = fields.Integer(string='BOQ Lines', compute='_compute_line_count')
+
+    _sql_constraints = [
+        ('product_company_uniq', 'UNIQUE(product_id, company_id)', 'The configuration health is kept once per product and company.'),
+    ]
+
+    def init(self):
+        # Existing databases: index the products already used on BOQ lines
+        self.env.cr.execute("SELECT 1 FROM construction_boq_product_health LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._refresh_products()
+
+    def _compute_line_count(self):
+        groups = self.env['construction.boq.line']._read_group(
+            [('product_id', 'in', self.product_id.ids), ('display_type', '=', False)],
+            ['product_id', 'company_id'], ['__count'],
+        )
+        counts = {(product.id, company.id): count for product, company, count in groups}
+        for rec in self:
+            rec.line_count = counts.get((rec.product_id.id, rec.company_id.id), 0)
+
+    # -------------------------------------------------------------------------
+    # INDEX MAINTENANCE
+    # -------------------------------------------------------------------------
+    @api.model
+    def _refresh_products(self, product_ids=None, categ_ids=None):
+        """
+        Recompute the rows of the products used on BOQ lines, for each company
+        using them: all of them by default, or those of the given products or
+        product categories. A full refresh also drops the rows of products no
+        longer used on any line.
+        """
+        self.env['construction.boq.line'].flush_model(['product_id', 'company_id'])
+        query = """
+            SELECT DISTINCT l.product_id, l.company_id
+            FROM construction_boq_line l
+            JOIN product_product p ON p.id = l.product_id
+            JOIN product_template t ON t.id = p.product_tmpl_id
+            WHERE l.company_id IS NOT NULL
+        """
+        params = []
+        if product_ids is not None:
+            query += " AND l.product_id = ANY(%s)"
+            params.append(list(product_ids))
+        if categ_ids is not None:
+            query += " AND t.categ_id = ANY(%s)"
+            params.append(list(categ_ids))
+        self.env.cr.execute(query, params)
+        pairs = self.env.cr.fetchall()
+        if product_ids is None and categ_ids is None:
+            self.env.cr.execute("""
+                DELETE FROM construction_boq_product_health h
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM construction_boq_line l
+                    WHERE l.product_id = h.product_id AND l.company_id = h.company_id
+                )
+            """)
+        self._store_health(self._compute_health(pairs))
+
+    @api.model
+    def _refresh_price_products(self, product_ids, price):
+        """
+        Refresh after a cost update of the products in the current company,
+        only where the missing price flag changes. Valuation (AVCO/FIFO)
+        rewrites the cost on every receipt, but it rarely becomes or stops
+        being zero.
+        """
+        if not product_ids:
+            return
+        self.env.cr.execute("""
+            SELECT product_id FROM construction_boq_product_health
+            WHERE product_id = ANY(%s) AND company_id = %s AND missing_price != %s
+        """, (list(product_ids), self.env.company.id, not price))
+        changed_ids = [product_id for product_id, in self.env.cr.fetchall()]
+        if changed_ids:
+            self._refresh_products(product_ids=changed_ids)
+
+    @api.model
+    def _compute_health(self, pairs):
+        """
+        {(product id, company id): (missing uom, missing price, missing expense account)}.
+
+        Price and accounts are company dependent: they are read once per company
+        for all its products, not line by line.
+        """
+        products_by_company = defaultdict(set)
+        for product_id, company_id in pairs:
+            products_by_company[company_id].add(product_id)
+
+        health = {}
+        Product = self.env['product.product'].sudo().with_context(active_test=False)
+        for company_id, product_ids in products_by_company.items():
+            for product in Product.with_company(company_id).browse(sorted(product_ids)).exists():
+                health[product.id, company_id] = (
+                    not product.uom_id,
+                    not product.standard_price,
+                    not product.property_account_expense_id and not product.categ_id.property_account_expense_categ_id,
+                )
+        return health
+
+    @api.model
+    def _store_health(self, health):
+        if not health:
+            return
+        keys = list(health)
+        self.env.cr.execute("""
+            INSERT INTO construction_boq_product_health AS h
+                (product_id, company_id, missing_uom, missing_price, missing_expense_account, is_valid,
+                 create_uid, create_date, write_uid, write_date)
+            SELECT v.product_id, v.company_id, v.missing_uom, v.missing_price, v.missing_expense_account,
+                   NOT (v.missing_uom OR v.missing_price OR v.missing_expense_account),
+                   %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC'
+            FROM unnest(%s::int[], %s::int[], %s::bool[], %s::bool[], %s::bool[])
+                AS v(product_id, company_id, missing_uom, missing_price, missing_expense_account)
+            ON CONFLICT (product_id, company_id) DO UPDATE SET
+                missing_uom = EXCLUDED.missing_uom,
+                missing_price = EXCLUDED.missing_price,
+                missing_expense_account = EXCLUDED.missing_expense_account,
+                is_valid = EXCLUDED.is_valid,
+                write_uid = EXCLUDED.write_uid,
+                write_date = EXCLUDED.write_date
+        """, (
+            self.env.uid, self.env.uid,
+            [key[0] for key in keys],
+            [key[1] for key in keys],
+            [health[key][0] for key in keys],
+            [health[key][1] for key in keys],
+            [health[key][2] for key in keys],
+        ))
+        self.invalidate_model()
+
+    @api.model
+    def _get_health(self, pairs):
+        """
+        Health of (product id, company id) pairs from the index. Pairs not
+        indexed yet (new products, unsaved lines) are computed without being
+        stored, so reads never write.
+        """
+        pairs = {(product_id, company_id) for product_id, company_id in pairs if product_id and company_id}
+        if not pairs:
+            return {}
+        self.env.cr.execute("""
+            SELECT product_id, company_id, missing_uom, missing_price, missing_expense_account
+            FROM construction_boq_product_health
+            WHERE product_id = ANY(%s)
+        """, ([product_id for product_id, company_id in pairs],))
+        health = {
+            (product_id, company_id): (missing_uom, missing_price, missing_account)
+            for product_id, company_id, missing_uom, missing_price, missing_account in self.env.cr.fetchall()
+            if (product_id, company_id) in pairs
+        }
+        missing = pairs - set(health)
+        if missing:
+            health.update(self._compute_health(missing))
+        return health
+
+    @api.model
+    def action_refresh_all(self):
+        self._refresh_products()
+        return self.env['ir.actions.act_window']._for_xml_id('entrpryz_construction_boq.action_construction_boq_product_health')
+
+    def action_view_lines(self):
+        self.ensure_one()
+        return {
+            'name': _('BOQ Lines'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'construction.boq.line',
+            'view_mode': 'list,form',
+            'domain': [('product_id', '=', self.product_id.id), ('company_id', '=', self.company_id.id), ('display_type', '=', False)],
+        }
+
+
+class ConstructionBOQLine(models.Model):
+    _inherit = 'construction.boq.line'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        lines._index_product_health()
+        return lines
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'product_id' in vals:
+            self._index_product_health()
+        return res
+
+    def _index_product_health(self):
+        """Add the products of the lines that are not indexed yet for their company."""
+        Health = self.env['construction.boq.product.health'].sudo()
+        pairs = {(line.product_id.id, line.company_id.id) for line in self if line.product_id and line.company_id}
+        if not pairs:
+            return
+        existing = Health.search([('product_id', 'in', [product_id for product_id, company_id in pairs])])
+        missing = pairs - {(health.product_id.id, health.company_id.id) for health in existing}
+        if missing:
+            Health._store_health(Health._compute_health(missing))
+
+    def _get_product_health(self):
+        """{line id: (missing uom, missing price, missing expense account)} of the lines with a product."""
+        company = self.env.company
+        keys = {line.id: (line.product_id.id, (line.company_id or company).id) for line in self if line.product_id}
+        health = self.env['construction.boq.product.health']._get_health(keys.values())
+        return {line_id: health[key] for line_id, key in keys.items() if key in health}
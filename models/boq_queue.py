@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class ConstructionBOQConsumptionQueue(models.Model):
+    _name = 'construction.boq.consumption.queue'
+    _description = 'BOQ Deferred Consumption'
+    _order = 'id'
+    _rec_name = 'boq_line_id'
+
+    boq_line_id = fields.Many2one('construction.boq.line', string='BOQ Line', required=True, ondelete='cascade', index=True)
+    company_id = fields.Many2one('res.company', related='boq_line_id.company_id', string='Company', store=True, readonly=True)
+    currency_id = fields.Many2one('res.currency', related='boq_line_id.currency_id', string='Currency', readonly=True)
+
+    source_model = fields.Char(string='Source Model', required=True)
+    source_id = fields.Integer(string='Source ID', required=True)
+    quantity = fields.Float(string='Quantity Reserved')
+    amount = fields.Monetary(string='Amount Reserved', currency_field='currency_id')
+    date = fields.Date(string='Date', required=True)
+    user_id = fields.Many2one('res.users', string='User')
+
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('failed', 'Failed'),
+    ], string='Status', default='pending', required=True, index=True)
+    error = fields.Text(string='Error', readonly=True)
+
+    # Same values as the ledger rows they become
+    _LEDGER_FIELDS = ('boq_line_id', 'source_model', 'source_id', 'quantity', 'amount', 'date', 'user_id')
+
+    @api.model
+    def _is_deferred(self):
+        """Bills post their consumption through the queue when the mode is 'deferred'."""
+        return self.env['ir.config_parameter'].sudo().get_param('construction_boq.consumption_mode', 'sync') == 'deferred'
+
+    @api.model
+    def _get_pending(self, line_ids):
+        """{line_id: (quantity, amount)} reserved by the queue and not yet in the ledger."""
+        if not line_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT boq_line_id, SUM(quantity), SUM(amount)
+            FROM construction_boq_consumption_queue
+            WHERE boq_line_id IN %s
+            AND state = 'pending'
+            GROUP BY boq_line_id
+        """, (tuple(line_ids),))
+        return {line_id: (quantity or 0.0, amount or 0.0) for line_id, quantity, amount in self.env.cr.fetchall()}
+
+    # -------------------------------------------------------------------------
+    # PROCESSING
+    # -------------------------------------------------------------------------
+    @api.model
+    def _cron_process_queue(self, batch_size=5000):
+        """
+        Move the pending reservations into the ledger in large batches.
+
+        Rows are claimed with SKIP LOCKED so several workers can drain the queue.
+        A failing batch is replayed line by line in savepoints, and the rows of
+        the failing lines are kept with their error instead of blocking the queue.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        while True:
+            self.env.cr.execute("""
+                SELECT id FROM construction_boq_consumption_queue
+                WHERE state = 'pending'
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (batch_size,))
+            queue_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not queue_ids:
+                break
+
+            self.browse(queue_ids)._process()
+            if auto_commit:
+                self.env.cr.commit()
+            if len(queue_ids) < batch_size:
+                break
+
+    def _process(self):
+        rows = self.sudo()
+        rows.boq_line_id._lock_for_consumption()
+        try:
+            with self.env.cr.savepoint():
+                rows._post_to_ledger()
+            return
+        except Exception:
+            _logger.info("Deferred BOQ consumption batch failed, replaying it line by line", exc_info=True)
+
+        for line in rows.boq_line_id:
+            line_rows = rows.filtered(lambda r: r.boq_line_id == line)
+            try:
+                with self.env.cr.savepoint():
+                    line_rows._post_to_ledger()
+            except Exception as e:
+                _logger.warning("Deferred BOQ consumption failed for line %s: %s", line.id, e)
+                line_rows.write({'state': 'failed', 'error': str(e)})
+
+    def _post_to_ledger(self):
+        self.env['construction.boq.consumption'].create([
+            {
+                field: row[field].id if field in ('boq_line_id', 'user_id') else row[field]
+                for field in self._LEDGER_FIELDS
+            }
+            for row in self
+        ])
+        self.unlink()
+
+    def action_retry(self):
+        self.write({'state': 'pending', 'error': False})
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, fields, api
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Stored totals of construction.boq.line maintained from quantity, rate and ledger
+LINE_TOTAL_FIELDS = ['budget_amount', 'consumed_quantity', 'consumed_amount', 'remaining_quantity', 'remaining_amount']
+
+
+def _id_filter(alias, ids=None, id_range=None):
+    if ids is not None:
+        return SQL("%s IN %s", SQL.identifier(alias, 'id'), tuple(ids) or (0,))
+    if id_range is not None:
+        return SQL("%s BETWEEN %s AND %s", SQL.identifier(alias, 'id'), id_range[0], id_range[1])
+    return SQL("TRUE")
+
+
+class ConstructionBOQLine(models.Model):
+    _inherit = 'construction.boq.line'
+
+    @api.model
+    def _recompute_stored_totals(self, ids=None, id_range=None):
+        """
+        Set-based recompute of the stored budget and consumption totals of the
+        lines given by ids, by an inclusive (first, last) id range, or of every line.
+
+        Same results as _compute_budget_amount/_compute_consumption (amounts
+        rounded to the line currency), written in one UPDATE that only touches
+        the lines whose stored values differ. Dependent stored fields (task
+        rollups, BOQ totals) are marked for recompute. Returns the updated lines.
+        """
+        self.env.flush_all()
+        self.env.cr.execute(SQL("""
+            WITH target AS (
+                SELECT
+                    l.id, l.display_type,
+                    COALESCE(l.quantity, 0.0) AS quantity,
+                    COALESCE(cur.decimal_places, 2) AS digits,
+                    ROUND((COALESCE(l.quantity, 0.0) * COALESCE(l.estimated_rate, 0.0))::numeric,
+                          COALESCE(cur.decimal_places, 2)) AS budget_amount
+                FROM construction_boq_line l
+                LEFT JOIN res_currency cur ON cur.id = l.currency_id
+                WHERE %(filter)s
+            ),
+            ledger AS (
+                SELECT c.boq_line_id, SUM(c.quantity) AS quantity, SUM(c.amount) AS amount
+                FROM construction_boq_consumption c
+                JOIN target t ON t.id = c.boq_line_id
+                WHERE t.display_type IS NULL
+                GROUP BY c.boq_line_id
+            ),
+            computed AS (
+                SELECT
+                    t.id,
+                    t.budget_amount,
+                    CASE WHEN t.display_type IS NULL THEN COALESCE(g.quantity, 0.0) ELSE 0.0 END AS consumed_quantity,
+                    CASE WHEN t.display_type IS NULL THEN ROUND(COALESCE(g.amount, 0.0)::numeric, t.digits) ELSE 0.0 END AS consumed_amount,
+                    CASE WHEN t.display_type IS NULL THEN t.quantity - COALESCE(g.quantity, 0.0) ELSE 0.0 END AS remaining_quantity,
+                    CASE WHEN t.display_type IS NULL THEN ROUND((t.budget_amount - COALESCE(g.amount, 0.0))::numeric, t.digits) ELSE 0.0 END AS remaining_amount
+                FROM target t
+                LEFT JOIN ledger g ON g.boq_line_id = t.id
+            )
+            UPDATE construction_boq_line l
+            SET budget_amount = c.budget_amount,
+                consumed_quantity = c.consumed_quantity,
+                consumed_amount = c.consumed_amount,
+                remaining_quantity = c.remaining_quantity,
+                remaining_amount = c.remaining_amount
+            FROM computed c
+            WHERE l.id = c.id
+            AND (
+                l.budget_amount IS DISTINCT FROM c.budget_amount
+                OR l.consumed_quantity IS DISTINCT FROM c.consumed_quantity
+                OR l.consumed_amount IS DISTINCT FROM c.consumed_amount
+                OR l.remaining_quantity IS DISTINCT FROM c.remaining_quantity
+                OR l.remaining_amount IS DISTINCT FROM c.remaining_amount
+            )
+            RETURNING l.id
+        """, filter=_id_filter('l', ids, id_range)))
+        lines = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if lines:
+            self.invalidate_model(LINE_TOTAL_FIELDS)
+            lines.modified(LINE_TOTAL_FIELDS)
+        return lines
+
+
+class ConstructionBOQ(models.Model):
+    _inherit = 'construction.boq'
+
+    @api.model
+    def _recompute_total_budget(self, ids=None, id_range=None):
+        """Set-based recompute of total_budget (sum of the product lines), see _compute_total_budget."""
+        self.env.flush_all()
+        self.env.cr.execute(SQL("""
+            UPDATE construction_boq b
+            SET total_budget = t.total_budget
+            FROM (
+                SELECT b.id, ROUND(COALESCE(SUM(l.budget_amount), 0.0)::numeric, COALESCE(cur.decimal_places, 2)) AS total_budget
+                FROM construction_boq b
+                JOIN res_company co ON co.id = b.company_id
+                LEFT JOIN res_currency cur ON cur.id = co.currency_id
+                LEFT JOIN construction_boq_line l ON l.boq_id = b.id AND l.display_type IS NULL
+                WHERE %(filter)s
+                GROUP BY b.id, cur.decimal_places
+            ) t
+            WHERE b.id = t.id
+            AND b.total_budget IS DISTINCT FROM t.total_budget
+            RETURNING b.id
+        """, filter=_id_filter('b', ids, id_range)))
+        boqs = self.browse([row[0] for row in self.env.cr.fetchall()])
+        if boqs:
+            self.invalidate_model(['total_budget'])
+        return boqs
+
+
+class ConstructionBOQRecomputeChunk(models.Model):
+    _name = 'construction.boq.recompute.chunk'
+    _description = 'BOQ Stored Totals Recompute Chunk'
+    _order = 'run_name, phase, id_from'
+    _rec_name = 'run_name'
+
+    run_name = fields.Char(string='Run', required=True, index=True, readonly=True)
+    phase = fields.Selection([
+        ('line', 'BOQ Lines'),
+        ('boq', 'BOQ Totals'),
+    ], string='Phase', required=True, readonly=True)
+    id_from = fields.Integer(string='First ID', required=True, readonly=True)
+    id_to = fields.Integer(string='Last ID', required=True, readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='pending', required=True, index=True, readonly=True)
+    changed_count = fields.Integer(string='Records Updated', readonly=True)
+    error = fields.Text(string='Error', readonly=True)
+    date_done = fields.Datetime(string='Done On', readonly=True)
+
+    _PHASE_TABLES = {'line': 'construction_boq_line', 'boq': 'construction_boq'}
+
+    @api.model
+    def _prepare_run(self, run_name, chunk_size=5000):
+        """
+        Split the lines and the BOQs in id ranges of chunk_size for run_name.
+        An existing run is resumed: its done chunks are skipped and failed ones retried.
+        """
+        existing = self.search([('run_name', '=', run_name)])
+        if existing:
+            existing.filtered(lambda c: c.state == 'failed').write({'state': 'pending', 'error': False})
+            return existing
+
+        vals_list = []
+        for phase, table in self._PHASE_TABLES.items():
+            self.env.cr.execute(SQL("SELECT MIN(id), MAX(id) FROM %s", SQL.identifier(table)))
+            first_id, last_id = self.env.cr.fetchone()
+            if first_id is None:
+                continue
+            for id_from in range(first_id, last_id + 1, chunk_size):
+                vals_list.append({
+                    'run_name': run_name,
+                    'phase': phase,
+                    'id_from': id_from,
+                    'id_to': min(id_from + chunk_size - 1, last_id),
+                })
+        return self.create(vals_list)
+
+    @api.model
+    def _claim(self, run_name, phase):
+        """
+        Take the next pending chunk of the phase, skipping those claimed by other
+        workers. The row lock is held until the chunk is committed, so a worker
+        that dies leaves its chunk pending for the next run.
+        """
+        self.env.cr.execute("""
+            SELECT id FROM construction_boq_recompute_chunk
+            WHERE run_name = %s AND phase = %s AND state = 'pending'
+            ORDER BY id_from
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """, (run_name, phase))
+        row = self.env.cr.fetchone()
+        return self.browse(row[0]) if row else self.browse()
+
+    def _run(self):
+        """Recompute the chunk; the caller commits it together with its state."""
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint():
+                if self.phase == 'line':
+                    changed = self.env['construction.boq.line']._recompute_stored_totals(id_range=(self.id_from, self.id_to))
+                else:
+                    changed = self.env['construction.boq']._recompute_total_budget(id_range=(self.id_from, self.id_to))
+                self.env.flush_all()
+        except Exception as e:
+            _logger.warning("BOQ recompute chunk %s-%s (%s) failed", self.id_from, self.id_to, self.phase, exc_info=True)
+            self.write({'state': 'failed', 'error': str(e)})
+            return False
+        self.write({'state': 'done', 'changed_count': len(changed), 'error': False, 'date_done': fields.Datetime.now()})
+        return True
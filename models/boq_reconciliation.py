@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, fields, api, tools
+
+from .boq_consistency import INVOICE_TYPES
+
+_logger = logging.getLogger(__name__)
+
+
+class ConstructionBOQAnalyticReconciliation(models.Model):
+    _name = 'construction.boq.analytic.reconciliation'
+    _description = 'BOQ Actuals vs Journal Items vs Analytic Lines'
+    _auto = False
+    _rec_name = 'project_id'
+    _order = 'period desc, project_id, source'
+
+    # Dimensions
+    project_id = fields.Many2one('project.project', string='Project', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Currency', readonly=True)
+    period = fields.Date(string='Period', readonly=True)
+    source = fields.Selection([
+        ('bill', 'Vendor Bills'),
+        ('stock', 'Stock Issues'),
+    ], string='Source', readonly=True)
+
+    # Measures
+    ledger_amount = fields.Monetary(string='BOQ Actual', readonly=True, help="Consumption ledger, including reservations waiting in the deferred queue.")
+    journal_amount = fields.Monetary(string='Journal Items', readonly=True, help="Posted bill lines and stock valuation lines linked to BOQ lines.")
+    analytic_amount = fields.Monetary(string='Analytic Lines', readonly=True, help="Analytic lines generated from those journal items.")
+    ledger_difference = fields.Monetary(string='Actual - Journal', readonly=True)
+    analytic_difference = fields.Monetary(string='Journal - Analytic', readonly=True)
+    is_mismatch = fields.Boolean(string='Mismatch', readonly=True)
+
+    def init(self):
+        """
+        Materialized view, one row per project, company, month and source.
+
+        Each figure is attributed to the date of its source document (bill
+        accounting date, stock move date), which is also the date of the ledger
+        rows, so the three sides fall in the same period. The unique index on id
+        lets the nightly refresh run concurrently with readers.
+        """
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute("""
+            CREATE MATERIALIZED VIEW %s AS (
+                WITH bill_lines AS (
+                    SELECT
+                        aml.id, aml.boq_line_id, am.date,
+                        CASE WHEN am.move_type IN ('out_invoice', 'out_refund', 'out_receipt') THEN -1 ELSE 1 END AS sign,
+                        aml.balance
+                    FROM account_move_line aml
+                    JOIN account_move am ON am.id = aml.move_id
+                    WHERE aml.boq_line_id IS NOT NULL
+                    AND aml.display_type = 'product'
+                    AND am.state = 'posted'
+                    AND am.move_type IN %%(invoice_types)s
+                ),
+                -- Debit side of the valuation entry, the one carrying the BOQ analytic distribution
+                stock_lines AS (
+                    SELECT aml.id, sm.boq_line_id, sm.date::date AS date, 1 AS sign, aml.balance
+                    FROM account_move_line aml
+                    JOIN account_move am ON am.id = aml.move_id
+                    JOIN stock_move sm ON sm.id = am.stock_move_id
+                    JOIN stock_location dest ON dest.id = sm.location_dest_id
+                    WHERE sm.boq_line_id IS NOT NULL
+                    AND sm.state = 'done'
+                    AND am.state = 'posted'
+                    AND dest.usage IN ('customer', 'production')
+                    AND aml.balance > 0
+                ),
+                journal_lines AS (
+                    SELECT 'bill' AS source, b.* FROM bill_lines b
+                    UNION ALL
+                    SELECT 'stock' AS source, s.* FROM stock_lines s
+                ),
+                analytic AS (
+                    SELECT aal.move_line_id, SUM(aal.amount) AS amount
+                    FROM account_analytic_line aal
+                    WHERE aal.move_line_id IN (SELECT j.id FROM journal_lines j)
+                    GROUP BY aal.move_line_id
+                ),
+                movements AS (
+                    SELECT
+                        CASE WHEN c.source_model = 'stock.move' THEN 'stock' ELSE 'bill' END AS source,
+                        c.boq_line_id, c.date, c.amount AS ledger_amount,
+                        0.0 AS journal_amount, 0.0 AS analytic_amount
+                    FROM construction_boq_consumption c
+                    WHERE c.source_model IN ('account.move.line', 'stock.move')
+                    UNION ALL
+                    SELECT 'bill', q.boq_line_id, q.date, q.amount, 0.0, 0.0
+                    FROM construction_boq_consumption_queue q
+                    WHERE q.source_model = 'account.move.line'
+                    UNION ALL
+                    SELECT
+                        j.source, j.boq_line_id, j.date, 0.0,
+                        j.balance * j.sign, -COALESCE(a.amount, 0.0) * j.sign
+                    FROM journal_lines j
+                    LEFT JOIN analytic a ON a.move_line_id = j.id
+                ),
+                totals AS (
+                    SELECT
+                        b.project_id,
+                        l.company_id,
+                        date_trunc('month', m.date)::date AS period,
+                        m.source,
+                        SUM(m.ledger_amount) AS ledger_amount,
+                        SUM(m.journal_amount) AS journal_amount,
+                        SUM(m.analytic_amount) AS analytic_amount
+                    FROM movements m
+                    JOIN construction_boq_line l ON l.id = m.boq_line_id
+                    JOIN construction_boq b ON b.id = l.boq_id
+                    GROUP BY b.project_id, l.company_id, date_trunc('month', m.date), m.source
+                )
+                SELECT
+                    ROW_NUMBER() OVER (ORDER BY t.company_id, t.project_id, t.period, t.source) AS id,
+                    t.project_id,
+                    t.company_id,
+                    rc.currency_id,
+                    t.period,
+                    t.source,
+                    t.ledger_amount,
+                    t.journal_amount,
+                    t.analytic_amount,
+                    (t.ledger_amount - t.journal_amount) AS ledger_difference,
+                    (t.journal_amount - t.analytic_amount) AS analytic_difference,
+                    (
+                        ABS(t.ledger_amount - t.journal_amount) >= COALESCE(cur.rounding, 0.01)
+                        OR ABS(t.journal_amount - t.analytic_amount) >= COALESCE(cur.rounding, 0.01)
+                    ) AS is_mismatch
+                FROM totals t
+                JOIN res_company rc ON rc.id = t.company_id
+                LEFT JOIN res_currency cur ON cur.id = rc.currency_id
+            )
+        """ % self._table, {'invoice_types': INVOICE_TYPES})
+        self.env.cr.execute("CREATE UNIQUE INDEX %s_id_idx ON %s (id)" % (self._table, self._table))
+        self.env.cr.execute("CREATE INDEX %s_project_period_idx ON %s (project_id, period)" % (self._table, self._table))
+
+    @api.model
+    def _cron_refresh(self):
+        """Rebuild the reconciliation without blocking readers of the previous result."""
+        self.env.flush_all()
+        self.env.cr.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY %s" % self._table)
+        self.invalidate_model()
+        _logger.info("BOQ analytic reconciliation refreshed")
+
+    @api.model
+    def action_refresh(self):
+        self._cron_refresh()
+        return self.env['ir.actions.act_window']._for_xml_id('entrpryz_construction_boq.action_construction_boq_analytic_reconciliation')
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, tools
+from odoo import models, fields, api, tools
 class ConstructionBOQReport(models.Model):
     _name = 'construction.boq.report'
     _description = 'BOQ Budget vs Actual Analysis'
@@ -33,6 +33,10 @@ class ConstructionBOQReport(models.Model):
     variance_quantity = fields.Float(string='Variance Qty', readonly=True, help="Budget Qty - Actual Qty")
     variance_amount = fields.Monetary(string='Variance Amount', readonly=True, help="Budget Amount - Actual Amount")
 
+    # Measures: Forecast at completion (stored on the line by the nightly forecast cron)
+    forecast_amount = fields.Monetary(string='Forecast Amount', readonly=True)
+    forecast_overrun = fields.Boolean(string='Forecast to Overrun', readonly=True)
+
     # Measures: Percentage (Optional utility for graph views)
     consumption_progress = fields.Float(string='Consumption %', readonly=True, group_operator="avg")
     currency_id = fields.Many2one('res.currency', string='Currency', readonly=True)
@@ -66,6 +70,10 @@ class ConstructionBOQReport(models.Model):
                     (l.quantity - COALESCE(cons.sum_qty, 0.0)) AS variance_quantity,
                     (l.budget_amount - COALESCE(cons.sum_amt, 0.0)) AS variance_amount,
 
+                    -- Forecast Columns
+                    l.forecast_amount,
+                    COALESCE(l.forecast_overrun, False) AS forecast_overrun,
+
                     -- Progress Calculation (Avoid division by zero)
                     CASE
                         WHEN l.budget_amount > 0
@@ -129,4 +137,9 @@ class ConstructionBOQReport(models.Model):
         self.env.cr.execute("""
             CREATE INDEX IF NOT EXISTS construction_boq_consumption_boq_line_id_idx
             ON construction_boq_consumption(boq_line_id)
-        """)
\ No newline at end of file
+        """)
+
+    @api.model
+    def read_group(self, domain, fields, groupby, offset=0, limit=None, orderby=False, lazy=True):
+        with self.env['construction.boq.perf.log']._track('construction.boq.report.read_group'):
+            return super().read_group(domain, fields, groupby, offset=offset, limit=limit, orderby=orderby, lazy=lazy)
@@ -57,6 +57,16 @@ class ConstructionBOQRevision(models.Model):
         index=True, # Indexed for better search performance
     )
    
+    # Performance Optimization: Lineage key so a BOQ's history resolves with one indexed lookup
+    root_boq_id = fields.Many2one(
+        related='new_boq_id.root_boq_id',
+        string='Original Version',
+        store=True,
+        index=True,
+        readonly=True,
+        help="First version of the BOQ this revision belongs to"
+    )
+
     # Performance Optimization: Related fields to avoid extra queries
     original_boq_name = fields.Char(
         related='original_boq_id.name',
@@ -116,21 +126,29 @@ class ConstructionBOQRevision(models.Model):
     @api.constrains('original_boq_id', 'new_boq_id')
     def _check_boq_relationship(self):
         """Validate BOQ relationship to prevent circular revisions"""
-        for revision in self:
-            if revision.original_boq_id == revision.new_boq_id:
-                raise ValidationError(_('Original BOQ and New BOQ cannot be the same.'))
-           
-            # Check if new_boq_id is already an original in another revision
-            # This prevents creating revision chains that are too long
-            existing_revision = self.search([
-                ('original_boq_id', '=', revision.new_boq_id.id)
-            ], limit=1)
-           
-            if existing_revision and existing_revision.id != revision.id:
-                raise ValidationError(
-                    _('This BOQ is already an original in another revision. '
-                      'Please update the existing revision instead.')
-                )
+        same = self.filtered(lambda r: r.original_boq_id == r.new_boq_id)
+        if same:
+            raise ValidationError(_('Original BOQ and New BOQ cannot be the same.'))
+
+        # Check if new_boq_id is already an original in another revision
+        # This prevents creating revision chains that are too long
+        # One search for the whole batch instead of one per revision
+        if not self.new_boq_id:
+            return
+        existing_revisions = self.search([('original_boq_id', 'in', self.new_boq_id.ids)])
+        originals = {}
+        for existing in existing_revisions:
+            originals.setdefault(existing.original_boq_id.id, self.browse())
+            originals[existing.original_boq_id.id] |= existing
+        offenders = self.filtered(
+            lambda r: r.new_boq_id and (originals.get(r.new_boq_id.id, self.browse()) - r)
+        )
+        if offenders:
+            raise ValidationError(
+                _('This BOQ is already an original in another revision. '
+                  'Please update the existing revision instead.')
+                + '\n' + '\n'.join(offenders.new_boq_id.mapped('display_name'))
+            )
     
     def name_get(self):
         """Optimized name_get to avoid multiple queries"""
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import datetime
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from markupsafe import Markup
+
+from odoo import models, fields, api
+from odoo.exceptions import MissingError
+
+_logger = logging.getLogger(__name__)
+
+
+class ConstructionBOQTrackingBuffer(models.Model):
+    _name = 'construction.boq.tracking.buffer'
+    _description = 'BOQ Buffered Tracking'
+    _order = 'id'
+    _rec_name = 'boq_id'
+
+    boq_id = fields.Many2one('construction.boq', string='BOQ Reference', required=True, index=True, ondelete='cascade')
+    field_id = fields.Many2one('ir.model.fields', string='Field', ondelete='cascade')
+    # Values of a mail.tracking.value (old_value_* / new_value_*), or a note to log
+    tracking_values = fields.Json(string='Tracking Values')
+    body = fields.Text(string='Note')
+
+    @api.model
+    def _is_throttled(self):
+        """BOQ tracking is buffered and summarised when the mode is 'throttled'."""
+        return self.env['ir.config_parameter'].sudo().get_param('construction_boq.tracking_mode', 'immediate') == 'throttled'
+
+    @api.model
+    def _buffer(self, tracking_by_boq=None, bodies=None):
+        """Store {boq id: [tracking values]} and {boq id: note} until the next summary."""
+        vals_list = []
+        for boq_id, tracking_values_list in (tracking_by_boq or {}).items():
+            for values in tracking_values_list:
+                values = {
+                    key: fields.Datetime.to_string(value) if isinstance(value, datetime.date) else value
+                    for key, value in values.items()
+                }
+                vals_list.append({'boq_id': boq_id, 'field_id': values.get('field_id'), 'tracking_values': values})
+        for boq_id, body in (bodies or {}).items():
+            vals_list.append({'boq_id': boq_id, 'body': body})
+        if vals_list:
+            self.sudo().create(vals_list)
+
+    # -------------------------------------------------------------------------
+    # SUMMARY
+    # -------------------------------------------------------------------------
+    @api.model
+    def _cron_flush(self):
+        """
+        Summarise the BOQs whose edit session is over: no change buffered for
+        the last construction_boq.tracking_window_minutes (default 15).
+        """
+        window = int(self.env['ir.config_parameter'].sudo().get_param('construction_boq.tracking_window_minutes', 15))
+        self.env.cr.execute("""
+            SELECT boq_id
+            FROM construction_boq_tracking_buffer
+            GROUP BY boq_id
+            HAVING MAX(create_date) < %s
+        """, (fields.Datetime.now() - timedelta(minutes=window),))
+        boq_ids = [boq_id for boq_id, in self.env.cr.fetchall()]
+        if boq_ids:
+            self._flush(boq_ids)
+
+    @api.model
+    def _flush(self, boq_ids):
+        """
+        Write one message per BOQ for the buffered rows: each field goes from
+        its first old value to its last new value (fields back to their
+        initial value are dropped), notes are joined. Messages are created in
+        a single batch.
+        """
+        self.env.cr.execute("""
+            SELECT id FROM construction_boq_tracking_buffer
+            WHERE boq_id IN %s
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+        """, (tuple(boq_ids),))
+        rows = self.sudo().browse([row_id for row_id, in self.env.cr.fetchall()])
+        if not rows:
+            return
+
+        by_boq = defaultdict(lambda: rows.browse())
+        for row in rows:
+            by_boq[row.boq_id] |= row
+
+        subtype_id = self.env['ir.model.data']._xmlid_to_res_id('mail.mt_note')
+        message_vals_list = []
+        for boq, boq_rows in by_boq.items():
+            tracking_value_ids = self._merge_tracking_values(boq_rows.filtered('tracking_values'))
+            notes = [row.body for row in boq_rows if row.body]
+            if not tracking_value_ids and not notes:
+                continue
+            last = boq_rows[-1]
+            message_vals_list.append({
+                'model': boq._name,
+                'res_id': boq.id,
+                'message_type': 'notification',
+                'subtype_id': subtype_id,
+                'author_id': last.create_uid.partner_id.id,
+                'date': last.create_date,
+                'body': Markup('<br/>').join(notes),
+                'tracking_value_ids': tracking_value_ids,
+            })
+        if message_vals_list:
+            self.env['mail.message'].sudo().create(message_vals_list)
+        rows.unlink()
+        _logger.info("BOQ tracking: %s buffered change(s) summarised in %s message(s)", len(rows), len(message_vals_list))
+
+    @api.model
+    def _merge_tracking_values(self, rows):
+        merged = {}
+        for row in rows:
+            values = row.tracking_values
+            if row.field_id.id in merged:
+                merged[row.field_id.id].update({key: value for key, value in values.items() if not key.startswith('old_value_')})
+            else:
+                merged[row.field_id.id] = dict(values)
+        return [
+            (0, 0, values)
+            for values in merged.values()
+            if any(values.get(key) != values.get('new' + key[3:]) for key in values if key.startswith('old_value_'))
+        ]
+
+
+class ConstructionBOQ(models.Model):
+    _inherit = 'construction.boq'
+
+    def _message_track(self, fields_iter, initial_values_dict):
+        """In throttled mode, buffer the tracking values instead of logging one message per write."""
+        Buffer = self.env['construction.boq.tracking.buffer']
+        if not fields_iter or not Buffer._is_throttled():
+            return super()._message_track(fields_iter, initial_values_dict)
+
+        tracked_fields = self.fields_get(fields_iter, attributes=('string', 'type', 'selection', 'currency_field'))
+        tracking = {}
+        for record in self:
+            try:
+                tracking[record.id] = record._mail_track(tracked_fields, initial_values_dict[record.id])
+            except MissingError:
+                continue
+        Buffer._buffer(tracking_by_boq={
+            boq_id: [command[2] for command in tracking_value_ids]
+            for boq_id, (changes, tracking_value_ids) in tracking.items()
+            if tracking_value_ids
+        })
+        return tracking
+
+    def _message_post_or_buffer(self, bodies):
+        """Post {boq id: body} on the BOQs, or buffer them in throttled mode."""
+        Buffer = self.env['construction.boq.tracking.buffer']
+        if Buffer._is_throttled():
+            Buffer._buffer(bodies=bodies)
+            return
+        for boq in self.browse(list(bodies)):
+            boq.message_post(body=bodies[boq.id])
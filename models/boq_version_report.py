@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, tools
+
+
+class ConstructionBOQVersionReport(models.Model):
+    _name = 'construction.boq.version.report'
+    _description = 'BOQ Version-over-Version Variance Analysis'
+    _auto = False
+    _rec_name = 'boq_line_id'
+    _order = 'root_boq_id, lineage_line_id, version'
+
+    # Dimensions
+    boq_line_id = fields.Many2one('construction.boq.line', string='BOQ Line', readonly=True)
+    lineage_line_id = fields.Many2one('construction.boq.line', string='Current Line', readonly=True,
+                                      help="Live BOQ line this version of the item belongs to.")
+    boq_id = fields.Many2one('construction.boq', string='BOQ Version', readonly=True)
+    root_boq_id = fields.Many2one('construction.boq', string='Original Version', readonly=True)
+    version = fields.Integer(string='Version', readonly=True, group_operator="max")
+    is_current_version = fields.Boolean(string='Current Version', readonly=True)
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('submitted', 'Submitted'),
+        ('approved', 'Approved'),
+        ('locked', 'Locked'),
+        ('closed', 'Closed')
+    ], string='Status', readonly=True)
+    project_id = fields.Many2one('project.project', string='Project', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    product_id = fields.Many2one('product.product', string='Product', readonly=True)
+    cost_type = fields.Selection([
+        ('material', 'Material'),
+        ('labor', 'Labor'),
+        ('subcontract', 'Subcontract'),
+        ('service', 'Service'),
+        ('overhead', 'Overhead')
+    ], string='Cost Type', readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Currency', readonly=True)
+
+    # Measures: Budget of this version
+    budget_quantity = fields.Float(string='Budget Qty', readonly=True)
+    budget_amount = fields.Monetary(string='Budget Amount', readonly=True)
+
+    # Measures: Drift (Calculated in SQL with window functions over the version lineage)
+    delta_quantity = fields.Float(string='Delta Qty', readonly=True, help="Budget Qty - Budget Qty of the previous version")
+    delta_amount = fields.Monetary(string='Delta Amount', readonly=True, help="Budget Amount - Budget Amount of the previous version")
+    drift_quantity = fields.Float(string='Cumulative Drift Qty', readonly=True, help="Budget Qty - Budget Qty of the baseline version")
+    drift_amount = fields.Monetary(string='Cumulative Drift Amount', readonly=True, help="Budget Amount - Budget Amount of the baseline version")
+
+    # Measures: Actuals (only on the current version, so totals are not repeated per version)
+    consumed_quantity = fields.Float(string='Actual Qty', readonly=True)
+    consumed_amount = fields.Monetary(string='Actual Amount', readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+
+        # Snapshot lines carry root_line_id pointing at the live line, live lines have none:
+        # COALESCE gives one lineage key per budget item across every version.
+        query = """
+            CREATE OR REPLACE VIEW %s AS (
+                WITH versioned AS (
+                    SELECT
+                        l.id AS boq_line_id,
+                        COALESCE(l.root_line_id, l.id) AS lineage_line_id,
+                        b.id AS boq_id,
+                        b.root_boq_id,
+                        b.version,
+                        b.active AS is_current_version,
+                        b.state,
+                        b.project_id,
+                        b.company_id,
+                        l.product_id,
+                        l.cost_type,
+                        l.currency_id,
+                        l.quantity AS budget_quantity,
+                        l.budget_amount,
+                        MIN(b.version) OVER (PARTITION BY b.root_boq_id) AS baseline_version
+                    FROM construction_boq_line l
+                    INNER JOIN construction_boq b ON b.id = l.boq_id
+                    WHERE l.display_type IS NULL
+                    AND b.root_boq_id IS NOT NULL
+                ),
+                windowed AS (
+                    SELECT
+                        v.*,
+                        -- Items added after the baseline start from zero
+                        CASE WHEN v.version = v.baseline_version THEN v.budget_quantity
+                             ELSE COALESCE(LAG(v.budget_quantity) OVER w, 0.0) END AS previous_quantity,
+                        CASE WHEN v.version = v.baseline_version THEN v.budget_amount
+                             ELSE COALESCE(LAG(v.budget_amount) OVER w, 0.0) END AS previous_amount,
+                        CASE WHEN FIRST_VALUE(v.version) OVER w = v.baseline_version
+                             THEN FIRST_VALUE(v.budget_quantity) OVER w ELSE 0.0 END AS baseline_quantity,
+                        CASE WHEN FIRST_VALUE(v.version) OVER w = v.baseline_version
+                             THEN FIRST_VALUE(v.budget_amount) OVER w ELSE 0.0 END AS baseline_amount
+                    FROM versioned v
+                    WINDOW w AS (PARTITION BY v.lineage_line_id ORDER BY v.version)
+                )
+                SELECT
+                    ROW_NUMBER() OVER (ORDER BY w.root_boq_id, w.lineage_line_id, w.version) AS id,
+                    w.boq_line_id,
+                    w.lineage_line_id,
+                    w.boq_id,
+                    w.root_boq_id,
+                    w.version,
+                    w.is_current_version,
+                    w.state,
+                    w.project_id,
+                    w.company_id,
+                    w.product_id,
+                    w.cost_type,
+                    w.currency_id,
+                    w.budget_quantity,
+                    w.budget_amount,
+                    (w.budget_quantity - w.previous_quantity) AS delta_quantity,
+                    (w.budget_amount - w.previous_amount) AS delta_amount,
+                    (w.budget_quantity - w.baseline_quantity) AS drift_quantity,
+                    (w.budget_amount - w.baseline_amount) AS drift_amount,
+                    CASE WHEN w.is_current_version THEN COALESCE(cons.sum_qty, 0.0) ELSE 0.0 END AS consumed_quantity,
+                    CASE WHEN w.is_current_version THEN COALESCE(cons.sum_amt, 0.0) ELSE 0.0 END AS consumed_amount
+                FROM windowed w
+
+                -- The ledger is always attached to the live line of the lineage
+                LEFT JOIN (
+                    SELECT
+                        c.boq_line_id,
+                        SUM(c.quantity) AS sum_qty,
+                        SUM(c.amount) AS sum_amt
+                    FROM construction_boq_consumption c
+                    GROUP BY c.boq_line_id
+                ) cons ON cons.boq_line_id = w.lineage_line_id
+            )
+        """ % self._table
+
+        self.env.cr.execute(query)
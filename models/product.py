@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from odoo import models
+
+# Product fields behind the configuration health of BOQ lines (see construction.boq.product.health)
+HEALTH_TEMPLATE_FIELDS = ('uom_id', 'standard_price', 'property_account_expense_id', 'categ_id')
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    def write(self, vals):
+        res = super().write(vals)
+        health_fields = [field for field in HEALTH_TEMPLATE_FIELDS if field in vals]
+        if health_fields:
+            Health = self.env['construction.boq.product.health'].sudo()
+            product_ids = self.with_context(active_test=False).product_variant_ids.ids
+            if health_fields == ['standard_price']:
+                Health._refresh_price_products(product_ids, vals['standard_price'])
+            else:
+                Health._refresh_products(product_ids=product_ids)
+        return res
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Valuation updates the company dependent cost on the variant directly, on every receipt
+        if 'standard_price' in vals:
+            self.env['construction.boq.product.health'].sudo()._refresh_price_products(self.ids, vals['standard_price'])
+        return res
+
+
+class ProductCategory(models.Model):
+    _inherit = 'product.category'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'property_account_expense_categ_id' in vals:
+            self.env['construction.boq.product.health'].sudo()._refresh_products(categ_ids=self.ids)
+        return res
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
+from odoo.osv import expression
+from odoo.tools import SQL
 
 
 class ProjectTask(models.Model):
@@ -9,31 +11,90 @@ class ProjectTask(models.Model):
     activity_code = fields.Char(
         string='Activity Code',
         help="Code used to link with BOQ lines for cost control.",
-        index=True,  # Added index for faster searches/filtering
+        index='trigram',  # pg_trgm index for fast partial-code searches
         copy=False  # Prevent copying when duplicating tasks
     )
 
+    # Budget rollups from the BOQ lines scheduled on the task, maintained by the ORM
+    # from line/ledger changes so planning views read them without any aggregation.
+    boq_line_ids = fields.One2many('construction.boq.line', 'task_id', string='BOQ Lines')
+    boq_currency_id = fields.Many2one('res.currency', related='company_id.currency_id', string='BOQ Currency', readonly=True)
+    boq_budget_amount = fields.Monetary(string='BOQ Budget', compute='_compute_boq_amounts', store=True, currency_field='boq_currency_id')
+    boq_consumed_amount = fields.Monetary(string='BOQ Consumed', compute='_compute_boq_amounts', store=True, currency_field='boq_currency_id')
+    boq_remaining_amount = fields.Monetary(string='BOQ Remaining', compute='_compute_boq_amounts', store=True, currency_field='boq_currency_id')
+    boq_total_budget_amount = fields.Monetary(string='BOQ Budget (incl. Sub-tasks)', compute='_compute_boq_total_amounts', store=True, recursive=True, currency_field='boq_currency_id')
+    boq_total_consumed_amount = fields.Monetary(string='BOQ Consumed (incl. Sub-tasks)', compute='_compute_boq_total_amounts', store=True, recursive=True, currency_field='boq_currency_id')
+    boq_total_remaining_amount = fields.Monetary(string='BOQ Remaining (incl. Sub-tasks)', compute='_compute_boq_total_amounts', store=True, recursive=True, currency_field='boq_currency_id')
+
     _sql_constraints = [
         ('uniq_activity_code_project', 
          'UNIQUE(project_id, activity_code)', 
          'Activity Code must be unique per project.')
     ]
 
+    @api.depends('boq_line_ids.budget_amount', 'boq_line_ids.consumed_amount', 'boq_line_ids.boq_state', 'boq_line_ids.boq_active')
+    def _compute_boq_amounts(self):
+        """
+        Only the product lines of the active, approved/locked/closed BOQ versions
+        count. The totals of the recomputed tasks are fully re-aggregated in one
+        grouped query, not adjusted by deltas.
+        """
+        totals = {}
+        task_ids = [task_id for task_id in self.ids if task_id]
+        if task_ids:
+            # sudo: the rollup must not depend on the BOQ access of the user triggering it
+            groups = self.env['construction.boq.line'].sudo()._read_group(
+                [
+                    ('task_id', 'in', task_ids),
+                    ('display_type', '=', False),
+                    ('boq_active', '=', True),
+                    ('boq_state', 'in', ['approved', 'locked', 'closed']),
+                ],
+                ['task_id'],
+                ['budget_amount:sum', 'consumed_amount:sum'],
+            )
+            totals = {task.id: (budget, consumed) for task, budget, consumed in groups}
+
+        for task in self:
+            task.boq_budget_amount, task.boq_consumed_amount = totals.get(task.id, (0.0, 0.0))
+            task.boq_remaining_amount = task.boq_budget_amount - task.boq_consumed_amount
+
+    @api.depends('boq_budget_amount', 'boq_consumed_amount',
+                 'child_ids.boq_total_budget_amount', 'child_ids.boq_total_consumed_amount')
+    def _compute_boq_total_amounts(self):
+        for task in self:
+            task.boq_total_budget_amount = task.boq_budget_amount + sum(task.child_ids.mapped('boq_total_budget_amount'))
+            task.boq_total_consumed_amount = task.boq_consumed_amount + sum(task.child_ids.mapped('boq_total_consumed_amount'))
+            task.boq_total_remaining_amount = task.boq_total_budget_amount - task.boq_total_consumed_amount
+
     @api.constrains('activity_code', 'project_id')
     def _check_activity_code_uniqueness(self):
         """Additional Python constraint for better validation messages and bulk operations."""
-        for task in self:
-            if task.activity_code:
-                # Only check if activity_code is not empty
-                existing = self.search([
-                    ('project_id', '=', task.project_id.id),
-                    ('activity_code', '=', task.activity_code),
-                    ('id', '!=', task.id)
-                ], limit=1)
-                if existing:
-                    raise ValidationError(
-                        f"Activity Code '{task.activity_code}' already exists for this project."
-                    )
+        tasks = self.filtered('activity_code')
+        if not tasks:
+            return
+        # One grouped query for the whole batch instead of a search per task. Same scope
+        # as a per-task search: active tasks only, tasks without project compared together.
+        project_ids = [task.project_id.id for task in tasks]
+        groups = self._read_group(
+            [
+                ('project_id', 'in', list(set(project_ids))),
+                ('activity_code', 'in', list(set(tasks.mapped('activity_code')))),
+            ],
+            ['project_id', 'activity_code'],
+            ['__count'],
+            having=[('__count', '>', 1)],
+        )
+        keys = {(task.project_id.id, task.activity_code) for task in tasks}
+        duplicates = sorted({
+            activity_code
+            for project, activity_code, count in groups
+            if (project.id, activity_code) in keys
+        })
+        if duplicates:
+            raise ValidationError("\n".join(
+                f"Activity Code '{code}' already exists for this project." for code in duplicates
+            ))
 
     @api.model
     def create(self, vals_list):
@@ -64,19 +125,20 @@ class ProjectTask(models.Model):
         return super().copy(default)
 
     @api.model
-    def _name_search(self, name='', args=None, operator='ilike', limit=100, name_get_uid=None):
-        """Optimize search for activity_code."""
-        if args is None:
-            args = []
-        
-        # If searching by code prefix (common pattern), optimize the query
-        if operator in ('=', 'ilike', 'like') and name:
-            # Try to match by activity_code first as it's likely more specific
-            tasks = self.search(
-                args + [('activity_code', operator, name)], 
-                limit=limit
-            )
-            if tasks:
-                return tasks.ids
-        
-        return super()._name_search(name, args, operator, limit, name_get_uid)
\ No newline at end of file
+    def _name_search(self, name, domain=None, operator='ilike', limit=None, order=None):
+        """Search activity codes and task names in one query, exact code matches first."""
+        if not name or operator not in ('=', 'ilike', 'like', '=ilike'):
+            return super()._name_search(name, domain, operator, limit, order)
+
+        search_domain = expression.AND([
+            domain or [],
+            ['|', ('activity_code', operator, name), ('name', operator, name)],
+        ])
+        query = self._search(search_domain, limit=limit, order=order)
+        if not order:
+            code = SQL.identifier(query.table, 'activity_code')
+            ranking = SQL("(UPPER(%s) = UPPER(%s)) DESC NULLS LAST", code, name)
+            if self.env.registry.has_trigram:
+                ranking = SQL("%s, word_similarity(%s, %s) DESC NULLS LAST", ranking, name, code)
+            query.order = SQL("%s, %s", ranking, SQL.identifier(query.table, 'id'))
+        return query
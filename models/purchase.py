@@ -39,7 +39,7 @@ class PurchaseOrderLine(models.Model):
         string='BOQ Item',
         index=True,
         # [FIX] Added display_type = False to domain
-        domain="[('boq_id', '=', parent.boq_id), ('boq_id.state', 'in', ('approved', 'locked')), ('display_type', '=', False)]"
+        domain="[('boq_id', '=', parent.boq_id), ('boq_state', 'in', ('approved', 'locked')), ('boq_active', '=', True), ('display_type', '=', False)]"
     )
 
     @api.onchange('boq_line_id')
@@ -52,8 +52,9 @@ class PurchaseOrderLine(models.Model):
         }
         
         if self.boq_line_id:
+            lookup_values = self.boq_line_id._get_lookup_values()
             for line_field, boq_field in field_mapping.items():
-                boq_value = getattr(self.boq_line_id, boq_field, False)
+                boq_value = lookup_values[boq_field]
                 if boq_value and not getattr(self, line_field, False):
                     setattr(self, line_field, boq_value)
 
@@ -93,6 +94,16 @@ class PurchaseOrderLine(models.Model):
             # Create lookup dictionaries for O(1) access
             boq_by_id = {data['id']: data for data in boq_data}
             
+            # Ordered quantities in the unit of the BOQ line
+            BOQLine = self.env['construction.boq.line']
+            uom_factors = BOQLine._get_uom_factors(
+                (line.product_uom.id, line.boq_line_id.uom_id.id) for line in boq_lines
+            )
+            line_quantities = {
+                line.id: BOQLine._convert_quantity(uom_factors, line.product_qty, line.product_uom.id, line.boq_line_id.uom_id.id)
+                for line in boq_lines
+            }
+            
             # Group lines by boq_line_id for efficient processing
             lines_by_boq = defaultdict(list)
             for line in boq_lines:
@@ -122,10 +133,10 @@ class PurchaseOrderLine(models.Model):
                     
                     # Check each line's quantity against the same remaining quantity
                     for line in lines:
-                        if line.product_qty > remaining_qty:
+                        if line_quantities[line.id] > remaining_qty:
                             raise ValidationError(
                                 _('Purchase Quantity (%s) exceeds BOQ Remaining Quantity (%s) for item %s.') % (
-                                    line.product_qty,
+                                    line_quantities[line.id],
                                     remaining_qty,
                                     boq_info['name']
                                 )
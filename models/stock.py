@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
 
@@ -12,10 +14,77 @@ class StockMove(models.Model):
         string='BOQ Line',
         index=True,
         # [FIX] Added display_type = False to domain
-        domain="[('boq_id.state', 'in', ('approved', 'locked')), ('display_type', '=', False)]",
+        domain="[('boq_state', 'in', ('approved', 'locked')), ('boq_active', '=', True), ('display_type', '=', False)]",
         help="Link this move to a BOQ line for budget tracking."
     )
 
+    boq_activity_code = fields.Char(
+        string='Activity Code',
+        help="Schedule activity code used to link this move to a BOQ line automatically."
+    )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super().create(vals_list)
+        moves._auto_link_boq_lines()
+        return moves
+
+    def _auto_link_boq_lines(self):
+        """
+        Fill in the BOQ line of moves from their purchase line, or from their project
+        and activity code / product resolved against one prebuilt map per batch.
+        Only lines of the same product are picked (see _check_boq_product_match).
+        Dropship and direct-to-site moves do not inherit the BOQ line of their
+        purchase line: the vendor bill records that consumption.
+        """
+        candidates = self.filtered(lambda m: not m.boq_line_id and m.product_id)
+        if not candidates:
+            return
+
+        picking_has_project = 'project_id' in self.env['stock.picking']._fields
+        groups = defaultdict(list)
+        to_resolve = self.browse()
+        for move in candidates:
+            purchase_boq_line = move.purchase_line_id.boq_line_id
+            if purchase_boq_line and move._is_billed_boq_consumption():
+                continue
+            if purchase_boq_line and purchase_boq_line.product_id == move.product_id:
+                groups[purchase_boq_line.id].append(move.id)
+            else:
+                to_resolve |= move
+
+        if to_resolve:
+            keys = [
+                (
+                    move.purchase_line_id.order_id.project_id.id
+                    or (picking_has_project and move.picking_id.project_id.id),
+                    move.boq_activity_code,
+                    move.product_id.id,
+                )
+                for move in to_resolve
+            ]
+            resolved = self.env['construction.boq.line'].sudo()._resolve_boq_lines(keys, require_product=True)
+            for move, boq_line_id in zip(to_resolve, resolved):
+                if boq_line_id:
+                    groups[boq_line_id].append(move.id)
+
+        for boq_line_id, move_ids in groups.items():
+            self.browse(move_ids).write({'boq_line_id': boq_line_id})
+
+    def _is_billed_boq_consumption(self):
+        """Supplier goods delivered straight to a customer or production location (dropship, direct to site)."""
+        self.ensure_one()
+        return self.location_id.usage == 'supplier' and self.location_dest_id.usage in ('customer', 'production')
+
+    def _records_boq_consumption(self):
+        """Linked issues to a customer or production location, except those consumed by their vendor bill."""
+        self.ensure_one()
+        return bool(
+            self.boq_line_id
+            and self.location_dest_id.usage in ('customer', 'production')
+            and not self._is_billed_boq_consumption()
+        )
+
     # ---------------------------------------------------------
     # Constraints & Validations
     # ---------------------------------------------------------
@@ -60,16 +129,15 @@ class StockMove(models.Model):
         # Custom Logic: If BOQ Line exists, use its expense account, or fallback to product
         if self.boq_line_id and self.location_dest_id.usage in ('customer', 'production'):
             # [FIX] Attempt to use BOQ line account, fallback to product/category defaults
-            account = self.boq_line_id.expense_account_id or \
-                      self.boq_line_id.product_id.property_account_expense_id or \
-                      self.boq_line_id.product_id.categ_id.property_account_expense_categ_id
+            # (resolved once per line and kept in the registry cache)
+            account_id = self.boq_line_id._get_lookup_values()['expense_account_id']
             
-            if not account:
+            if not account_id:
                 raise ValidationError(
                     _("The linked BOQ Line %s (Product: %s) has no Expense Account configured.") % 
                     (self.boq_line_id.name, self.boq_line_id.product_id.name)
                 )
-            return account.id
+            return account_id
             
         return destination_account_id
 
@@ -83,11 +151,12 @@ class StockMove(models.Model):
         # Call super to get the list of move line values [(0, 0, vals), (0, 0, vals)]
         res = super()._prepare_account_move_line(qty, cost, credit_account_id, debit_account_id, description)
         
-        if self.boq_line_id and self.boq_line_id.analytic_distribution:
+        analytic_distribution = self.boq_line_id and self.boq_line_id._get_lookup_values()['analytic_distribution']
+        if analytic_distribution:
             # Use list comprehension for more efficient processing
             return [
                 (command, cid, dict(vals, **{
-                    'analytic_distribution': self.boq_line_id.analytic_distribution
+                    'analytic_distribution': analytic_distribution
                 }) if (
                     len(tuple_data) == 3 and 
                     vals.get('account_id') == debit_account_id
@@ -107,13 +176,16 @@ class StockMove(models.Model):
         1. Enforce BOQ limits (Validation)
         2. Create Consumption Ledger entries (Recording)
         """
+        with self.env['construction.boq.perf.log']._track('stock.move._action_done', len(self)) as perf:
+            return self._action_done_boq(perf, cancel_backorder=cancel_backorder)
+
+    def _action_done_boq(self, perf, cancel_backorder=False):
         # 1. PRE-VALIDATION PHASE (Before move is Done)
         # Pre-filter moves that need validation
         moves_to_validate = self.filtered(
             lambda m: (
-                m.boq_line_id and 
-                m.state != 'done' and 
-                m.location_dest_id.usage in ('customer', 'production') and
+                m._records_boq_consumption() and
+                m.state != 'done' and
                 m.quantity > 0
             )
         )
@@ -122,10 +194,26 @@ class StockMove(models.Model):
             # Bulk read remaining quantities to avoid N+1 queries
             boq_line_ids = moves_to_validate.mapped('boq_line_id.id')
             boq_lines = self.env['construction.boq.line'].browse(boq_line_ids)
+
+            # Same ordered locking as bill posting, so concurrent issues cannot overdraw a line
+            lock_wait = boq_lines._lock_for_consumption()
+            if perf is not None:
+                perf['lock_wait'] += lock_wait
             
-            # Create a dictionary for quick lookup
+            # Issued quantities in the unit of the BOQ line
+            BOQLine = self.env['construction.boq.line']
+            uom_factors = BOQLine._get_uom_factors(
+                (move.product_uom.id, move.boq_line_id.uom_id.id) for move in moves_to_validate
+            )
+            line_quantities = {
+                move.id: BOQLine._convert_quantity(uom_factors, move.quantity, move.product_uom.id, move.boq_line_id.uom_id.id)
+                for move in moves_to_validate
+            }
+
+            # Create a dictionary for quick lookup (quantities reserved by deferred bills are not available)
+            pending = self.env['construction.boq.consumption.queue'].sudo()._get_pending(boq_lines.ids)
             remaining_qty_dict = {
-                line.id: line.remaining_quantity
+                line.id: line.remaining_quantity - pending.get(line.id, (0.0, 0.0))[0]
                 for line in boq_lines
                 if not line.allow_over_consumption
             }
@@ -134,14 +222,14 @@ class StockMove(models.Model):
             invalid_moves = []
             for move in moves_to_validate:
                 remaining_qty = remaining_qty_dict.get(move.boq_line_id.id)
-                if remaining_qty is not None and move.quantity > remaining_qty:
+                if remaining_qty is not None and line_quantities[move.id] > remaining_qty:
                     invalid_moves.append(move)
             
             if invalid_moves:
                 move_info = [
                     _("%s: Issued Quantity (%s) exceeds BOQ Remaining Quantity (%s)") % (
                         m.product_id.name,
-                        m.quantity,
+                        line_quantities[m.id],
                         remaining_qty_dict[m.boq_line_id.id]
                     )
                     for m in invalid_moves
@@ -159,11 +247,7 @@ class StockMove(models.Model):
         
         # Filter moves that need consumption records
         moves_for_consumption = self.filtered(
-            lambda m: (
-                m.state == 'done' and 
-                m.boq_line_id and 
-                m.location_dest_id.usage in ('customer', 'production')
-            )
+            lambda m: m.state == 'done' and m._records_boq_consumption()
         )
         
         if moves_for_consumption:
@@ -171,6 +255,10 @@ class StockMove(models.Model):
             consumption_vals = []
             today = fields.Date.today()
             user_id = self.env.user.id
+            BOQLine = self.env['construction.boq.line']
+            uom_factors = BOQLine._get_uom_factors(
+                (move.product_uom.id, move.boq_line_id.uom_id.id) for move in moves_for_consumption
+            )
             
             for move in moves_for_consumption:
                 price_unit = abs(move.price_unit)  # Standard Cost / Moving Average Cost
@@ -180,7 +268,7 @@ class StockMove(models.Model):
                     'boq_line_id': move.boq_line_id.id,
                     'source_model': 'stock.move',
                     'source_id': move.id,
-                    'quantity': move.quantity,
+                    'quantity': BOQLine._convert_quantity(uom_factors, move.quantity, move.product_uom.id, move.boq_line_id.uom_id.id),
                     'amount': amount_consumed,
                     'date': move.date or today,
                     'user_id': user_id
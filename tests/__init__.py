@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+from . import test_boq_line_resolver
+from . import test_revision_lineage
+from . import test_revision_snapshot
+from . import test_boq_evm
+from . import test_boq_lock
+from . import test_boq_queue
+from . import test_boq_recompute
+from . import test_boq_uom
+from . import test_boq_tracking
+from . import test_boq_dropship
+from . import test_boq_timesheet
+from . import test_boq_alert
+from . import test_boq_consistency
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase
+
+
+class TestBOQAlert(TransactionCase):
+    """
+    Verify the budget threshold alerts: a line crossing its threshold raises
+    one activity on its BOQ, and evaluating again does not raise it twice.
+    """
+
+    def setUp(self):
+        super(TestBOQAlert, self).setUp()
+        project = self.env['project.project'].create({'name': 'Alert Project'})
+        self.boq = self.env['construction.boq'].create({
+            'name': 'Alert BOQ',
+            'project_id': project.id,
+            'analytic_account_id': self.env['account.analytic.account'].search([], limit=1).id,
+        })
+        product = self.env['product.product'].create({'name': 'Alert Product', 'standard_price': 10})
+        self.line = self.env['construction.boq.line'].create({
+            'boq_id': self.boq.id,
+            'name': 'Alert line',
+            'product_id': product.id,
+            'quantity': 10,
+            'estimated_rate': 10,
+            'uom_id': self.env.ref('uom.product_uom_unit').id,
+            'expense_account_id': self.env['account.account'].search([], limit=1).id,
+        })
+        self.boq.action_approve()
+        self.Threshold = self.env['construction.boq.alert.threshold']
+        self.Threshold.create({'boq_id': self.boq.id, 'threshold_percent': 80.0})
+        self.source_id = 0
+
+    def _consume(self, amount):
+        self.source_id += 1
+        self.env['construction.boq.consumption'].create({
+            'boq_line_id': self.line.id,
+            'quantity': amount / 10,
+            'amount': amount,
+            'source_model': 'stock.move',
+            'source_id': self.source_id,
+        })
+        self.env.flush_all()
+
+    def _get_alerts(self):
+        return self.env['mail.activity'].search([
+            ('res_model', '=', 'construction.boq'),
+            ('res_id', '=', self.boq.id),
+            ('summary', 'like', 'Budget threshold reached'),
+        ])
+
+    def test_alert_once_per_crossing(self):
+        self._consume(50)
+        self.Threshold._cron_evaluate_thresholds()
+        self.assertFalse(self._get_alerts(), "50% is below the threshold")
+
+        self._consume(40)
+        self.Threshold._cron_evaluate_thresholds()
+        alerts = self._get_alerts()
+        self.assertEqual(len(alerts), 1)
+        self.assertIn('Alert line', alerts.note)
+
+        self.Threshold._cron_evaluate_thresholds()
+        self.assertEqual(self._get_alerts(), alerts, "Nothing new to evaluate")
+
+        # Still above the threshold: consuming more is not a new crossing
+        self._consume(5)
+        self.Threshold._cron_evaluate_thresholds()
+        self.assertEqual(self._get_alerts(), alerts)
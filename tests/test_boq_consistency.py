@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from odoo import Command
+from odoo.tests.common import TransactionCase
+
+
+class TestBOQConsistency(TransactionCase):
+    """
+    Verify the ledger consistency check: ledger rows of a bill line are
+    compared with its quantity and amount, and stored line totals that
+    drifted from the ledger are detected and repaired.
+    """
+
+    def setUp(self):
+        super(TestBOQConsistency, self).setUp()
+        project = self.env['project.project'].create({'name': 'Consistency Project'})
+        boq = self.env['construction.boq'].create({
+            'name': 'Consistency BOQ',
+            'project_id': project.id,
+            'analytic_account_id': self.env['account.analytic.account'].search([], limit=1).id,
+        })
+        product = self.env['product.product'].create({'name': 'Consistency Product', 'standard_price': 10})
+        self.line = self.env['construction.boq.line'].create({
+            'boq_id': boq.id,
+            'name': 'Consistency line',
+            'product_id': product.id,
+            'quantity': 10,
+            'estimated_rate': 10,
+            'uom_id': self.env.ref('uom.product_uom_unit').id,
+            'expense_account_id': self.env['account.account'].search([], limit=1).id,
+        })
+        boq.action_approve()
+        self.bill = self.env['account.move'].create({
+            'move_type': 'in_invoice',
+            'partner_id': self.env['res.partner'].create({'name': 'Consistency Vendor'}).id,
+            'invoice_date': '2024-01-10',
+            'invoice_line_ids': [Command.create({
+                'product_id': product.id,
+                'quantity': 4,
+                'price_unit': 10,
+                'boq_line_id': self.line.id,
+                'tax_ids': [Command.clear()],
+            })],
+        })
+        self.bill.action_post()
+        self.Issue = self.env['construction.boq.consistency.issue']
+
+    def _get_issues(self):
+        self.Issue._run_check()
+        return self.Issue.search([('boq_line_id', '=', self.line.id), ('state', '=', 'open')])
+
+    def test_posted_bill_consistent(self):
+        self.assertFalse(self._get_issues())
+
+    def test_amount_mismatch_detected(self):
+        # Same quantity, but the ledger holds 5 more than the bill line amount
+        bill_line = self.bill.invoice_line_ids
+        self.env['construction.boq.consumption'].create({
+            'boq_line_id': self.line.id,
+            'source_model': 'account.move.line',
+            'source_id': bill_line.id,
+            'quantity': 0.0,
+            'amount': 5.0,
+        })
+        issues = self._get_issues()
+        self.assertEqual(issues.mapped('issue_type'), ['amount_mismatch'])
+        self.assertEqual(issues.source_id, bill_line.id)
+        self.assertAlmostEqual(issues.stored_amount, 45.0)
+        self.assertAlmostEqual(issues.expected_amount, 40.0)
+
+    def test_stored_totals_repaired(self):
+        self.env.cr.execute("""
+            UPDATE construction_boq_line SET consumed_amount = 0, remaining_amount = 0 WHERE id = %s
+        """, (self.line.id,))
+        self.env.invalidate_all()
+        issues = self._get_issues()
+        self.assertEqual(issues.mapped('issue_type'), ['stored_total'])
+        self.assertAlmostEqual(issues.expected_amount, 40.0)
+
+        issues._repair_stored_totals()
+        self.assertEqual(issues.state, 'repaired')
+        self.assertAlmostEqual(self.line.consumed_amount, 40.0)
+        self.assertAlmostEqual(self.line.remaining_amount, 60.0)
+        self.assertFalse(self._get_issues())
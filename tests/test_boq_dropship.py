@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+from odoo import Command
+from odoo.tests.common import TransactionCase
+
+
+class TestBOQDropship(TransactionCase):
+    """
+    Verify that goods bought on a BOQ line and delivered by the supplier
+    straight to a customer or production location (dropship, direct to
+    site) are consumed once, by the vendor bill, not again by the move.
+    """
+
+    def setUp(self):
+        super(TestBOQDropship, self).setUp()
+        self.project = self.env['project.project'].create({'name': 'Dropship Project'})
+        self.boq = self.env['construction.boq'].create({
+            'name': 'Dropship BOQ',
+            'project_id': self.project.id,
+            'analytic_account_id': self.env['account.analytic.account'].search([], limit=1).id,
+        })
+        self.unit = self.env.ref('uom.product_uom_unit')
+        self.product = self.env['product.product'].create({'name': 'Dropship Product', 'standard_price': 10})
+        self.line = self.env['construction.boq.line'].create({
+            'boq_id': self.boq.id,
+            'name': 'Dropship line',
+            'product_id': self.product.id,
+            'quantity': 10,
+            'estimated_rate': 10,
+            'uom_id': self.unit.id,
+            'expense_account_id': self.env['account.account'].search([], limit=1).id,
+        })
+        self.boq.action_approve()
+        self.partner = self.env['res.partner'].create({'name': 'Dropship Vendor'})
+        self.order = self.env['purchase.order'].create({
+            'partner_id': self.partner.id,
+            'purchase_type': 'boq',
+            'project_id': self.project.id,
+            'boq_id': self.boq.id,
+            'order_line': [Command.create({
+                'product_id': self.product.id,
+                'product_qty': 4,
+                'product_uom': self.unit.id,
+                'price_unit': 10,
+                'boq_line_id': self.line.id,
+            })],
+        })
+        self.purchase_line = self.order.order_line
+        self.supplier_location = self.env.ref('stock.stock_location_suppliers')
+        self.customer_location = self.env.ref('stock.stock_location_customers')
+
+    def _create_move(self, location_dest, **vals):
+        return self.env['stock.move'].create(dict({
+            'name': 'Dropship move',
+            'product_id': self.product.id,
+            'product_uom_qty': 4,
+            'product_uom': self.unit.id,
+            'location_id': self.supplier_location.id,
+            'location_dest_id': location_dest.id,
+            'purchase_line_id': self.purchase_line.id,
+        }, **vals))
+
+    def _get_ledger(self):
+        return self.env['construction.boq.consumption'].search([('boq_line_id', '=', self.line.id)])
+
+    def test_receipt_keeps_purchase_boq_line(self):
+        receipt = self._create_move(self.env.ref('stock.stock_location_stock'))
+        self.assertEqual(receipt.boq_line_id, self.line)
+
+    def test_dropship_move_not_linked(self):
+        dropship = self._create_move(self.customer_location)
+        self.assertFalse(dropship.boq_line_id, "The vendor bill records this consumption")
+
+    def test_dropship_consumed_once_by_bill(self):
+        # Even when linked by hand, the delivery itself records nothing
+        dropship = self._create_move(self.customer_location, boq_line_id=self.line.id)
+        dropship._action_confirm()
+        dropship.quantity = 4
+        dropship.picked = True
+        dropship._action_done()
+        self.assertEqual(dropship.state, 'done')
+        self.assertFalse(self._get_ledger())
+
+        bill = self.env['account.move'].create({
+            'move_type': 'in_invoice',
+            'partner_id': self.partner.id,
+            'invoice_date': '2024-01-10',
+            'invoice_line_ids': [Command.create({
+                'product_id': self.product.id,
+                'quantity': 4,
+                'price_unit': 10,
+                'purchase_line_id': self.purchase_line.id,
+                'tax_ids': [Command.clear()],
+            })],
+        })
+        self.assertEqual(bill.invoice_line_ids.boq_line_id, self.line)
+        bill.action_post()
+
+        ledger = self._get_ledger()
+        self.assertEqual(ledger.mapped('source_model'), ['account.move.line'])
+        self.assertEqual(self.line.consumed_quantity, 4.0)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from odoo.tests.common import TransactionCase
+
+
+class TestBOQEVM(TransactionCase):
+    """
+    Verify the vectorised earned value metrics against a hand-worked BOQ,
+    including the zero-division guards of CPI, SPI and EAC.
+
+    Period 2024-01-16, BOQ approved on 2024-01-01:
+      material     BAC 1000, task due 2024-01-31 (PV 50%), 40/100 done, AC 500
+      labor        BAC 1000, unscheduled (PV = EV), 5/10 done, AC 600
+      service      BAC 0, AC 100
+      subcontract  BAC 500, nothing done
+    """
+
+    def setUp(self):
+        super(TestBOQEVM, self).setUp()
+        self.project = self.env['project.project'].create({'name': 'EVM Project'})
+        self.task = self.env['project.task'].create({
+            'name': 'Foundations',
+            'project_id': self.project.id,
+            'date_deadline': '2024-01-31 12:00:00',
+        })
+        self.boq = self.env['construction.boq'].create({
+            'name': 'EVM BOQ',
+            'project_id': self.project.id,
+            'analytic_account_id': self.env['account.analytic.account'].search([], limit=1).id,
+        })
+        product = self.env['product.product'].create({'name': 'EVM Product', 'standard_price': 10})
+        line_vals = {
+            'boq_id': self.boq.id,
+            'product_id': product.id,
+            'uom_id': self.env.ref('uom.product_uom_unit').id,
+            'expense_account_id': self.env['account.account'].search([], limit=1).id,
+        }
+        Line = self.env['construction.boq.line']
+        self.material = Line.create(dict(line_vals, name='Concrete', cost_type='material', quantity=100, estimated_rate=10, task_id=self.task.id))
+        self.labor = Line.create(dict(line_vals, name='Crew', cost_type='labor', quantity=10, estimated_rate=100))
+        self.service = Line.create(dict(line_vals, name='Survey', cost_type='service', quantity=1, estimated_rate=0))
+        self.subcontract = Line.create(dict(line_vals, name='Scaffolding', cost_type='subcontract', quantity=10, estimated_rate=50))
+        self.boq.action_approve()
+        self.boq.write({'approval_date': '2024-01-01'})
+
+        consumptions = [
+            (self.material, 40, 500, '2024-01-10'),
+            (self.material, 10, 100, '2024-02-10'),  # after the period
+            (self.labor, 5, 600, '2024-01-12'),
+            (self.service, 0, 100, '2024-01-05'),
+        ]
+        self.env['construction.boq.consumption'].with_context(boq_record_actuals=True).create([{
+            'boq_line_id': line.id,
+            'quantity': quantity,
+            'amount': amount,
+            'date': consumed_on,
+            'source_model': 'stock.move',
+            'source_id': index,
+        } for index, (line, quantity, amount, consumed_on) in enumerate(consumptions, 1)])
+        self.env.flush_all()
+
+        vals_list = self.env['construction.boq.evm']._compute_metrics(date(2024, 1, 16), [self.boq.id])
+        self.metrics = {(vals['level'], vals.get('cost_type')): vals for vals in vals_list}
+
+    def assertMetrics(self, vals, **expected):
+        for name, value in expected.items():
+            self.assertAlmostEqual(vals[name], value, places=2, msg=name)
+
+    def test_boq_totals(self):
+        self.assertMetrics(
+            self.metrics['boq', None],
+            budget_at_completion=2500.0,
+            planned_value=1000.0,
+            earned_value=900.0,
+            actual_cost=1200.0,
+            cost_variance=-300.0,
+            schedule_variance=-100.0,
+            cpi=0.75,
+            spi=0.9,
+            estimate_at_completion=2500.0 / 0.75,
+            estimate_to_complete=2500.0 / 0.75 - 1200.0,
+        )
+        self.assertMetrics(self.metrics['project', None], earned_value=900.0, actual_cost=1200.0, cpi=0.75)
+
+    def test_scheduled_line(self):
+        self.assertMetrics(
+            self.metrics['cost_type', 'material'],
+            planned_value=500.0,
+            earned_value=400.0,
+            actual_cost=500.0,
+            cpi=0.8,
+            spi=0.8,
+            estimate_at_completion=1250.0,
+        )
+
+    def test_unscheduled_line_on_schedule(self):
+        self.assertMetrics(self.metrics['cost_type', 'labor'], planned_value=500.0, earned_value=500.0, spi=1.0, cpi=500.0 / 600.0)
+
+    def test_zero_division_guards(self):
+        # No actual cost nor planned value: indices are 0 and the budget stays the estimate
+        self.assertMetrics(
+            self.metrics['cost_type', 'subcontract'],
+            actual_cost=0.0,
+            cpi=0.0,
+            spi=0.0,
+            estimate_at_completion=500.0,
+            estimate_to_complete=500.0,
+        )
+        # Cost without budget: no earned value, CPI 0, nothing left to estimate
+        self.assertMetrics(
+            self.metrics['cost_type', 'service'],
+            budget_at_completion=0.0,
+            earned_value=0.0,
+            actual_cost=100.0,
+            cpi=0.0,
+            estimate_at_completion=0.0,
+            estimate_to_complete=-100.0,
+        )
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase
+
+
+class TestBOQLineResolver(TransactionCase):
+    """
+    Verify the batch resolution of (project, activity code, product) keys
+    to BOQ lines used to auto-link bill lines and stock moves.
+    """
+
+    def setUp(self):
+        super(TestBOQLineResolver, self).setUp()
+        self.project = self.env['project.project'].create({'name': 'Resolver Project'})
+        self.boq = self.env['construction.boq'].create({
+            'name': 'Resolver BOQ',
+            'project_id': self.project.id,
+            'analytic_account_id': self.env['account.analytic.account'].search([], limit=1).id,
+        })
+        self.cement = self.env['product.product'].create({'name': 'Cement', 'standard_price': 10})
+        self.steel = self.env['product.product'].create({'name': 'Steel', 'standard_price': 50})
+        uom = self.env.ref('uom.product_uom_unit')
+        account = self.env['account.account'].search([], limit=1)
+
+        self.Line = self.env['construction.boq.line']
+        line_vals = {
+            'boq_id': self.boq.id,
+            'quantity': 10,
+            'estimated_rate': 10,
+            'uom_id': uom.id,
+            'expense_account_id': account.id,
+        }
+        self.foundation_cement = self.Line.create(dict(line_vals, name='Foundation cement', product_id=self.cement.id, activity_code='FND-01'))
+        self.slab_cement = self.Line.create(dict(line_vals, name='Slab cement', product_id=self.cement.id, activity_code='SLB-01'))
+        self.slab_steel = self.Line.create(dict(line_vals, name='Slab steel', product_id=self.steel.id, activity_code='SLB-01'))
+        self.boq.write({'state': 'approved'})
+
+    def test_resolve_by_code_and_product(self):
+        resolved = self.Line._resolve_boq_lines([
+            (self.project.id, 'fnd-01', self.cement.id),
+            (self.project.id, 'SLB-01', self.steel.id),
+        ])
+        self.assertEqual(resolved, [self.foundation_cement.id, self.slab_steel.id])
+
+    def test_resolve_by_product_only(self):
+        resolved = self.Line._resolve_boq_lines([
+            (self.project.id, False, self.steel.id),
+            (self.project.id, False, self.cement.id),
+        ])
+        self.assertEqual(resolved, [self.slab_steel.id, False], "Cement is budgeted twice and must stay ambiguous")
+
+    def test_require_product(self):
+        resolved = self.Line._resolve_boq_lines([
+            (self.project.id, 'FND-01', self.steel.id),
+        ], require_product=True)
+        self.assertEqual(resolved, [False])
+
+    def test_draft_boq_not_resolved(self):
+        self.boq.action_revise()
+        resolved = self.Line._resolve_boq_lines([
+            (self.project.id, 'FND-01', self.cement.id),
+        ])
+        self.assertEqual(resolved, [False])
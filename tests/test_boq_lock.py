@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from psycopg2.errors import LockNotAvailable
+
+from odoo.exceptions import UserError
+from odoo.tests.common import TransactionCase
+
+
+class TestBOQLock(TransactionCase):
+    """
+    Verify the ordered locking of BOQ lines before consumption, the fallback
+    after a NOWAIT failure with lock_timeout and retries, and the contention
+    counters. Test cursors share one transaction, so contention is simulated
+    by failing the lock queries.
+    """
+
+    def setUp(self):
+        super(TestBOQLock, self).setUp()
+        project = self.env['project.project'].create({'name': 'Lock Project'})
+        boq = self.env['construction.boq'].create({
+            'name': 'Lock BOQ',
+            'project_id': project.id,
+            'analytic_account_id': self.env['account.analytic.account'].search([], limit=1).id,
+        })
+        product = self.env['product.product'].create({'name': 'Lock Product', 'standard_price': 10})
+        self.lines = self.env['construction.boq.line'].create([{
+            'boq_id': boq.id,
+            'name': 'Lock line %s' % index,
+            'product_id': product.id,
+            'quantity': 10,
+            'estimated_rate': 10,
+            'uom_id': self.env.ref('uom.product_uom_unit').id,
+            'expense_account_id': self.env['account.account'].search([], limit=1).id,
+        } for index in range(3)])
+        self.Stat = self.env['construction.boq.lock.stat']
+        # Counters are written through a separate cursor: route it to the test transaction
+        if self.registry.test_cr is None:
+            self.registry.enter_test_mode(self.cr)
+            self.addCleanup(self.registry.leave_test_mode)
+        self.locked_ids = []
+        self.sleep = patch('odoo.addons.entrpryz_construction_boq.models.boq_lock.time.sleep')
+        self.sleep.start()
+        self.addCleanup(self.sleep.stop)
+
+    def _contend(self, nowait=True, timeouts=0):
+        """Fail the NOWAIT batch lock, then the first ``timeouts`` line locks."""
+        cr = self.env.cr
+        execute = cr.execute
+        remaining = [timeouts]
+
+        def contended_execute(query, params=None, *args, **kwargs):
+            if 'FOR NO KEY UPDATE NOWAIT' in str(query) and nowait:
+                raise LockNotAvailable()
+            if 'FOR NO KEY UPDATE' in str(query):
+                if remaining[0]:
+                    remaining[0] -= 1
+                    raise LockNotAvailable()
+                self.locked_ids.append(params[0])
+            return execute(query, params, *args, **kwargs)
+
+        return patch.object(cr, 'execute', contended_execute)
+
+    def _get_stat(self, line):
+        return self.Stat.search([('boq_line_id', '=', line.id)])
+
+    def test_uncontended(self):
+        self.assertEqual(self.lines._lock_for_consumption(), 0.0)
+        self.assertFalse(self.Stat.search([('boq_line_id', 'in', self.lines.ids)]))
+
+    def test_fallback_locks_in_id_order(self):
+        self.env.cr.execute("SELECT current_setting('lock_timeout')")
+        timeout = self.env.cr.fetchone()[0]
+        with self._contend():
+            wait = self.lines[::-1]._lock_for_consumption()
+        self.assertGreaterEqual(wait, 0.0)
+        self.assertEqual(self.locked_ids, sorted(self.lines.ids))
+        self.env.cr.execute("SELECT current_setting('lock_timeout')")
+        self.assertEqual(self.env.cr.fetchone()[0], timeout, "lock_timeout must be restored")
+
+    def test_timeout_retried(self):
+        with self._contend(timeouts=1):
+            self.lines._lock_for_consumption()
+        self.assertEqual(self.locked_ids, sorted(self.lines.ids), "The whole batch is locked again after a timeout")
+        first = self._get_stat(self.lines.sorted('id')[0])
+        self.assertEqual(first.timeout_count, 1)
+        self.assertEqual(first.contention_count, 1)
+
+    def test_retries_exhausted(self):
+        self.env['ir.config_parameter'].sudo().set_param('construction_boq.lock_retries', 1)
+        with self._contend(timeouts=2), self.assertRaises(UserError):
+            self.lines._lock_for_consumption()
+        self.assertEqual(self._get_stat(self.lines.sorted('id')[0]).timeout_count, 2)
+
+    def test_contention_accumulates(self):
+        line = self.lines[0]
+        self.Stat._record_contention({line.id: 0.010}, {line.id: 0})
+        self.Stat._record_contention({line.id: 0.030}, {line.id: 1})
+        self.Stat._record_contention({line.id: 0.0}, {line.id: 0})
+        stat = self._get_stat(line)
+        self.assertEqual(stat.contention_count, 2, "Lines without wait nor timeout are not counted")
+        self.assertEqual(stat.timeout_count, 1)
+        self.assertAlmostEqual(stat.total_wait_ms, 40.0)
+        self.assertAlmostEqual(stat.max_wait_ms, 30.0)
+
+    def test_only_slow_line_counted(self):
+        # Line locks of 0.1 ms, 0.1 ms and 50 ms: only the one that blocked is contention
+        clock = patch(
+            'odoo.addons.entrpryz_construction_boq.models.boq_lock.time.perf_counter',
+            side_effect=[0.0, 0.0001, 1.0, 1.0001, 2.0, 2.05],
+        )
+        with self._contend(), clock:
+            wait = self.lines._lock_for_consumption()
+        self.assertAlmostEqual(wait, 0.0502)
+        stats = self.Stat.search([('boq_line_id', 'in', self.lines.ids)])
+        slow_line = self.lines.sorted('id')[2]
+        self.assertEqual(stats.boq_line_id, slow_line)
+        self.assertEqual(stats.contention_count, 1)
+        self.assertAlmostEqual(stats.max_wait_ms, 50.0)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from odoo import Command
+from odoo.exceptions import ValidationError
+from odoo.tests.common import TransactionCase
+
+
+class TestBOQQueue(TransactionCase):
+    """
+    Verify the deferred consumption mode: bills reserve budget in the queue,
+    the cron moves reservations into the ledger, and pending reservations
+    count as consumed when posting bills and validating stock moves.
+    """
+
+    def setUp(self):
+        super(TestBOQQueue, self).setUp()
+        project = self.env['project.project'].create({'name': 'Queue Project'})
+        self.boq = self.env['construction.boq'].create({
+            'name': 'Queue BOQ',
+            'project_id': project.id,
+            'analytic_account_id': self.env['account.analytic.account'].search([], limit=1).id,
+        })
+        self.unit = self.env.ref('uom.product_uom_unit')
+        self.product = self.env['product.product'].create({'name': 'Queue Product', 'standard_price': 10})
+        line_vals = {
+            'boq_id': self.boq.id,
+            'product_id': self.product.id,
+            'quantity': 10,
+            'estimated_rate': 10,
+            'uom_id': self.unit.id,
+            'expense_account_id': self.env['account.account'].search([], limit=1).id,
+        }
+        self.line = self.env['construction.boq.line'].create(dict(line_vals, name='Queue line'))
+        self.other_line = self.env['construction.boq.line'].create(dict(line_vals, name='Other queue line'))
+        self.boq.action_approve()
+        self.partner = self.env['res.partner'].create({'name': 'Queue Vendor'})
+        self.Queue = self.env['construction.boq.consumption.queue']
+        self.ICP = self.env['ir.config_parameter'].sudo()
+
+    def _set_deferred(self):
+        self.ICP.set_param('construction_boq.consumption_mode', 'deferred')
+
+    def _reserve(self, line, quantity, source_id=1):
+        return self.Queue.create({
+            'boq_line_id': line.id,
+            'source_model': 'account.move.line',
+            'source_id': source_id,
+            'quantity': quantity,
+            'amount': quantity * 10,
+            'date': '2024-01-10',
+        })
+
+    def _create_bill(self, *quantities):
+        return self.env['account.move'].create({
+            'move_type': 'in_invoice',
+            'partner_id': self.partner.id,
+            'invoice_date': '2024-01-10',
+            'invoice_line_ids': [Command.create({
+                'product_id': self.product.id,
+                'quantity': quantity,
+                'price_unit': 10,
+                'boq_line_id': self.line.id,
+                'tax_ids': [Command.clear()],
+            }) for quantity in quantities],
+        })
+
+    def _get_ledger(self, line):
+        return self.env['construction.boq.consumption'].search([('boq_line_id', '=', line.id)])
+
+    def test_deferred_bill_reserves_then_cron_posts(self):
+        self._set_deferred()
+        bill = self._create_bill(4)
+        bill.action_post()
+
+        reservations = self.Queue.search([('boq_line_id', '=', self.line.id)])
+        self.assertEqual(reservations.mapped('quantity'), [4.0])
+        self.assertFalse(self._get_ledger(self.line), "Deferred bills do not write the ledger")
+        self.assertEqual(self.Queue._get_pending(self.line.ids), {self.line.id: (4.0, 40.0)})
+
+        self.Queue._cron_process_queue()
+        self.assertFalse(self.Queue.search([('boq_line_id', '=', self.line.id)]))
+        self.assertEqual(self._get_ledger(self.line).mapped('quantity'), [4.0])
+        self.assertEqual(self.line.remaining_quantity, 6.0)
+
+    def test_deferred_bill_lines_reserve_as_they_go(self):
+        self._set_deferred()
+        bill = self._create_bill(6, 6)
+        with self.assertRaises(ValidationError):
+            bill.action_post()
+
+    def test_pending_counted_when_posting_bill(self):
+        self._reserve(self.line, 8)
+        bill = self._create_bill(5)
+        with self.assertRaises(ValidationError):
+            bill.action_post()
+
+    def test_pending_counted_when_issuing_stock(self):
+        self._reserve(self.line, 8)
+        move = self.env['stock.move'].create({
+            'name': 'Queue issue',
+            'product_id': self.product.id,
+            'product_uom_qty': 5,
+            'product_uom': self.unit.id,
+            'location_id': self.env.ref('stock.stock_location_stock').id,
+            'location_dest_id': self.env.ref('stock.stock_location_customers').id,
+            'boq_line_id': self.line.id,
+        })
+        move._action_confirm()
+        move.quantity = 5
+        move.picked = True
+        with self.assertRaises(ValidationError):
+            move._action_done()
+
+    def test_failed_line_does_not_block_queue(self):
+        self._reserve(self.line, 4, source_id=1)
+        # Over the budget of the other line: its rows fail, the first line still posts
+        self._reserve(self.other_line, 20, source_id=2)
+        self.Queue._cron_process_queue()
+
+        self.assertEqual(self._get_ledger(self.line).mapped('quantity'), [4.0])
+        self.assertFalse(self._get_ledger(self.other_line))
+        failed = self.Queue.search([('boq_line_id', '=', self.other_line.id)])
+        self.assertEqual(failed.state, 'failed')
+        self.assertTrue(failed.error)
+        self.assertEqual(self.Queue._get_pending(self.other_line.ids), {}, "Failed rows no longer reserve budget")
+
+        failed.action_retry()
+        self.assertEqual(failed.state, 'pending')
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.entrpryz_construction_boq.models.boq_recompute import LINE_TOTAL_FIELDS
+
+
+class TestBOQRecompute(TransactionCase):
+    """
+    Verify that the chunked set-based recompute gives the same stored totals
+    as the ORM computes, rounding included, and only rewrites what differs.
+    """
+
+    def setUp(self):
+        super(TestBOQRecompute, self).setUp()
+        project = self.env['project.project'].create({'name': 'Recompute Project'})
+        self.boq = self.env['construction.boq'].create({
+            'name': 'Recompute BOQ',
+            'project_id': project.id,
+            'analytic_account_id': self.env['account.analytic.account'].search([], limit=1).id,
+        })
+        product = self.env['product.product'].create({'name': 'Recompute Product', 'standard_price': 10})
+        line_vals = {
+            'boq_id': self.boq.id,
+            'product_id': product.id,
+            'uom_id': self.env.ref('uom.product_uom_unit').id,
+            'expense_account_id': self.env['account.account'].search([], limit=1).id,
+        }
+        Line = self.env['construction.boq.line']
+        self.lines = Line.create([
+            {'boq_id': self.boq.id, 'name': 'Structure', 'display_type': 'line_section'},
+            dict(line_vals, name='Concrete', quantity=3, estimated_rate=3.333),
+            dict(line_vals, name='Rebar', quantity=12.5, estimated_rate=7.77),
+            dict(line_vals, name='Formwork', quantity=40, estimated_rate=25, allow_over_consumption=True),
+            dict(line_vals, name='Unused', quantity=1, estimated_rate=1),
+        ])
+        self.env['construction.boq.consumption'].create([{
+            'boq_line_id': line.id,
+            'quantity': quantity,
+            'amount': amount,
+            'source_model': 'stock.move',
+            'source_id': index,
+        } for index, (line, quantity, amount) in enumerate([
+            (self.lines[1], 1.5, 4.995),
+            (self.lines[2], 2.25, 17.48),
+            (self.lines[2], 0.75, 5.83),
+            (self.lines[3], 50, 1300.0),  # over budget
+        ], 1)])
+        self.env.flush_all()
+        self.expected = self._read_totals()
+
+    def _read_totals(self):
+        self.env.invalidate_all()
+        totals = {line.id: tuple(line[field] for field in LINE_TOTAL_FIELDS) for line in self.lines}
+        totals['boq'] = self.boq.total_budget
+        return totals
+
+    def _corrupt_totals(self):
+        self.env.cr.execute("""
+            UPDATE construction_boq_line
+            SET budget_amount = -1, consumed_quantity = -1, consumed_amount = -1,
+                remaining_quantity = -1, remaining_amount = -1
+            WHERE id IN %s
+        """, (tuple(self.lines.ids),))
+        self.env.cr.execute("UPDATE construction_boq SET total_budget = -1 WHERE id = %s", (self.boq.id,))
+        self.env.invalidate_all()
+
+    def test_chunked_recompute_matches_orm(self):
+        self._corrupt_totals()
+        Chunk = self.env['construction.boq.recompute.chunk']
+        chunks = Chunk._prepare_run('test_parity', chunk_size=2)
+        self.assertTrue(chunks)
+        for phase in ('line', 'boq'):
+            while True:
+                chunk = Chunk._claim('test_parity', phase)
+                if not chunk:
+                    break
+                self.assertTrue(chunk._run())
+        self.assertEqual(set(chunks.mapped('state')), {'done'})
+
+        actual = self._read_totals()
+        for key, expected in self.expected.items():
+            if key == 'boq':
+                self.assertAlmostEqual(actual[key], expected, places=2)
+                continue
+            for field, actual_value, expected_value in zip(LINE_TOTAL_FIELDS, actual[key], expected):
+                self.assertAlmostEqual(actual_value, expected_value, places=4, msg=field)
+
+    def test_recompute_only_touches_differences(self):
+        Line = self.env['construction.boq.line']
+        self.assertFalse(Line._recompute_stored_totals(ids=self.lines.ids), "Totals already match the ledger")
+        self.assertFalse(self.env['construction.boq']._recompute_total_budget(ids=self.boq.ids))
+
+        self.env.cr.execute("UPDATE construction_boq_line SET consumed_amount = 0 WHERE id = %s", (self.lines[2].id,))
+        self.env.invalidate_all()
+        self.assertEqual(Line._recompute_stored_totals(ids=self.lines.ids), self.lines[2])
+        self.assertAlmostEqual(self.lines[2].consumed_amount, self.expected[self.lines[2].id][2], places=2)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase
+
+
+class TestBOQTimesheet(TransactionCase):
+    """
+    Verify the timesheet ingestion: entries are recorded in the ledger once,
+    aggregated per BOQ line and day, and entries that cannot be recorded are
+    marked failed without blocking the others, then recorded on retry.
+    """
+
+    def setUp(self):
+        super(TestBOQTimesheet, self).setUp()
+        project = self.env['project.project'].create({'name': 'Timesheet Project'})
+        self.analytic_account = self.env['account.analytic.account'].search([], limit=1)
+        boq = self.env['construction.boq'].create({
+            'name': 'Timesheet BOQ',
+            'project_id': project.id,
+            'analytic_account_id': self.analytic_account.id,
+        })
+        self.hour = self.env.ref('uom.product_uom_hour')
+        self.unit = self.env.ref('uom.product_uom_unit')
+        product = self.env['product.product'].create({'name': 'Timesheet Labour', 'type': 'service', 'standard_price': 20})
+        line_vals = {
+            'boq_id': boq.id,
+            'product_id': product.id,
+            'cost_type': 'labor',
+            'quantity': 100,
+            'estimated_rate': 20,
+            'uom_id': self.hour.id,
+            'expense_account_id': self.env['account.account'].search([], limit=1).id,
+        }
+        self.line = self.env['construction.boq.line'].create(dict(line_vals, name='Masons'))
+        self.other_line = self.env['construction.boq.line'].create(dict(line_vals, name='Carpenters'))
+        boq.action_approve()
+        self.AnalyticLine = self.env['account.analytic.line']
+
+    def _log(self, line, date, hours, uom=None):
+        return self.AnalyticLine.create({
+            'name': 'Work on %s' % line.name,
+            'account_id': self.analytic_account.id,
+            'date': date,
+            'unit_amount': hours,
+            'amount': -20 * hours,
+            'product_uom_id': (uom or self.hour).id,
+            'boq_line_id': line.id,
+        })
+
+    def _ingest(self):
+        self.env.flush_all()
+        self.AnalyticLine._cron_ingest_boq_consumption()
+
+    def _get_ledger(self, line):
+        return self.env['construction.boq.consumption'].search([
+            ('boq_line_id', '=', line.id),
+            ('source_model', '=', 'account.analytic.line'),
+        ], order='date, id')
+
+    def test_aggregated_per_line_and_day(self):
+        entries = (
+            self._log(self.line, '2024-01-10', 3)
+            | self._log(self.line, '2024-01-10', 5)
+            | self._log(self.line, '2024-01-11', 2)
+            | self._log(self.other_line, '2024-01-10', 4)
+        )
+        self._ingest()
+
+        ledger = self._get_ledger(self.line)
+        self.assertEqual(ledger.mapped('quantity'), [8.0, 2.0])
+        self.assertEqual(ledger.mapped('amount'), [160.0, 40.0])
+        self.assertEqual(ledger[0].source_id, entries[1].id, "source_id is the last entry of the aggregate")
+        self.assertEqual(self._get_ledger(self.other_line).mapped('quantity'), [4.0])
+        self.assertEqual(set(entries.mapped('boq_ingest_state')), {'done'})
+
+    def test_rerun_does_not_double_count(self):
+        self._log(self.line, '2024-01-10', 3)
+        self._ingest()
+        self._ingest()
+        self.assertEqual(self._get_ledger(self.line).mapped('quantity'), [3.0])
+
+        late = self._log(self.line, '2024-01-10', 1)
+        self._ingest()
+        self.assertEqual(self._get_ledger(self.line).mapped('quantity'), [3.0, 1.0], "Only the new entry is recorded")
+        self.assertEqual(late.boq_ingest_state, 'done')
+        self.assertEqual(self.line.consumed_quantity, 4.0)
+
+    def test_failed_line_retried_without_blocking(self):
+        # Units are not convertible to the hours of the line: these entries fail
+        failing = self._log(self.other_line, '2024-01-10', 4, uom=self.unit)
+        recorded = self._log(self.line, '2024-01-10', 3)
+        self._ingest()
+
+        self.assertEqual(recorded.boq_ingest_state, 'done')
+        self.assertEqual(self._get_ledger(self.line).mapped('quantity'), [3.0])
+        self.assertEqual(failing.boq_ingest_state, 'failed')
+        self.assertTrue(failing.boq_ingest_error)
+        self.assertFalse(self._get_ledger(self.other_line))
+
+        self._ingest()
+        self.assertEqual(failing.boq_ingest_state, 'failed', "Failed entries wait for a retry")
+
+        failing.product_uom_id = self.hour
+        failing.action_retry_boq_ingestion()
+        self.assertFalse(failing.boq_ingest_state)
+        self._ingest()
+        self.assertEqual(failing.boq_ingest_state, 'done')
+        self.assertEqual(self._get_ledger(self.other_line).mapped('quantity'), [4.0])
+        self.assertEqual(self._get_ledger(self.line).mapped('quantity'), [3.0], "Recorded entries are not replayed")
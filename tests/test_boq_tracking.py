@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase
+
+
+class TestBOQTracking(TransactionCase):
+    """
+    Verify the throttled tracking mode: changes are buffered instead of
+    posted, merged per field from the first old value to the last new one
+    (fields back to their initial value are dropped), and flushed as one
+    message per BOQ once its edit session is over.
+    """
+
+    def setUp(self):
+        super(TestBOQTracking, self).setUp()
+        self.project = self.env['project.project'].create({'name': 'Tracking Project'})
+        analytic_account = self.env['account.analytic.account'].search([], limit=1)
+        self.boq = self.env['construction.boq'].create({
+            'name': 'Tracking BOQ',
+            'project_id': self.project.id,
+            'analytic_account_id': analytic_account.id,
+        })
+        self.other_boq = self.env['construction.boq'].create({
+            'name': 'Other Tracking BOQ',
+            'project_id': self.project.id,
+            'analytic_account_id': analytic_account.id,
+        })
+        self.env['ir.config_parameter'].sudo().set_param('construction_boq.tracking_mode', 'throttled')
+        self.Buffer = self.env['construction.boq.tracking.buffer']
+        self.name_field = self.env['ir.model.fields']._get('construction.boq', 'name')
+        self.project_field = self.env['ir.model.fields']._get('construction.boq', 'project_id')
+        self.other_project = self.env['project.project'].create({'name': 'Other Tracking Project'})
+        self.third_project = self.env['project.project'].create({'name': 'Third Tracking Project'})
+
+    def _flush_tracking(self):
+        self.env.flush_all()
+        self.env.cr.precommit.run()
+
+    def _get_rows(self, boq):
+        return self.Buffer.search([('boq_id', '=', boq.id)])
+
+    def _name_values(self, old, new):
+        return {'field_id': self.name_field.id, 'old_value_char': old, 'new_value_char': new}
+
+    def _project_values(self, old, new):
+        return {
+            'field_id': self.project_field.id,
+            'old_value_integer': old.id, 'new_value_integer': new.id,
+            'old_value_char': old.display_name, 'new_value_char': new.display_name,
+        }
+
+    def test_write_is_buffered(self):
+        self._flush_tracking()
+        message_count = len(self.boq.message_ids)
+        self.boq.write({'name': 'Tracking BOQ v2'})
+        self._flush_tracking()
+        self.boq.write({'name': 'Tracking BOQ v3'})
+        self._flush_tracking()
+
+        rows = self._get_rows(self.boq)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows.field_id, self.name_field)
+        self.boq.invalidate_recordset(['message_ids'])
+        self.assertEqual(len(self.boq.message_ids), message_count, "Nothing is posted until the summary")
+
+    def test_merge_keeps_first_old_and_last_new(self):
+        self.Buffer._buffer(tracking_by_boq={self.boq.id: [
+            self._name_values('A', 'B'),
+            self._project_values(self.project, self.other_project),
+            self._name_values('B', 'C'),
+            self._project_values(self.other_project, self.third_project),
+        ]})
+        commands = self.Buffer._merge_tracking_values(self._get_rows(self.boq))
+        merged = {values['field_id']: values for _command, _id, values in commands}
+        self.assertEqual(len(commands), 2)
+        self.assertEqual((merged[self.name_field.id]['old_value_char'], merged[self.name_field.id]['new_value_char']), ('A', 'C'))
+        project_values = merged[self.project_field.id]
+        self.assertEqual((project_values['old_value_integer'], project_values['new_value_integer']), (self.project.id, self.third_project.id))
+
+    def test_merge_drops_field_back_to_initial_value(self):
+        self.Buffer._buffer(tracking_by_boq={self.boq.id: [
+            self._name_values('A', 'B'),
+            self._project_values(self.project, self.other_project),
+            self._name_values('B', 'A'),
+        ]})
+        commands = self.Buffer._merge_tracking_values(self._get_rows(self.boq))
+        self.assertEqual([values['field_id'] for _command, _id, values in commands], [self.project_field.id])
+
+    def test_flush_one_message_per_boq(self):
+        self.Buffer._buffer(
+            tracking_by_boq={self.boq.id: [self._name_values('A', 'B'), self._name_values('B', 'C')]},
+            bodies={self.boq.id: 'Archived v1 and upgraded to v2.'},
+        )
+        self.Buffer._buffer(tracking_by_boq={self.boq.id: [self._project_values(self.project, self.other_project)]})
+        self.Buffer._buffer(tracking_by_boq={self.other_boq.id: [self._name_values('X', 'Y')]})
+        messages_before = self.boq.message_ids
+
+        # Only the BOQ whose last change is older than the window is summarised
+        self.env.cr.execute("""
+            UPDATE construction_boq_tracking_buffer
+            SET create_date = create_date - INTERVAL '1 hour'
+            WHERE boq_id = %s
+        """, (self.boq.id,))
+        self.Buffer.invalidate_model(['create_date'])
+        self.Buffer._cron_flush()
+
+        self.assertFalse(self._get_rows(self.boq))
+        self.assertEqual(len(self._get_rows(self.other_boq)), 1)
+        self.boq.invalidate_recordset(['message_ids'])
+        message = self.boq.message_ids - messages_before
+        self.assertEqual(len(message), 1)
+        self.assertIn('Archived v1', message.body)
+        self.assertEqual(
+            sorted(message.tracking_value_ids.mapped('field_id.name')),
+            ['name', 'project_id'],
+        )
+        name_value = message.tracking_value_ids.filtered(lambda v: v.field_id == self.name_field)
+        self.assertEqual((name_value.old_value_char, name_value.new_value_char), ('A', 'C'))
+
+    def test_flush_skips_session_without_net_change(self):
+        self.Buffer._buffer(tracking_by_boq={self.boq.id: [self._name_values('A', 'B'), self._name_values('B', 'A')]})
+        messages_before = self.boq.message_ids
+        self.Buffer._flush(self.boq.ids)
+        self.assertFalse(self._get_rows(self.boq))
+        self.boq.invalidate_recordset(['message_ids'])
+        self.assertEqual(self.boq.message_ids, messages_before)
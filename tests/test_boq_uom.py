@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+from odoo.exceptions import ValidationError
+from odoo.tests.common import TransactionCase
+
+
+class TestBOQUomConversion(TransactionCase):
+    """
+    Verify the batch unit conversion used to record consumption in the unit
+    of the BOQ line: same results as uom.uom._compute_quantity (half-up
+    rounding to the target unit), and units of another category refused.
+    """
+
+    def setUp(self):
+        super(TestBOQUomConversion, self).setUp()
+        self.Line = self.env['construction.boq.line']
+        self.unit = self.env.ref('uom.product_uom_unit')
+        self.dozen = self.env.ref('uom.product_uom_dozen')
+        self.kg = self.env.ref('uom.product_uom_kgm')
+        self.gram = self.env.ref('uom.product_uom_gram')
+        self.pack = self.env['uom.uom'].create({
+            'name': 'Pack of 3',
+            'category_id': self.unit.category_id.id,
+            'uom_type': 'bigger',
+            'factor_inv': 3,
+            'rounding': 1.0,
+        })
+
+    def test_matches_uom_conversion(self):
+        pairs = [
+            (self.dozen, self.unit),
+            (self.unit, self.dozen),
+            (self.gram, self.kg),
+            (self.kg, self.gram),
+            (self.unit, self.pack),
+        ]
+        factors = self.Line._get_uom_factors((from_uom.id, to_uom.id) for from_uom, to_uom in pairs)
+        self.assertEqual(set(factors), {(from_uom.id, to_uom.id) for from_uom, to_uom in pairs})
+        for from_uom, to_uom in pairs:
+            for quantity in (0.0, 1.0, 2.5, 7.0, 1234.567, -4.0):
+                self.assertAlmostEqual(
+                    self.Line._convert_quantity(factors, quantity, from_uom.id, to_uom.id),
+                    from_uom._compute_quantity(quantity, to_uom, rounding_method='HALF-UP'),
+                    msg="%s %s to %s" % (quantity, from_uom.name, to_uom.name),
+                )
+
+    def test_rounding_to_target_unit(self):
+        factors = self.Line._get_uom_factors([(self.unit.id, self.pack.id)])
+        # Packs are rounded to 1: 7 units = 2.33 packs, 7.5 units = 2.5 packs, 8 units = 2.67 packs
+        self.assertEqual(self.Line._convert_quantity(factors, 7.0, self.unit.id, self.pack.id), 2.0)
+        self.assertEqual(self.Line._convert_quantity(factors, 7.5, self.unit.id, self.pack.id), 3.0)
+        self.assertEqual(self.Line._convert_quantity(factors, 8.0, self.unit.id, self.pack.id), 3.0)
+
+    def test_same_or_missing_unit_kept(self):
+        self.assertEqual(self.Line._get_uom_factors([(self.unit.id, self.unit.id), (False, self.unit.id)]), {})
+        self.assertEqual(self.Line._convert_quantity({}, 2.5, self.unit.id, self.unit.id), 2.5)
+        self.assertEqual(self.Line._convert_quantity({}, 2.5, False, self.unit.id), 2.5)
+
+    def test_cross_category_refused(self):
+        with self.assertRaises(ValidationError) as error:
+            self.Line._get_uom_factors([
+                (self.kg.id, self.unit.id),
+                (self.dozen.id, self.unit.id),
+                (self.unit.id, self.gram.id),
+            ])
+        message = str(error.exception)
+        self.assertIn(self.kg.name, message)
+        self.assertIn(self.gram.name, message, "Every mismatching pair of the batch is reported")
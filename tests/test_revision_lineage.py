@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase
+
+
+class TestRevisionLineage(TransactionCase):
+    """
+    Verify that every version of a BOQ shares the same lineage key so the
+    history only shows versions of that BOQ, not every BOQ of the project.
+    """
+
+    def setUp(self):
+        super(TestRevisionLineage, self).setUp()
+        self.project = self.env['project.project'].create({'name': 'Lineage Project'})
+        self.analytic_account = self.env['account.analytic.account'].search([], limit=1)
+        self.boq = self.env['construction.boq'].create({
+            'name': 'Lineage BOQ',
+            'project_id': self.project.id,
+            'analytic_account_id': self.analytic_account.id,
+        })
+        self.env['construction.boq.line'].create({
+            'boq_id': self.boq.id,
+            'name': 'Lineage line',
+            'product_id': self.env['product.product'].create({'name': 'Lineage Product', 'standard_price': 10}).id,
+            'quantity': 10,
+            'estimated_rate': 10,
+            'uom_id': self.env.ref('uom.product_uom_unit').id,
+            'expense_account_id': self.env['account.account'].search([], limit=1).id,
+        })
+        self.boq.action_approve()
+        self.other_boq = self.env['construction.boq'].create({
+            'name': 'Other BOQ',
+            'project_id': self.project.id,
+            'analytic_account_id': self.analytic_account.id,
+        })
+
+    def test_root_is_self_before_revision(self):
+        self.assertEqual(self.boq.root_boq_id, self.boq)
+        self.assertEqual(self.other_boq.root_boq_id, self.other_boq)
+
+    def test_revisions_share_root(self):
+        self.boq.action_revise()
+        self.boq.action_approve()
+        self.boq.action_revise()
+
+        versions = self.env['construction.boq'].with_context(active_test=False).search(
+            self.boq._get_lineage_domain()
+        )
+        self.assertEqual(len(versions), 3, "Live BOQ plus two archived snapshots expected")
+        self.assertEqual(len(versions.mapped('root_boq_id')), 1)
+        self.assertNotIn(self.other_boq, versions)
+
+        self.assertEqual(len(self.boq.display_revision_ids), 2)
+        self.assertFalse(self.other_boq.display_revision_ids)
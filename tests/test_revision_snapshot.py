@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from odoo.tests.common import TransactionCase
+
+
+class TestRevisionSnapshot(TransactionCase):
+    """
+    Verify that the lines copied into archived revision snapshots never show
+    up next to the live lines: pickers, resolution, task rollups and the
+    analytic report only see the current version.
+    """
+
+    def setUp(self):
+        super(TestRevisionSnapshot, self).setUp()
+        self.project = self.env['project.project'].create({'name': 'Snapshot Project'})
+        self.task = self.env['project.task'].create({
+            'name': 'Foundations',
+            'project_id': self.project.id,
+            'activity_code': 'FND-01',
+        })
+        self.analytic_account = self.env['account.analytic.account'].search([], limit=1)
+        self.product = self.env['product.product'].create({'name': 'Snapshot Cement', 'standard_price': 10})
+        self.boq = self.env['construction.boq'].create({
+            'name': 'Snapshot BOQ',
+            'project_id': self.project.id,
+            'analytic_account_id': self.analytic_account.id,
+        })
+        self.Line = self.env['construction.boq.line']
+        self.line = self.Line.create({
+            'boq_id': self.boq.id,
+            'name': 'Foundation cement',
+            'product_id': self.product.id,
+            'task_id': self.task.id,
+            'activity_code': 'FND-01',
+            'quantity': 10,
+            'estimated_rate': 10,
+            'uom_id': self.env.ref('uom.product_uom_unit').id,
+            'expense_account_id': self.env['account.account'].search([], limit=1).id,
+            'analytic_distribution': {str(self.analytic_account.id): 100.0},
+        })
+        self.boq.action_approve()
+        self.boq.action_revise()
+        self.boq.action_approve()
+        self.snapshot_lines = self.Line.search([('root_line_id', '=', self.line.id)])
+
+    def test_snapshot_keeps_lines(self):
+        self.assertEqual(len(self.snapshot_lines), 1)
+        self.assertFalse(self.snapshot_lines.boq_active)
+        self.assertEqual(self.snapshot_lines.task_id, self.task, "Snapshot lines keep the task of the version")
+
+    def test_duplicate_does_not_copy_lines(self):
+        duplicate = self.boq.copy()
+        self.assertFalse(duplicate.boq_line_ids)
+
+    def test_snapshot_lines_not_selectable(self):
+        selectable = self.Line.search(self.Line._get_selectable_domain() + [('product_id', '=', self.product.id)])
+        self.assertEqual(selectable, self.line)
+        names = self.Line.name_search('Foundation', args=[('boq_id.state', 'in', ('approved', 'locked'))])
+        self.assertEqual([line_id for line_id, name in names], [self.line.id])
+
+    def test_snapshot_lines_not_resolved(self):
+        resolved = self.Line._resolve_boq_lines([
+            (self.project.id, 'FND-01', self.product.id),
+            (self.project.id, False, self.product.id),
+        ])
+        self.assertEqual(resolved, [self.line.id, self.line.id], "The snapshot copy must not make the keys ambiguous")
+
+    def test_snapshot_lines_not_in_task_rollup(self):
+        self.env.flush_all()
+        self.assertEqual(self.task.boq_budget_amount, self.line.budget_amount)
+
+    def test_snapshot_lines_not_in_analytic_report(self):
+        self.env.flush_all()
+        rows = self.env['construction.boq.analytic.report'].search([('project_id', '=', self.project.id)])
+        self.assertEqual(rows.boq_line_id, self.line)
+        self.assertAlmostEqual(sum(rows.mapped('budget_amount')), self.line.budget_amount)